@@ -0,0 +1,23 @@
+import frappe # type: ignore
+from frappe.utils import cint # type: ignore
+from sowaan_cloud.utils.bulk import batch_status, create_batch, parse_tenants
+
+
+@frappe.whitelist(methods=["POST"])
+def create_subscriptions(tenants=None, csv_content=None, priority=0, max_parallel=4):
+    """
+    Create many subscriptions at once for a partner. ``tenants`` is a JSON
+    list of objects, ``csv_content`` CSV text with a header row; both use the
+    create_subscription fields (company_name, abbr, instance_name,
+    user_email, user_password, selected_package, country). Returns the
+    batch status; poll get_batch_status for progress.
+    """
+    frappe.has_permission("Cloud Provisioning Batch", "create", throw=True)
+    rows = parse_tenants(tenants, csv_content)
+    return batch_status(create_batch(rows, priority=cint(priority), max_parallel=cint(max_parallel), source="API"))
+
+
+@frappe.whitelist()
+def get_batch_status(batch):
+    frappe.has_permission("Cloud Provisioning Batch", "read", batch, throw=True)
+    return batch_status(batch)
@@ -0,0 +1,15 @@
+import frappe # type: ignore
+from werkzeug.wrappers import Response # type: ignore
+from sowaan_cloud.utils.metrics import render_prometheus
+
+
+@frappe.whitelist()
+def metrics():
+    """
+    Prometheus scrape target:
+    /api/method/sowaan_cloud.api.metrics.metrics
+
+    Scrape with a System Manager API key (Authorization: token <key>:<secret>).
+    """
+    frappe.only_for("System Manager")
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,19 @@
+import frappe # type: ignore
+from sowaan_cloud.utils.hibernation import enqueue_wake
+
+
+@frappe.whitelist(allow_guest=True)
+def wake(site):
+    """
+    Polled by the /waking page for a hibernated tenant host. Starts the wake
+    job (once; repeated polls only read the status) and returns "waking" or
+    "ready". Any other host, whatever its subscription's state, is not found.
+    """
+    sub = frappe.db.get_value("Cloud Subscription", {"site_name": site}, ["name", "status"], as_dict=True)
+    if not sub or sub.status not in ("Hibernated", "Active"):
+        frappe.throw("Site not found.", frappe.DoesNotExistError)
+
+    if sub.status == "Hibernated":
+        enqueue_wake(sub.name)
+        return {"status": "waking"}
+    return {"status": "ready"}
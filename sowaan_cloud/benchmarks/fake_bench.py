@@ -0,0 +1,122 @@
+"""
+Stand-in for the ``bench`` CLI used by the provisioning benchmark.
+
+Implements just the commands provisioning issues, against a throwaway bench
+directory (the current working directory, as run_as_frappe cd's into
+bench_path):
+
+    bench new-site <site> ...
+    bench --site <site> list-apps | install-app <app> | migrate | execute ...
+    bench setup lets-encrypt <site> ...      (doubles as a fake certbot)
+
+Behaviour comes from the JSON file named by SOWAAN_FAKE_BENCH_CONFIG:
+
+    {
+        "latency": {"new-site": [2, 4], "install-app": [1, 3], ...},   # seconds, uniform
+        "failure_rate": {"install-app": 0.05},                         # 0..1
+        "failure_message": "Lock wait timeout exceeded; try restarting transaction",
+        "letsencrypt_live_dir": "/tmp/.../letsencrypt/live"
+    }
+
+Runs without frappe installed: only the standard library is used.
+"""
+
+import json
+import os
+import random
+import shutil
+import sys
+import time
+
+
+def load_config():
+    path = os.environ.get("SOWAAN_FAKE_BENCH_CONFIG")
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def simulate(config, command, chatty=True):
+    low, high = config.get("latency", {}).get(command, [0, 0])
+    time.sleep(random.uniform(low, high))
+
+    # Progress noise exercises the streaming executor; list-apps stdout is parsed, so it stays clean.
+    for i in range(3 if chatty else 0):
+        print(f"[fake-bench] {command}: working ({i + 1}/3)", flush=True)
+
+    if random.random() < config.get("failure_rate", {}).get(command, 0):
+        print(config.get("failure_message", f"fake failure in {command}"), file=sys.stderr, flush=True)
+        sys.exit(1)
+
+
+def site_dir(site):
+    return os.path.join(os.getcwd(), "sites", site)
+
+
+def apps_file(site):
+    return os.path.join(site_dir(site), "fake_installed_apps.json")
+
+
+def read_apps(site):
+    try:
+        with open(apps_file(site)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return ["frappe"]
+
+
+def main(argv):
+    config = load_config()
+    site = None
+
+    if argv[:1] == ["--site"]:
+        site, argv = argv[1], argv[2:]
+
+    command = argv[0] if argv else ""
+
+    if command == "new-site":
+        site = argv[1]
+        if os.path.isdir(site_dir(site)):
+            if "--force" not in argv:
+                print(f"Site {site} already exists", file=sys.stderr)
+                sys.exit(1)
+            # Like bench, --force reinstalls over the existing site.
+            shutil.rmtree(site_dir(site))
+        simulate(config, command)
+        os.makedirs(site_dir(site))
+        with open(os.path.join(site_dir(site), "site_config.json"), "w") as f:
+            json.dump({"db_name": "_" + os.urandom(8).hex(), "db_password": "fake"}, f)
+        return
+
+    if command == "list-apps":
+        simulate(config, command, chatty=False)
+        print("\n".join(read_apps(site)))
+        return
+
+    if command == "install-app":
+        simulate(config, command)
+        apps = read_apps(site)
+        if argv[1] not in apps:
+            apps.append(argv[1])
+        with open(apps_file(site), "w") as f:
+            json.dump(apps, f)
+        return
+
+    if command in ("migrate", "execute"):
+        simulate(config, command)
+        return
+
+    if command == "setup" and argv[1:2] == ["lets-encrypt"]:
+        simulate(config, "lets-encrypt")
+        live_dir = os.path.join(config["letsencrypt_live_dir"], argv[2])
+        os.makedirs(live_dir, exist_ok=True)
+        open(os.path.join(live_dir, "fullchain.pem"), "w").close()
+        return
+
+    print(f"fake bench: unsupported command {argv}", file=sys.stderr)
+    sys.exit(2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
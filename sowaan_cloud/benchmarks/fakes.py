@@ -0,0 +1,137 @@
+import json
+import os
+import random
+import stat
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Fakes for the provisioning benchmark: a bench directory with stub
+# ``bench`` / ``sudo`` executables, a mock Cloudflare API and a stub resolver.
+
+
+class FakeBench:
+    """
+    A throwaway bench directory plus a bin directory holding stub ``bench``
+    and ``sudo`` executables. Point Cloud Settings.bench_path at ``path`` and
+    prepend ``bin_path`` to PATH (see ``env``).
+    """
+
+    def __init__(self, root, latency=None, failure_rate=None, failure_message=None):
+        self.root = root
+        self.path = os.path.join(root, "bench")
+        self.bin_path = os.path.join(root, "bin")
+        self.letsencrypt_live_dir = os.path.join(root, "letsencrypt", "live")
+        self.config_path = os.path.join(root, "fake_bench.json")
+
+        os.makedirs(os.path.join(self.path, "sites"), exist_ok=True)
+        os.makedirs(self.bin_path, exist_ok=True)
+        os.makedirs(self.letsencrypt_live_dir, exist_ok=True)
+
+        with open(self.config_path, "w") as f:
+            json.dump({
+                "latency": latency or {},
+                "failure_rate": failure_rate or {},
+                "failure_message": failure_message or "Lock wait timeout exceeded; try restarting transaction",
+                "letsencrypt_live_dir": self.letsencrypt_live_dir,
+            }, f)
+
+        fake_bench = os.path.join(os.path.dirname(__file__), "fake_bench.py")
+        self._write_script("bench", f'exec {sys.executable} {fake_bench} "$@"')
+        # Drops "-u <user>" and runs the rest as the current user.
+        self._write_script("sudo", 'if [ "$1" = "-u" ]; then shift 2; fi\nexec "$@"')
+
+    @property
+    def env(self):
+        """Variables every provisioning shell needs (site config ``provisioning_env``)."""
+        return {
+            "PATH": f"{self.bin_path}:{os.environ.get('PATH', '')}",
+            "SOWAAN_FAKE_BENCH_CONFIG": self.config_path,
+        }
+
+    def _write_script(self, name, body):
+        path = os.path.join(self.bin_path, name)
+        with open(path, "w") as f:
+            f.write(f"#!/bin/sh\n{body}\n")
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+class MockCloudflare:
+    """
+    In-process Cloudflare DNS API (GET/POST /zones/<zone>/dns_records) with
+    configurable latency and failure rate. ``base_url`` replaces
+    https://api.cloudflare.com/client/v4 via site config ``cloudflare_api_base``.
+    """
+
+    def __init__(self, latency=(0.05, 0.2), failure_rate=0.0):
+        self.records = {}
+        self.requests = 0
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/client/v4"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _simulate(self):
+                with mock._lock:
+                    mock.requests += 1
+                time.sleep(random.uniform(*mock.latency))
+                if random.random() < mock.failure_rate:
+                    self._reply(503, {"success": False, "errors": [{"message": "mock outage"}]})
+                    return False
+                return True
+
+            def do_GET(self):
+                if not self._simulate():
+                    return
+                name = parse_qs(urlparse(self.path).query).get("name", [None])[0]
+                with mock._lock:
+                    result = [r for r in mock.records.values() if r["name"] == name]
+                self._reply(200, {"success": True, "result": result})
+
+            def do_POST(self):
+                if not self._simulate():
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                record = json.loads(self.rfile.read(length) or b"{}")
+                record["id"] = uuid.uuid4().hex
+                with mock._lock:
+                    mock.records[record["id"]] = record
+                self._reply(200, {"success": True, "result": record})
+
+        return Handler
+
+
+def stub_resolver(ip):
+    """Resolver that answers every hostname with ``ip`` (for ssl.resolve_host)."""
+    return lambda hostname: ip
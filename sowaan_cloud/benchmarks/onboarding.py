@@ -0,0 +1,326 @@
+import frappe # type: ignore
+import random
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from frappe.utils import get_url # type: ignore
+
+from sowaan_cloud.benchmarks import results
+from sowaan_cloud.utils.profiling import DB_HEADER, REDIS_HEADER, SERVER_MS_HEADER
+
+# Load test for the guest onboarding endpoints.
+#
+# Simulated visitors follow the onboarding page: page load (with the site
+# suffix lookup), package catalog, signup, then a status poll every 4 seconds
+# as ProvisioningStatus.jsx does. A burst of identical concurrent signups
+# checks that the duplicate checks in create_subscription hold under a race.
+#
+# Run it against a local test site served by a real web server, with
+# provisioning paused and request profiling on so DB queries and Redis ops
+# per request come back in response headers:
+#
+#     bench --site test.localhost set-config -p pause_provisioning 1
+#     bench --site test.localhost set-config -p request_profiling 1
+#     bench --site test.localhost execute sowaan_cloud.benchmarks.onboarding.run \
+#         --kwargs '{"users": 100, "concurrency": 20}'
+#
+# Every visitor sends its own X-Forwarded-For address from the benchmarking
+# range (198.18.0.0/15) so the per-IP signup rate limit does not cap the run.
+# Subscriptions created by the run are deleted afterwards.
+
+API = "/api/method/sowaan_cloud.sowaan_cloud.doctype"
+ENDPOINTS = {
+    "get_site_suffix": f"{API}.cloud_settings.cloud_settings.get_site_suffix",
+    "get_packages": f"{API}.cloud_subscription.cloud_subscription.get_packages",
+    "create_subscription": f"{API}.cloud_subscription.cloud_subscription.create_subscription",
+    "get_subscription_status": f"{API}.cloud_subscription.cloud_subscription.get_subscription_status",
+}
+PAGE = "/onboarding"
+
+POLL_INTERVAL = 4
+REGRESSION_THRESHOLD = 0.10
+
+
+def run(
+    users=50,
+    concurrency=10,
+    polls=5,
+    poll_interval=POLL_INTERVAL,
+    think_time=(0.5, 2.0),
+    duplicate_burst=10,
+    url=None,
+    output=None,
+):
+    """
+    Simulate ``users`` visitors with ``concurrency`` in flight, then fire
+    ``duplicate_burst`` identical signups at once. Returns the summary, also
+    saved as JSON under <bench>/logs/benchmarks/ (or ``output``).
+    """
+    if not frappe.conf.get("pause_provisioning"):
+        frappe.throw("Set pause_provisioning in site config first: signups would provision real sites.")
+
+    users, concurrency = int(users), int(concurrency)
+    base_url = (url or get_url()).rstrip("/")
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+    samples, lock = [], threading.Lock()
+
+    def record(sample):
+        with lock:
+            samples.append(sample)
+
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for i in range(users):
+                pool.submit(_visitor, base_url, run_id, i, int(polls), float(poll_interval), think_time, record)
+        wall = time.monotonic() - started
+
+        race = _duplicate_race(base_url, run_id, int(duplicate_burst), record) if duplicate_burst else None
+    finally:
+        _cleanup(run_id)
+
+    result = summarize(samples, wall)
+    result.update({
+        "run_id": run_id,
+        "commit": results.git_commit(),
+        "params": {
+            "users": users,
+            "concurrency": concurrency,
+            "polls": polls,
+            "poll_interval": poll_interval,
+            "think_time": list(think_time),
+            "duplicate_burst": duplicate_burst,
+        },
+        "race": race,
+        "samples": samples,
+    })
+
+    path = results.save(result, "onboarding", output)
+    print(format_summary(result))
+    print(f"Saved {path}")
+    return {k: v for k, v in result.items() if k != "samples"}
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Compare two saved runs. Returns per-metric deltas and the list of regressions."""
+    a, b = results.load(baseline), results.load(current)
+    metrics = [("requests_per_sec", True)]
+    for endpoint in sorted(set(a["endpoints"]) | set(b["endpoints"])):
+        metrics += [
+            (f"endpoints.{endpoint}.latency_ms.p50", False),
+            (f"endpoints.{endpoint}.latency_ms.p95", False),
+            (f"endpoints.{endpoint}.latency_ms.p99", False),
+            (f"endpoints.{endpoint}.db_queries", False),
+            (f"endpoints.{endpoint}.redis_ops", False),
+        ]
+    return results.compare_metrics(a, b, metrics, threshold)
+
+
+# ── Traffic ────────────────────────────────────────────────────────────────────
+
+def _visitor(base_url, run_id, i, polls, poll_interval, think_time, record):
+    session = _session(run_id, i)
+
+    try:
+        _call(session, base_url, "page", "GET", PAGE, record)
+        _call(session, base_url, "get_site_suffix", "GET", ENDPOINTS["get_site_suffix"], record)
+
+        packages = _call(session, base_url, "get_packages", "GET", ENDPOINTS["get_packages"], record) or []
+        if not packages:
+            return
+
+        time.sleep(random.uniform(*think_time))
+
+        created = _call(
+            session,
+            base_url,
+            "create_subscription",
+            "POST",
+            ENDPOINTS["create_subscription"],
+            record,
+            json=_signup(run_id, i, random.choice(packages)["name"]),
+        )
+        if not created:
+            return
+
+        for _ in range(polls):
+            time.sleep(poll_interval)
+            _call(
+                session,
+                base_url,
+                "get_subscription_status",
+                "GET",
+                ENDPOINTS["get_subscription_status"],
+                record,
+                params={"name": created["name"]},
+            )
+    except Exception as e:
+        record({"endpoint": "visitor", "status": None, "latency_ms": None, "error": repr(e)[:200]})
+
+
+def _duplicate_race(base_url, run_id, burst, record):
+    """Fire ``burst`` identical signups at the same instant; exactly one may win."""
+    package = frappe.db.get_value("Cloud Package", {}, "name")
+    payload = _signup(run_id, "race", package)
+    barrier = threading.Barrier(burst)
+    outcomes = []
+
+    def submit(i):
+        session = _session(run_id, f"race-{i}")
+        barrier.wait()
+        response = _request(session, base_url, "create_subscription:race", "POST", ENDPOINTS["create_subscription"], json=payload)
+        response.pop("message", None)
+        record(response)
+        outcomes.append(response["status"])
+
+    with ThreadPoolExecutor(max_workers=burst) as pool:
+        list(pool.map(submit, range(burst)))
+
+    frappe.db.rollback()
+    rows = frappe.db.count("Cloud Subscription", {"instance_name": payload["instance_name"]})
+
+    return {
+        "submissions": burst,
+        "accepted": outcomes.count(200),
+        "rejected": sum(1 for s in outcomes if s == 417),
+        "server_errors": sum(1 for s in outcomes if s is None or s >= 500),
+        "rows": rows,
+        "ok": rows == 1 and outcomes.count(200) == 1 and all(s in (200, 417) for s in outcomes),
+    }
+
+
+def _session(run_id, i):
+    session = requests.Session()
+    # 198.18.0.0/15 is reserved for benchmarking (RFC 2544). Hashing in the run
+    # id keeps back-to-back runs from hitting the previous run's rate-limit counters.
+    n = zlib.crc32(f"{run_id}:{i}".encode()) % (1 << 17)
+    session.headers["X-Forwarded-For"] = f"198.{18 + (n >> 16)}.{(n >> 8) % 256}.{n % 256}"
+    return session
+
+
+def _signup(run_id, i, package):
+    return {
+        "company_name": f"Loadtest {run_id} {i}",
+        "abbr": f"LT{i}"[:10],
+        "instance_name": f"loadtest-{run_id}-{i}",
+        "user_email": f"loadtest-{run_id}-{i}@example.com",
+        "user_password": "loadtest-password",
+        "selected_package": package,
+    }
+
+
+def _call(session, base_url, endpoint, method, path, record, **kwargs):
+    sample = _request(session, base_url, endpoint, method, path, **kwargs)
+    record(sample)
+    return sample.pop("message", None)
+
+
+def _request(session, base_url, endpoint, method, path, **kwargs):
+    start = time.perf_counter()
+    sample = {"endpoint": endpoint, "status": None, "error": None}
+
+    try:
+        r = session.request(method, base_url + path, timeout=30, **kwargs)
+        sample["status"] = r.status_code
+        sample["db_queries"] = _int_header(r, DB_HEADER)
+        sample["redis_ops"] = _int_header(r, REDIS_HEADER)
+        sample["server_ms"] = _float_header(r, SERVER_MS_HEADER)
+        if path.startswith("/api/") and r.headers.get("Content-Type", "").startswith("application/json"):
+            body = r.json()
+            sample["message"] = body.get("message")
+            if r.status_code >= 400:
+                sample["error"] = (body.get("exc_type") or f"HTTP {r.status_code}")
+        elif r.status_code >= 400:
+            sample["error"] = f"HTTP {r.status_code}"
+    except requests.RequestException as e:
+        sample["error"] = type(e).__name__
+
+    sample["latency_ms"] = (time.perf_counter() - start) * 1000
+    return sample
+
+
+def _int_header(response, name):
+    value = response.headers.get(name)
+    return int(value) if value is not None else None
+
+
+def _float_header(response, name):
+    value = response.headers.get(name)
+    return float(value) if value is not None else None
+
+
+def _cleanup(run_id):
+    frappe.db.rollback()
+    for name in frappe.get_all(
+        "Cloud Subscription", filters={"instance_name": ["like", f"loadtest-{run_id}-%"]}, pluck="name"
+    ):
+        frappe.delete_doc("Cloud Subscription", name, force=True, ignore_permissions=True)
+    frappe.db.commit()
+
+
+# ── Results ────────────────────────────────────────────────────────────────────
+
+def summarize(samples, wall):
+    by_endpoint = defaultdict(list)
+    for s in samples:
+        by_endpoint[s["endpoint"]].append(s)
+
+    endpoints = {}
+    for endpoint, items in by_endpoint.items():
+        latencies = [s["latency_ms"] for s in items if s["latency_ms"] is not None]
+        db = [s["db_queries"] for s in items if s.get("db_queries") is not None]
+        redis = [s["redis_ops"] for s in items if s.get("redis_ops") is not None]
+        errors = defaultdict(int)
+        for s in items:
+            if s["error"]:
+                errors[s["error"]] += 1
+
+        endpoints[endpoint] = {
+            "requests": len(items),
+            "latency_ms": results.percentiles(latencies),
+            "db_queries": results.mean(db),
+            "db_queries_max": max(db, default=None),
+            "redis_ops": results.mean(redis),
+            "redis_ops_max": max(redis, default=None),
+            "errors": dict(errors),
+        }
+
+    return {
+        "requests": len(samples),
+        "wall_seconds": wall,
+        "requests_per_sec": len(samples) / wall if wall else 0,
+        "profiled": any(s.get("db_queries") is not None for s in samples),
+        "endpoints": endpoints,
+    }
+
+
+def format_summary(result):
+    lines = [
+        f"Onboarding load test {result['run_id']} @ {result['commit'] or 'unknown commit'}",
+        f"  {result['requests']} requests in {result['wall_seconds']:.1f}s ({result['requests_per_sec']:.1f}/s)",
+        f"  {'endpoint':<28} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'db':>6} {'redis':>6}  errors",
+    ]
+    for endpoint, e in sorted(result["endpoints"].items()):
+        lat = e["latency_ms"]
+        errors = ", ".join(f"{k}: {v}" for k, v in e["errors"].items())
+        lines.append(
+            f"  {endpoint:<28} {e['requests']:>5} {results.fmt(lat['p50']):>8} {results.fmt(lat['p95']):>8} "
+            f"{results.fmt(lat['p99']):>8} {results.fmt(e['db_queries']):>6} {results.fmt(e['redis_ops']):>6}  {errors}"
+        )
+    if not result["profiled"]:
+        lines.append("  (set request_profiling in site config for DB / Redis counts)")
+
+    race = result["race"]
+    if race:
+        verdict = "OK" if race["ok"] else "FAILED"
+        lines.append(
+            f"  duplicate race {verdict}: {race['submissions']} identical signups -> "
+            f"{race['accepted']} accepted, {race['rejected']} rejected, "
+            f"{race['server_errors']} server errors, {race['rows']} rows"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,397 @@
+import frappe # type: ignore
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from frappe.utils.password import remove_encrypted_password, set_encrypted_password # type: ignore
+
+from sowaan_cloud.benchmarks import results
+from sowaan_cloud.benchmarks.fakes import FakeBench, MockCloudflare, stub_resolver
+from sowaan_cloud.utils import provision, ssl
+from sowaan_cloud.utils.provision import analyze_provisioning_error
+
+# Provisioning benchmark.
+#
+# Drives N subscriptions through provision_from_subscription and
+# issue_ssl_async against a fake bench, a mock Cloudflare API, a fake certbot
+# (``bench setup lets-encrypt`` in the fake bench) and a stub DNS resolver, so
+# throughput and latency can be measured without real infrastructure. Run it
+# on a development site:
+#
+#     bench --site dev.localhost execute sowaan_cloud.benchmarks.provisioning.run \
+#         --kwargs '{"n": 20, "concurrency": 4}'
+#
+#     bench --site dev.localhost execute sowaan_cloud.benchmarks.provisioning.compare \
+#         --kwargs '{"baseline": "logs/benchmarks/<a>.json", "current": "logs/benchmarks/<b>.json"}'
+#
+# Each worker thread plays the part of an RQ worker with its own DB
+# connection. Jobs are not enqueued: the SSL job provisioning would enqueue is
+# run inline right after it, and scheduled retries are re-entered at once
+# instead of waiting for their backoff. Cloud Settings are swapped for the
+# run and restored afterwards; every benchmark subscription is deleted.
+
+DEFAULT_LATENCY = {
+    "new-site": [2.0, 4.0],
+    "install-app": [1.0, 3.0],
+    "list-apps": [0.2, 0.5],
+    "execute": [1.0, 2.0],
+    "migrate": [1.0, 3.0],
+    "lets-encrypt": [1.0, 2.0],
+}
+
+SERVER_IP = "203.0.113.10"
+SITE_SUFFIX = "bench.test"
+PACKAGE_APPS = ["erpnext", "hrms"]
+MAX_INLINE_RETRIES = 10
+
+SETTINGS_FIELDS = ("bench_path", "server_ip", "site_suffix", "enable_dns", "enable_ssl", "trial_days")
+SETTINGS_PASSWORDS = ("sql_password", "cloudflare_api_secret", "cloudflare_zone_domain")
+
+# Relative change beyond which compare() flags a metric.
+REGRESSION_THRESHOLD = 0.10
+
+
+def run(
+    n=10,
+    concurrency=4,
+    latency=None,
+    failure_rate=None,
+    failure_message=None,
+    cloudflare_latency=(0.05, 0.2),
+    cloudflare_failure_rate=0.0,
+    output=None,
+    keep_files=False,
+):
+    """
+    Provision ``n`` subscriptions with ``concurrency`` workers and return the
+    results, also saved as JSON under <bench>/logs/benchmarks/ (or ``output``).
+    ``latency`` / ``failure_rate`` are per bench command, see fake_bench.py.
+    """
+    n, concurrency = int(n), int(concurrency)
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+    root = tempfile.mkdtemp(prefix="sowaan-bench-")
+    fake = FakeBench(
+        root,
+        latency={**DEFAULT_LATENCY, **(latency or {})},
+        failure_rate=failure_rate,
+        failure_message=failure_message,
+    )
+
+    saved_settings = _swap_settings(fake)
+    package = _create_package(run_id)
+    names = [_create_subscription(run_id, i, package) for i in range(n)]
+    frappe.db.commit()
+
+    conf = {
+        "provisioning_env": fake.env,
+        "letsencrypt_live_dir": fake.letsencrypt_live_dir,
+    }
+    patches = _patch_runtime(fake)
+    samples = []
+
+    try:
+        with MockCloudflare(cloudflare_latency, cloudflare_failure_rate) as cloudflare:
+            conf["cloudflare_api_base"] = cloudflare.base_url
+            started = time.monotonic()
+            _run_workers(names, concurrency, conf, samples)
+            wall = time.monotonic() - started
+            cloudflare_requests = cloudflare.requests
+    finally:
+        _unpatch_runtime(patches)
+        _cleanup(names, package, saved_settings)
+        if not keep_files:
+            shutil.rmtree(root, ignore_errors=True)
+
+    result = summarize(samples, wall)
+    result.update({
+        "run_id": run_id,
+        "commit": results.git_commit(),
+        "params": {
+            "n": n,
+            "concurrency": concurrency,
+            "latency": {**DEFAULT_LATENCY, **(latency or {})},
+            "failure_rate": failure_rate or {},
+            "cloudflare_latency": list(cloudflare_latency),
+            "cloudflare_failure_rate": cloudflare_failure_rate,
+        },
+        "cloudflare_requests": cloudflare_requests,
+        "samples": samples,
+    })
+
+    path = results.save(result, "provisioning", output)
+
+    print(format_summary(result))
+    print(f"Saved {path}")
+    return {k: v for k, v in result.items() if k != "samples"}
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Compare two saved runs. Returns per-metric deltas and the list of regressions."""
+    # (metric, True when higher is better)
+    return results.compare_metrics(
+        results.load(baseline),
+        results.load(current),
+        [
+            ("throughput_per_min", True),
+            ("time_to_active.p50", False),
+            ("time_to_active.p95", False),
+            ("time_to_active.p99", False),
+            ("time_to_ssl.p95", False),
+            ("db_queries.provision_mean", False),
+            ("db_queries.ssl_mean", False),
+            ("success_rate", True),
+        ],
+        threshold,
+    )
+
+
+# ── Workers ────────────────────────────────────────────────────────────────────
+
+def _run_workers(names, concurrency, conf, samples):
+    site, sites_path = frappe.local.site, frappe.local.sites_path
+    pending = queue.Queue()
+    for name in names:
+        pending.put(name)
+
+    lock = threading.Lock()
+
+    def worker():
+        frappe.init(site=site, sites_path=sites_path)
+        frappe.connect()
+        frappe.set_user("Administrator")
+        frappe.local.conf.update(conf)
+        counter = _count_queries()
+        try:
+            while True:
+                try:
+                    name = pending.get_nowait()
+                except queue.Empty:
+                    return
+                sample = _provision_one(name, counter)
+                with lock:
+                    samples.append(sample)
+        finally:
+            frappe.destroy()
+
+    threads = [threading.Thread(target=worker, name=f"bench-worker-{i}") for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def _provision_one(name, counter):
+    sample = {"subscription": name, "retries": 0, "error": None}
+    start = time.monotonic()
+
+    try:
+        counter["n"] = 0
+        attempts = 0
+        while True:
+            provision.provision_from_subscription(name)
+            frappe.db.commit()
+            sub = frappe.db.get_value(
+                "Cloud Subscription", name, ["status", "next_retry_at", "site_name"], as_dict=True
+            )
+            if sub.status != "Provisioning" or not sub.next_retry_at or attempts >= MAX_INLINE_RETRIES:
+                break
+            attempts += 1
+            frappe.db.set_value("Cloud Subscription", name, "next_retry_at", None)
+            frappe.db.commit()
+
+        sample["retries"] = attempts
+        sample["status"] = sub.status
+        sample["provision_queries"] = counter["n"]
+        sample["time_to_active"] = time.monotonic() - start if sub.status == "Active" else None
+
+        if sub.status != "Active":
+            sample["error"] = _error_class(name)
+            return sample
+
+        counter["n"] = 0
+        ssl.issue_ssl_async(sub.site_name, name)
+        frappe.db.commit()
+        sample["ssl_queries"] = counter["n"]
+        sample["ssl_status"] = frappe.db.get_value("Cloud Subscription", name, "ssl_status")
+        sample["time_to_ssl"] = time.monotonic() - start
+
+    except Exception as e:
+        frappe.db.rollback()
+        sample["status"] = "Failed"
+        sample["error"] = analyze_provisioning_error(
+            getattr(e, "output_combined", None) or str(e)
+        )["code"]
+
+    return sample
+
+
+def _error_class(name):
+    code = frappe.db.get_value("Cloud Subscription", name, "last_error_code")
+    if code:
+        return code
+    logs = frappe.db.get_value("Cloud Subscription", name, "provisioning_logs") or ""
+    return analyze_provisioning_error(logs)["code"]
+
+
+def _count_queries():
+    """Count frappe.db.sql calls on this thread's connection."""
+    counter = {"n": 0}
+    db = frappe.local.db
+    sql = db.sql
+
+    def counted(*args, **kwargs):
+        counter["n"] += 1
+        return sql(*args, **kwargs)
+
+    db.sql = counted
+    return counter
+
+
+# ── Setup / teardown ───────────────────────────────────────────────────────────
+
+def _swap_settings(fake):
+    # Written field by field: a Single's save would validate SITE_SUFFIX against
+    # the Site Suffix options, which only list production domains.
+    settings = frappe.get_single("Cloud Settings")
+    saved = {f: settings.get(f) for f in SETTINGS_FIELDS}
+    saved.update({f: settings.get_password(f, raise_exception=False) for f in SETTINGS_PASSWORDS})
+
+    _write_settings({
+        "bench_path": fake.path,
+        "server_ip": SERVER_IP,
+        "site_suffix": SITE_SUFFIX,
+        "enable_dns": 1,
+        "enable_ssl": 1,
+        "trial_days": 15,
+        "sql_password": "benchmark",
+        "cloudflare_api_secret": "benchmark",
+        "cloudflare_zone_domain": "benchmark-zone",
+    })
+    frappe.db.commit()
+    return saved
+
+
+def _restore_settings(saved):
+    _write_settings(saved)
+
+
+def _write_settings(values):
+    for field, value in values.items():
+        if field not in SETTINGS_PASSWORDS:
+            frappe.db.set_single_value("Cloud Settings", field, value)
+        elif value:
+            set_encrypted_password("Cloud Settings", "Cloud Settings", value, field)
+        else:
+            remove_encrypted_password("Cloud Settings", "Cloud Settings", field)
+    frappe.clear_document_cache("Cloud Settings", "Cloud Settings")
+
+
+def _create_package(run_id):
+    return frappe.get_doc({
+        "doctype": "Cloud Package",
+        "package_name": f"Benchmark {run_id}",
+        "title": "Benchmark",
+        "apps": [{"app_name": app} for app in PACKAGE_APPS],
+    }).insert(ignore_permissions=True).name
+
+
+def _create_subscription(run_id, i, package):
+    country = frappe.db.get_single_value("System Settings", "country") or frappe.db.get_value("Country", {})
+    currency = frappe.db.get_default("currency") or frappe.db.get_value("Currency", {"enabled": 1})
+    return frappe.get_doc({
+        "doctype": "Cloud Subscription",
+        "company_name": f"Benchmark {run_id} {i}",
+        "abbr": f"B{i}",
+        "instance_name": f"bench-{run_id}-{i}",
+        "selected_package": package,
+        "user_email": f"bench-{run_id}-{i}@example.com",
+        "user_password": frappe.generate_hash(length=16),
+        "country": country,
+        "currency": currency,
+        "status": "Provisioning",
+        "provisioning_step": "INIT",
+    }).insert(ignore_permissions=True).name
+
+
+def _patch_runtime(fake):
+    """Process-wide swaps for the run; returns what _unpatch_runtime restores."""
+    saved = {
+        "enqueue": frappe.enqueue,
+        "healthy": provision.check_site_health,
+        "resolve_host": ssl.resolve_host,
+        "path": os.environ.get("PATH", ""),
+    }
+
+    # SSL is driven inline by _provision_one; other jobs are not part of the run.
+    frappe.enqueue = lambda *args, **kwargs: None
+    provision.check_site_health = lambda site_name: True
+    ssl.resolve_host = stub_resolver(SERVER_IP)
+    # sudo itself is resolved from the worker's PATH, before provisioning_env applies.
+    os.environ["PATH"] = f"{fake.bin_path}:{saved['path']}"
+    return saved
+
+
+def _unpatch_runtime(saved):
+    frappe.enqueue = saved["enqueue"]
+    provision.check_site_health = saved["healthy"]
+    ssl.resolve_host = saved["resolve_host"]
+    os.environ["PATH"] = saved["path"]
+
+
+def _cleanup(names, package, saved_settings):
+    frappe.db.rollback()
+    for name in names:
+        frappe.db.delete("Cloud Provisioning Event", {"subscription": name})
+        frappe.delete_doc("Cloud Subscription", name, force=True, ignore_permissions=True)
+    frappe.delete_doc("Cloud Package", package, force=True, ignore_permissions=True)
+    _restore_settings(saved_settings)
+    frappe.db.commit()
+
+
+# ── Results ────────────────────────────────────────────────────────────────────
+
+def summarize(samples, wall):
+    active = [s for s in samples if s.get("time_to_active") is not None]
+    ttas = sorted(s["time_to_active"] for s in active)
+    ttss = sorted(s["time_to_ssl"] for s in active if s.get("ssl_status") == "Issued")
+    provision_queries = [s["provision_queries"] for s in samples if "provision_queries" in s]
+    ssl_queries = [s["ssl_queries"] for s in samples if "ssl_queries" in s]
+
+    return {
+        "total": len(samples),
+        "active": len(active),
+        "ssl_issued": len(ttss),
+        "success_rate": len(active) / len(samples) if samples else 0,
+        "wall_seconds": wall,
+        "throughput_per_min": len(active) / wall * 60 if wall else 0,
+        "retries": sum(s["retries"] for s in samples),
+        "time_to_active": results.percentiles(ttas),
+        "time_to_ssl": results.percentiles(ttss),
+        "db_queries": {
+            "provision_mean": results.mean(provision_queries),
+            "provision_max": max(provision_queries, default=0),
+            "ssl_mean": results.mean(ssl_queries),
+            "ssl_max": max(ssl_queries, default=0),
+        },
+        "errors": dict(Counter(s["error"] for s in samples if s.get("error"))),
+    }
+
+
+def format_summary(result):
+    tta, tts, q = result["time_to_active"], result["time_to_ssl"], result["db_queries"]
+    lines = [
+        f"Provisioning benchmark {result['run_id']} @ {result['commit'] or 'unknown commit'}",
+        f"  subscriptions   {result['active']}/{result['total']} active, {result['ssl_issued']} with SSL, {result['retries']} retries",
+        f"  throughput      {result['throughput_per_min']:.2f} active/min over {result['wall_seconds']:.1f}s",
+        f"  time to active  p50 {results.fmt(tta['p50'])}s  p95 {results.fmt(tta['p95'])}s  p99 {results.fmt(tta['p99'])}s",
+        f"  time to SSL     p50 {results.fmt(tts['p50'])}s  p95 {results.fmt(tts['p95'])}s  p99 {results.fmt(tts['p99'])}s",
+        f"  DB queries      provision mean {results.fmt(q['provision_mean'])} (max {q['provision_max']}), "
+        f"ssl mean {results.fmt(q['ssl_mean'])} (max {q['ssl_max']})",
+    ]
+    if result["errors"]:
+        lines.append("  errors          " + ", ".join(f"{k}: {v}" for k, v in result["errors"].items()))
+    return "\n".join(lines)
@@ -0,0 +1,109 @@
+import json
+import math
+import os
+import subprocess
+
+# Shared helpers for benchmark results: percentiles, formatting and the
+# JSON files under <bench>/logs/benchmarks/ that runs are compared by.
+
+
+def percentiles(values):
+    values = sorted(values)
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+def percentile(values, pct):
+    # Nearest-rank on a sorted list.
+    if not values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def fmt(value):
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def dig(data, dotted):
+    for part in dotted.split("."):
+        data = (data or {}).get(part)
+    return data
+
+
+def results_dir():
+    from frappe.utils import get_bench_path # type: ignore
+
+    path = os.path.join(get_bench_path(), "logs", "benchmarks")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def resolve(path):
+    from frappe.utils import get_bench_path # type: ignore
+
+    return path if os.path.isabs(path) else os.path.join(get_bench_path(), path)
+
+
+def save(result, prefix, output=None):
+    """Write ``result`` as JSON; returns the path."""
+    path = output or os.path.join(
+        results_dir(), f"{prefix}-{result['run_id']}-{result['commit'] or 'nogit'}.json"
+    )
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, default=str)
+    return path
+
+
+def load(path):
+    with open(resolve(path)) as f:
+        return json.load(f)
+
+
+def compare_metrics(baseline, current, metrics, threshold):
+    """
+    Per-metric deltas between two result dicts. ``metrics`` is a list of
+    (dotted key, higher_is_better). Prints a table and returns the rows and
+    the names of metrics that moved the wrong way by more than ``threshold``.
+    """
+    rows, regressions = [], []
+    for metric, higher_is_better in metrics:
+        old, new = dig(baseline, metric), dig(current, metric)
+        change = (new - old) / old if old and new is not None else None
+        worse = change is not None and (change < -threshold if higher_is_better else change > threshold)
+        rows.append({"metric": metric, "baseline": old, "current": new, "change": change, "regression": worse})
+        if worse:
+            regressions.append(metric)
+
+    for row in rows:
+        change = f"{row['change'] * 100:+.1f}%" if row["change"] is not None else "n/a"
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<36} {fmt(row['baseline']):>10} -> {fmt(row['current']):>10}  {change}{flag}")
+
+    return {
+        "baseline": {"commit": baseline.get("commit"), "run_id": baseline.get("run_id")},
+        "current": {"commit": current.get("commit"), "run_id": current.get("run_id")},
+        "metrics": rows,
+        "regressions": regressions,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
@@ -0,0 +1,57 @@
+import json
+import os
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("bulk-provision")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--priority", default=0, type=int, help="Batches with a higher priority are dispatched first")
+@click.option("--max-parallel", default=4, type=int, help="Subscriptions of this batch provisioned at the same time")
+@pass_context
+def bulk_provision(context, path, priority, max_parallel):
+    """Create Cloud Subscriptions from a CSV or JSON file and queue them for provisioning."""
+    from sowaan_cloud.utils.bulk import batch_status, create_batch, parse_tenants
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+    try:
+        frappe.set_user("Administrator")
+        with open(path) as f:
+            content = f.read()
+        if path.lower().endswith(".json"):
+            rows = parse_tenants(tenants=content)
+        else:
+            rows = parse_tenants(csv_content=content)
+
+        status = batch_status(create_batch(rows, priority, max_parallel, source=os.path.basename(path)))
+        click.echo(f"{status['batch']}: {status['total']} rows, {status['progress']}")
+        for row in status["rows"]:
+            if row["status"] == "Rejected":
+                click.secho(f"  row {row['row']} ({row['company_name']}): {row['error']}", fg="yellow")
+    finally:
+        frappe.destroy()
+
+
+@click.command("bulk-provision-status")
+@click.argument("batch")
+@click.option("--rows", is_flag=True, default=False, help="Print every row as JSON")
+@pass_context
+def bulk_provision_status(context, batch, rows):
+    """Show the progress of a Cloud Provisioning Batch."""
+    from sowaan_cloud.utils.bulk import batch_status
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+    try:
+        status = batch_status(batch)
+        click.echo(f"{status['batch']} {status['status']}: {status['percent_complete']}% complete, {status['progress']}")
+        if rows:
+            click.echo(json.dumps(status["rows"], indent=1, default=str))
+    finally:
+        frappe.destroy()
+
+
+commands = [bulk_provision, bulk_provision_status]
@@ -153,12 +153,38 @@ app_license = "mit"
 # Scheduled Tasks
 # ---------------
 scheduler_events = {
-    # "daily": [
-    #     "sowaan_cloud.utils.ssl.retry_failed_ssl"
-    # ],
+    "cron": {
+        "* * * * *": [
+            "sowaan_cloud.utils.retry_policy.dispatch_due_retries",
+            "sowaan_cloud.utils.bulk.dispatch_queued_subscriptions",
+        ],
+        # Cheap: only rows whose backoff has elapsed are read.
+        "*/5 * * * *": [
+            "sowaan_cloud.utils.ssl.retry_failed_ssl",
+            "sowaan_cloud.utils.recovery.sweep_stuck_provisioning",
+            # Only reloads nginx when the map changed, e.g. after a failed reload.
+            "sowaan_cloud.utils.nginx.reconcile_site_state_map",
+        ],
+        # One asyncio pass over every Active tenant; seconds for thousands of sites.
+        "*/2 * * * *": [
+            "sowaan_cloud.utils.health.check_fleet_health",
+        ],
+    },
     "hourly": [
-        "sowaan_cloud.utils.ssl.retry_failed_ssl"
-    ]    
+        "sowaan_cloud.utils.inventory.refresh_site_inventory",
+        "sowaan_cloud.utils.metering.collect_usage_samples",
+    ],
+    "daily": [
+        "sowaan_cloud.utils.trials.process_trial_expiries",
+        "sowaan_cloud.utils.scheduler_policy.sync_scheduler_flags",
+        "sowaan_cloud.utils.metering.purge_usage_samples",
+        "sowaan_cloud.utils.tracing.prune_trace_files",
+    ],
+    "daily_long": [
+        "sowaan_cloud.utils.hibernation.hibernate_idle_sites",
+        "sowaan_cloud.utils.orphans.collect_orphans",
+        "sowaan_cloud.utils.archive.archive_subscriptions",
+    ],
 }
 # scheduler_events = {
 # 	"all": [
@@ -208,8 +234,9 @@ scheduler_events = {
 
 # Request Events
 # ----------------
-# before_request = ["sowaan_cloud.utils.before_request"]
-# after_request = ["sowaan_cloud.utils.after_request"]
+# Per-request DB/Redis counters, only active with request_profiling in site config.
+before_request = ["sowaan_cloud.utils.profiling.before_request"]
+after_request = ["sowaan_cloud.utils.profiling.after_request"]
 
 # Job Events
 # ----------
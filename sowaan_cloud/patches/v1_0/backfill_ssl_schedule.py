@@ -0,0 +1,25 @@
+import frappe
+from frappe.utils import now_datetime
+
+
+def execute():
+    # Sites that finished provisioning before `provisioned` was being set.
+    frappe.db.sql(
+        """
+        UPDATE `tabCloud Subscription`
+        SET provisioned = 1
+        WHERE status = 'Active' AND provisioning_step = 'COMPLETED' AND provisioned = 0
+        """
+    )
+
+    # retry_failed_ssl only reads rows with a due next_ssl_attempt_at.
+    frappe.db.sql(
+        """
+        UPDATE `tabCloud Subscription`
+        SET next_ssl_attempt_at = %s
+        WHERE ssl_status IN ('Failed', 'Pending') AND next_ssl_attempt_at IS NULL
+        """,
+        now_datetime(),
+    )
+
+    frappe.db.commit()
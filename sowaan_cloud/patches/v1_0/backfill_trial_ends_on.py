@@ -0,0 +1,31 @@
+import json
+import os
+
+import frappe
+
+
+def execute():
+    # Trials provisioned before trial_ends_on existed only have quota.valid_till
+    # in their site_config.json; copy it over once.
+    bench_path = frappe.db.get_single_value("Cloud Settings", "bench_path")
+    if not bench_path:
+        return
+
+    rows = frappe.get_all(
+        "Cloud Subscription",
+        filters={"status": ["in", ["Active", "Suspended"]], "site_name": ["is", "set"], "trial_ends_on": ["is", "not set"]},
+        fields=["name", "site_name"],
+    )
+
+    for row in rows:
+        config_path = os.path.join(bench_path, "sites", row.site_name, "site_config.json")
+        try:
+            with open(config_path) as f:
+                valid_till = (json.load(f).get("quota") or {}).get("valid_till")
+        except (OSError, ValueError):
+            continue
+
+        if valid_till:
+            frappe.db.set_value("Cloud Subscription", row.name, "trial_ends_on", valid_till, update_modified=False)
+
+    frappe.db.commit()
@@ -0,0 +1,69 @@
+// Copyright (c) 2026, Sowaan and contributors
+// For license information, please see license.txt
+
+const FLEET_METHOD = "sowaan_cloud.utils.fleet";
+
+frappe.ui.form.on("Cloud Fleet Operation", {
+    setup(frm) {
+        // Counters published by sowaan_cloud.utils.fleet after each site
+        frappe.realtime.on("cloud_fleet_progress", (data) => {
+            if (data.name !== frm.doc.name) return;
+            frm.dashboard.set_headline(
+                __("{0} succeeded, {1} failed, {2} running, {3} pending", [
+                    data.Success, data.Failed, data.Running, data.Pending,
+                ])
+            );
+            if (!data.Running && !data.Pending) frm.reload_doc();
+        });
+    },
+
+    refresh(frm) {
+        if (frm.is_new()) return;
+
+        const indicators = {
+            Draft: "gray", Queued: "blue", Running: "blue",
+            Paused: "orange", Halted: "red", Completed: "green",
+        };
+        frm.page.set_indicator(__(frm.doc.status), indicators[frm.doc.status] || "gray");
+
+        if (frm.doc.status === "Draft") {
+            frm.add_custom_button(__("Plan Sites"), () => call_fleet(frm, "plan_fleet_operation"));
+        }
+
+        if (["Draft", "Paused", "Halted"].includes(frm.doc.status)) {
+            const label = frm.doc.status === "Draft" ? __("Start") : __("Resume");
+            frm.add_custom_button(label, () => {
+                const message = frm.doc.dry_run
+                    ? __("Dry run {0} on {1} sites?", [frm.doc.operation, frm.doc.total_sites || __("all Active")])
+                    : __("Run {0} on {1} sites?", [frm.doc.operation, frm.doc.total_sites || __("all Active")]);
+                frappe.confirm(message, () =>
+                    call_fleet(frm, "start_fleet_operation")
+                );
+            }).addClass("btn-primary");
+        }
+
+        if (["Queued", "Running"].includes(frm.doc.status)) {
+            frm.add_custom_button(__("Pause"), () => call_fleet(frm, "pause_fleet_operation"));
+        }
+
+        if (frm.doc.status === "Completed" && frm.doc.dry_run) {
+            frm.add_custom_button(__("Apply Changes"), () => {
+                frappe.call({
+                    method: `${FLEET_METHOD}.apply_dry_run`,
+                    args: { name: frm.doc.name },
+                    freeze: true,
+                    callback: (r) => frappe.set_route("Form", "Cloud Fleet Operation", r.message),
+                });
+            }).addClass("btn-primary");
+        }
+    },
+});
+
+function call_fleet(frm, method) {
+    frappe.call({
+        method: `${FLEET_METHOD}.${method}`,
+        args: { name: frm.doc.name },
+        freeze: true,
+        callback: () => frm.reload_doc(),
+    });
+}
@@ -0,0 +1,15 @@
+# Copyright (c) 2026, Sowaan and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+from sowaan_cloud.utils.fleet import MAX_FLEET_CONCURRENCY
+
+
+class CloudFleetOperation(Document):
+	def validate(self):
+		if not 1 <= (self.concurrency or 0) <= MAX_FLEET_CONCURRENCY:
+			frappe.throw(f"Concurrency must be between 1 and {MAX_FLEET_CONCURRENCY}.")
+		if not 0 <= (self.max_error_rate or 0) <= 100:
+			frappe.throw("Max Error Rate must be between 0 and 100.")
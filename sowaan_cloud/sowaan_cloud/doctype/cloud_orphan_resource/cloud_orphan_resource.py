@@ -0,0 +1,14 @@
+# Copyright (c) 2026, Sowaan and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class CloudOrphanResource(Document):
+	pass
+
+
+def on_doctype_update():
+	# scan_orphans matches resources by type and name.
+	frappe.db.add_index("Cloud Orphan Resource", ["resource_type", "resource_name"])
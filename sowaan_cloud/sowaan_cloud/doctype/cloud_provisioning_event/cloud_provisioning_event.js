@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Sowaan and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Cloud Provisioning Event", {
+// 	refresh(frm) {
+
+// 	},
+// });
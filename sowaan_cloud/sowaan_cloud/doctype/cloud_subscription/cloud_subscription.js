@@ -12,7 +12,8 @@ const PROVISION_STEPS = [
     { key: "COMPLETED", label: "Done" },
 ];
 
-const TERMINAL_STATUSES = ["Active", "Completed", "Failed"];
+const TERMINAL_STATUSES = ["Active", "Completed", "Failed", "Suspended", "Hibernated", "Cancelled"];
+const CANCELLABLE_STATUSES = ["Draft", "Queued", "Provisioning", "Failed"];
 
 /* -------------------------------------------------- */
 /* Inject CSS once                                   */
@@ -42,11 +43,21 @@ if (!document.getElementById("provisioning-css")) {
 /* Form Controller                                   */
 /* -------------------------------------------------- */
 frappe.ui.form.on("Cloud Subscription", {
+    setup(frm) {
+        // Live bench output streamed by sowaan_cloud.utils.executor
+        frappe.realtime.on("cloud_provisioning_output", (data) => {
+            if (data.docname !== frm.doc.name) return;
+            append_provisioning_output(frm, data);
+        });
+    },
+
     refresh(frm) {
         render_package_details(frm);
 
         if (frm.is_new()) return;
 
+        render_trace_waterfall(frm);
+
         // ➕ CREATE INSTANCE BUTTON
         frm.add_custom_button(__("Create Instance"), () => {
             frappe.confirm(
@@ -69,6 +80,10 @@ frappe.ui.form.on("Cloud Subscription", {
             );
         });
 
+        add_trial_buttons(frm);
+        add_hibernation_buttons(frm);
+        add_cancel_button(frm);
+
         if (frm.doc.status === "Active" || frm.doc.status === "Completed") {
             frm.doc.provisioning_step = "COMPLETED";
         }
@@ -85,6 +100,9 @@ frappe.ui.form.on("Cloud Subscription", {
                 Active: "green",
                 Completed: "green",
                 Failed: "red",
+                Suspended: "orange",
+                Hibernated: "gray",
+                Cancelled: "darkgrey",
             };
 
             frm.page.set_indicator(
@@ -99,6 +117,12 @@ frappe.ui.form.on("Cloud Subscription", {
             return;
         }
 
+        // Bulk-created, waiting for a provisioning slot
+        if (frm.doc.status === "Queued") {
+            frm.page.set_indicator(__("Queued"), "cyan");
+            return;
+        }
+
         // 🔵 PROVISIONING
         if (frm.doc.status === "Provisioning") {
             frm.page.set_indicator(__("Provisioning"), "blue");
@@ -212,6 +236,24 @@ function render_provisioning_steps(frm) {
     frm.fields_dict.provisioning_loader.$wrapper.append(html);
 }
 
+const MAX_OUTPUT_LINES = 40;
+
+function append_provisioning_output(frm, data) {
+    frm.__provision_output = (frm.__provision_output || [])
+        .concat(data.lines.map(line => `[${data.command}] ${line}`))
+        .slice(-MAX_OUTPUT_LINES);
+
+    const wrapper = frm.fields_dict.provisioning_loader.$wrapper;
+    let $pre = wrapper.find(".provisioning-output");
+    if (!$pre.length) {
+        $pre = $(`<pre class="provisioning-output" style="max-height:240px; overflow:auto;
+                    font-size:11px; background:#f8f9fa; padding:8px; margin:10px auto; max-width:720px;"></pre>`)
+            .appendTo(wrapper);
+    }
+    $pre.text(frm.__provision_output.join("\n"));
+    $pre.scrollTop($pre[0].scrollHeight);
+}
+
 /* -------------------------------------------------- */
 /* Auto Refresh                                      */
 /* -------------------------------------------------- */
@@ -258,3 +300,148 @@ function render_package_details(frm) {
         }
     );
 }
+
+/* -------------------------------------------------- */
+/* Trace Waterfall                                    */
+/* -------------------------------------------------- */
+function render_trace_waterfall(frm) {
+    const field = frm.fields_dict.trace_waterfall;
+    if (!field || !frm.doc.trace_id) return;
+
+    frappe.call({
+        method: "sowaan_cloud.sowaan_cloud.doctype.cloud_subscription.cloud_subscription.get_trace",
+        args: { name: frm.doc.name },
+        callback(r) {
+            const spans = r.message || [];
+            if (!spans.length) {
+                field.$wrapper.html(`<span class="text-muted">${__("No spans recorded yet")}</span>`);
+                return;
+            }
+
+            const start = Math.min(...spans.map(s => s.startTimeUnixNano));
+            const end = Math.max(...spans.map(s => s.endTimeUnixNano));
+            const total = Math.max(end - start, 1);
+            const depth = span_depths(spans);
+
+            let html = `<div style="font-size:12px;">`;
+            spans.forEach(s => {
+                const left = ((s.startTimeUnixNano - start) / total) * 100;
+                const width = Math.max(((s.endTimeUnixNano - s.startTimeUnixNano) / total) * 100, 0.3);
+                const secs = ((s.endTimeUnixNano - s.startTimeUnixNano) / 1e9).toFixed(1);
+                const color = s.status === "error" ? "#dc3545" : "#0d6efd";
+
+                html += `
+                    <div style="display:flex; align-items:center; gap:8px; padding:2px 0;">
+                        <div style="width:260px; padding-left:${depth[s.spanId] * 12}px;
+                                    white-space:nowrap; overflow:hidden; text-overflow:ellipsis;"
+                             title="${frappe.utils.escape_html(s.service || "")}">
+                            ${frappe.utils.escape_html(s.name)}
+                        </div>
+                        <div style="flex:1; position:relative; height:14px; background:#f1f3f5;">
+                            <div style="position:absolute; left:${left}%; width:${width}%;
+                                        height:100%; background:${color};"></div>
+                        </div>
+                        <div style="width:60px; text-align:right;">${secs}s</div>
+                    </div>
+                `;
+            });
+            html += `</div>`;
+            field.$wrapper.html(html);
+        },
+    });
+}
+
+function span_depths(spans) {
+    const parents = {};
+    spans.forEach(s => { parents[s.spanId] = s.parentSpanId; });
+
+    const depth = {};
+    spans.forEach(s => {
+        let d = 0;
+        let p = s.parentSpanId;
+        while (p && parents[p] !== undefined && d < 20) {
+            d += 1;
+            p = parents[p];
+        }
+        depth[s.spanId] = d;
+    });
+    return depth;
+}
+
+/* -------------------------------------------------- */
+/* Trial                                             */
+/* -------------------------------------------------- */
+function add_trial_buttons(frm) {
+    if (!["Active", "Suspended", "Hibernated"].includes(frm.doc.status) || frm.doc.converted_on) return;
+
+    frm.add_custom_button(__("Extend Trial"), () => {
+        frappe.prompt(
+            { fieldname: "days", fieldtype: "Int", label: __("Days"), reqd: 1, default: 15 },
+            ({ days }) => {
+                frappe.call({
+                    method: "sowaan_cloud.utils.trials.extend_trial",
+                    args: { name: frm.doc.name, days },
+                    freeze: true,
+                    callback: () => frm.reload_doc(),
+                });
+            },
+            __("Extend Trial")
+        );
+    }, __("Trial"));
+
+    frm.add_custom_button(__("Convert to Paid"), () => {
+        frappe.confirm(__("End the trial and keep this site active without an expiry date?"), () => {
+            frappe.call({
+                method: "sowaan_cloud.utils.trials.convert_trial",
+                args: { name: frm.doc.name },
+                freeze: true,
+                callback: () => frm.reload_doc(),
+            });
+        });
+    }, __("Trial"));
+}
+
+function add_hibernation_buttons(frm) {
+    if (frm.doc.status === "Active" && frm.doc.provisioned) {
+        frm.add_custom_button(__("Hibernate"), () => {
+            frappe.confirm(__("Pause this site's scheduler and route it to the wake-up page until its next request?"), () => {
+                frappe.call({
+                    method: "sowaan_cloud.utils.hibernation.hibernate",
+                    args: { name: frm.doc.name },
+                    callback: () => frappe.show_alert(__("Hibernation queued")),
+                });
+            });
+        }, __("Hibernation"));
+    }
+
+    if (frm.doc.status === "Hibernated") {
+        frm.add_custom_button(__("Wake Up"), () => {
+            frappe.call({
+                method: "sowaan_cloud.utils.hibernation.wake",
+                args: { name: frm.doc.name },
+                callback: () => frappe.show_alert(__("Wake-up queued")),
+            });
+        }, __("Hibernation"));
+    }
+}
+
+function add_cancel_button(frm) {
+    if (!CANCELLABLE_STATUSES.includes(frm.doc.status) || frm.doc.provisioned) return;
+
+    frm.add_custom_button(__("Cancel Provisioning"), () => {
+        frappe.confirm(
+            __("Stop provisioning and remove the site, database and DNS record created so far?"),
+            () => {
+                frappe.call({
+                    method: "sowaan_cloud.utils.cancellation.cancel_provisioning",
+                    args: { name: frm.doc.name },
+                    freeze: true,
+                    callback() {
+                        frappe.show_alert({ message: __("Cancellation requested"), indicator: "orange" });
+                        frm.reload_doc();
+                    },
+                });
+            }
+        );
+    });
+}
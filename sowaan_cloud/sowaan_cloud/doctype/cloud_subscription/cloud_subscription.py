@@ -5,11 +5,26 @@ import re
 import frappe
 from frappe.model.document import Document
 
+from sowaan_cloud.utils.archive import get_subscription, reserved_names
+from sowaan_cloud.utils.provision import enqueue_provisioning
+from sowaan_cloud.utils.tracing import new_trace_id, read_trace, span
+
 
 class CloudSubscription(Document):
 	pass
 
 
+def on_doctype_update():
+	# retry_failed_ssl reads only due rows: ssl_status IN (...) AND next_ssl_attempt_at <= now
+	frappe.db.add_index("Cloud Subscription", ["ssl_status", "next_ssl_attempt_at"])
+	# dispatch_due_retries: status = 'Provisioning' AND next_retry_at <= now
+	frappe.db.add_index("Cloud Subscription", ["status", "next_retry_at"])
+	# process_trial_expiries: status = 'Active' AND trial_ends_on < / BETWEEN ...
+	frappe.db.add_index("Cloud Subscription", ["status", "trial_ends_on"])
+	# wake requests look tenants up by host
+	frappe.db.add_index("Cloud Subscription", ["site_name"])
+
+
 # Only lowercase letters, digits, hyphens; cannot start or end with a hyphen; min 2 chars.
 _VALID_INSTANCE_RE = re.compile(r'^[a-z0-9][a-z0-9-]*[a-z0-9]$')
 
@@ -123,11 +138,39 @@ def create_subscription(
 	if len(user_password) < 8:
 		frappe.throw("Password must be at least 8 characters.")
 
+	# Traced only from here: rejected requests must not each leave a trace file.
+	trace_id = new_trace_id()
+	with span("create_subscription", trace_id=trace_id, instance_name=instance_name):
+		return _create_subscription(
+			trace_id,
+			company_name,
+			abbr,
+			instance_name,
+			user_email,
+			user_password,
+			selected_package,
+			country,
+		)
+
+
+def _create_subscription(
+	trace_id,
+	company_name,
+	abbr,
+	instance_name,
+	user_email,
+	user_password,
+	selected_package,
+	country,
+):
 	# ── Layer 4: duplicate checks ─────────────────────────────────────────────
-	if frappe.db.exists("Cloud Subscription", {"company_name": company_name}):
+	# Names of archived subscriptions stay reserved.
+	archived_companies, archived_instances = reserved_names([company_name], [instance_name])
+
+	if archived_companies or frappe.db.exists("Cloud Subscription", {"company_name": company_name}):
 		frappe.throw(f'A subscription for "{company_name}" already exists.')
 
-	if frappe.db.exists("Cloud Subscription", {"instance_name": instance_name}):
+	if archived_instances or frappe.db.exists("Cloud Subscription", {"instance_name": instance_name}):
 		frappe.throw(f'Instance name "{instance_name}" is already taken.')
 
 	if not frappe.db.exists("Cloud Package", selected_package):
@@ -146,18 +189,22 @@ def create_subscription(
 		"country": country,
 		"currency": "SAR",
 		"status": "Provisioning",
+		"trace_id": trace_id,
 		"provisioning_logs": f"[REQUEST] Created from IP: {client_ip}",
 	})
-	doc.insert(ignore_permissions=True)
+	try:
+		doc.insert(ignore_permissions=True)
+	except (frappe.DuplicateEntryError, frappe.UniqueValidationError):
+		# A concurrent identical submission won the race past the checks above;
+		# the unique constraints on company_name / instance_name caught it.
+		frappe.db.rollback()
+		frappe.clear_messages()
+		if frappe.db.exists("Cloud Subscription", {"company_name": company_name}):
+			frappe.throw(f'A subscription for "{company_name}" already exists.')
+		frappe.throw(f'Instance name "{instance_name}" is already taken.')
 	frappe.db.commit()
 
-	frappe.enqueue(
-		"sowaan_cloud.utils.provision.provision_from_subscription",
-		queue="long",
-		docname=doc.name,
-		timeout=3600,
-		is_async=True,
-	)
+	enqueue_provisioning(doc.name, trace_id=trace_id)
 
 	return {"name": doc.name, "status": doc.status}
 
@@ -165,9 +212,8 @@ def create_subscription(
 @frappe.whitelist(allow_guest=True)
 def get_subscription_status(name):
 	"""Poll endpoint for the frontend to track async provisioning progress."""
-	try:
-		doc = frappe.get_doc("Cloud Subscription", name)
-	except frappe.DoesNotExistError:
+	doc = get_subscription(name)
+	if not doc:
 		frappe.throw("Subscription not found.", frappe.DoesNotExistError)
 
 	return {
@@ -176,3 +222,11 @@ def get_subscription_status(name):
 		"site_name": doc.site_name,
 		"error": doc.provisioning_logs if doc.status == "Failed" else None,
 	}
+
+
+@frappe.whitelist()
+def get_trace(name):
+	"""Spans of the subscription's provisioning trace, for the waterfall on the form."""
+	frappe.has_permission("Cloud Subscription", "read", name, throw=True)
+	trace_id = frappe.db.get_value("Cloud Subscription", name, "trace_id")
+	return read_trace(trace_id)
@@ -0,0 +1,51 @@
+// Copyright (c) 2026, Sowaan and contributors
+// For license information, please see license.txt
+
+// Fields of the archived record worth showing besides the columns above.
+const ARCHIVED_FIELDS = [
+    "abbr", "country", "currency", "selected_package", "provisioned", "trace_id",
+    "provisioning_batch", "trial_ends_on", "suspended_on", "retry_attempts", "ssl_status", "modified",
+];
+
+frappe.ui.form.on("Cloud Subscription Archive", {
+    refresh(frm) {
+        frm.disable_save();
+        frm.page.set_indicator(__(frm.doc.status), frm.doc.status === "Failed" ? "red" : "gray");
+
+        frappe.call({
+            method: "sowaan_cloud.utils.archive.get_archived_subscription",
+            args: { name: frm.doc.name },
+            callback(r) {
+                if (r.message) render_archived_record(frm, r.message);
+            },
+        });
+    },
+});
+
+function render_archived_record(frm, record) {
+    const doc = record.doc;
+    const esc = frappe.utils.escape_html;
+
+    let html = `<table class="table table-bordered table-sm" style="font-size:12px;">`;
+    ARCHIVED_FIELDS.forEach(field => {
+        if (doc[field] === null || doc[field] === undefined || doc[field] === "") return;
+        html += `<tr><th style="width:220px;">${esc(frappe.unscrub(field))}</th><td>${esc(String(doc[field]))}</td></tr>`;
+    });
+    html += `</table>`;
+
+    html += `<h6>${__("Provisioning Logs")}</h6>
+        <pre style="max-height:360px; overflow:auto; font-size:11px; background:#f8f9fa; padding:8px;">${esc(doc.provisioning_logs || "")}</pre>`;
+
+    if (record.comments.length) {
+        html += `<h6>${__("Comments")}</h6>`;
+        record.comments.forEach(c => {
+            html += `<div class="text-muted small">${esc(c.creation)} · ${esc(c.owner)} · ${esc(c.comment_type)}</div>
+                <div style="margin-bottom:8px;">${esc(frappe.utils.html2text(c.content || ""))}</div>`;
+        });
+    }
+    if (record.versions.length) {
+        html += `<div class="text-muted small">${__("{0} versions archived", [record.versions.length])}</div>`;
+    }
+
+    frm.fields_dict.record.$wrapper.html(html);
+}
@@ -0,0 +1,15 @@
+# Copyright (c) 2026, Sowaan and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class CloudSubscriptionArchive(Document):
+	pass
+
+
+def on_doctype_update():
+	# Archived company and instance names stay reserved: signups look them up.
+	frappe.db.add_index("Cloud Subscription Archive", ["company_name"])
+	frappe.db.add_index("Cloud Subscription Archive", ["instance_name"])
@@ -0,0 +1,16 @@
+# Copyright (c) 2026, Sowaan and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class CloudUsageSample(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per site per day; collect_usage_samples upserts on it.
+	frappe.db.add_unique("Cloud Usage Sample", ["site_name", "sample_date"])
+	# Capacity Forecast and purge_usage_samples scan by date.
+	frappe.db.add_index("Cloud Usage Sample", ["sample_date"])
@@ -0,0 +1,260 @@
+// Copyright (c) 2026, Sowaan and contributors
+// For license information, please see license.txt
+
+const FLEET_DASHBOARD_METHOD = "sowaan_cloud.sowaan_cloud.page.cloud_fleet_dashboard.cloud_fleet_dashboard";
+const FLEET_STATUSES = ["Draft", "Queued", "Provisioning", "Active", "Failed", "Suspended", "Hibernated", "Cancelled"];
+const FLEET_STEPS = ["INIT", "SITE_CREATED", "APPS_INSTALLED", "BOOTSTRAPPED", "COMPLETED", "FAILED"];
+const FLEET_STATUS_COLORS = {
+    Draft: "gray", Queued: "cyan", Provisioning: "blue", Active: "green",
+    Failed: "red", Suspended: "orange", Hibernated: "gray", Cancelled: "darkgrey",
+};
+const FLEET_PAGE_LENGTH = 20;
+// Sections re-read shortly after changes arrive; counts are kept current from the events themselves.
+const FLEET_LIVE_SECTIONS = ["queues", "step_p95", "ssl"];
+const FLEET_LIVE_DELAY_MS = 15 * 1000;
+const FLEET_RESYNC_MS = 5 * 60 * 1000;
+
+frappe.pages["cloud-fleet-dashboard"].on_page_load = function (wrapper) {
+    const page = frappe.ui.make_app_page({
+        parent: wrapper,
+        title: __("Cloud Fleet Dashboard"),
+        single_column: true,
+    });
+    wrapper.fleet_dashboard = new FleetDashboard(page);
+};
+
+frappe.pages["cloud-fleet-dashboard"].on_page_show = function (wrapper) {
+    if (wrapper.fleet_dashboard && wrapper.fleet_dashboard.loaded) {
+        wrapper.fleet_dashboard.refresh();
+    }
+};
+
+class FleetDashboard {
+    constructor(page) {
+        this.page = page;
+        this.counts = [];
+        this.rows = [];
+        this.total = 0;
+        this.start = 0;
+        this.loaded = false;
+
+        this.make_layout();
+        this.make_filters();
+        this.page.set_secondary_action(__("Refresh"), () => this.refresh(), "refresh");
+
+        frappe.realtime.doctype_subscribe("Cloud Subscription");
+        frappe.realtime.on("cloud_fleet_update", (data) => this.apply_update(data));
+        setInterval(() => {
+            if (frappe.get_route_str() === "cloud-fleet-dashboard") this.refresh();
+        }, FLEET_RESYNC_MS);
+
+        this.refresh().then(() => { this.loaded = true; });
+    }
+
+    make_layout() {
+        const $body = $(`
+            <div class="fleet-dashboard" style="padding: 15px 0;">
+                <div class="fleet-counts row"></div>
+                <div class="row" style="margin-top: 15px;">
+                    <div class="col-md-4"><h6>${__("In Progress by Step")}</h6><div class="fleet-steps"></div></div>
+                    <div class="col-md-4"><h6>${__("Queue Depth")}</h6><div class="fleet-queues"></div></div>
+                    <div class="col-md-4"><h6>${__("Step Duration (p95)")}</h6><div class="fleet-p95"></div></div>
+                </div>
+                <div class="row" style="margin-top: 15px;">
+                    <div class="col-md-4"><h6>${__("SSL Backlog")}</h6><div class="fleet-ssl"></div></div>
+                    <div class="col-md-8"><h6>${__("Server Capacity")}</h6><div class="fleet-capacity"></div></div>
+                </div>
+                <h6 style="margin-top: 15px;">${__("Subscriptions")}</h6>
+                <div class="fleet-list"></div>
+                <div class="fleet-pager" style="display: flex; gap: 8px; align-items: center;"></div>
+            </div>
+        `).appendTo(this.page.main);
+
+        ["counts", "steps", "queues", "p95", "ssl", "capacity", "list", "pager"].forEach((name) => {
+            this[`$${name}`] = $body.find(`.fleet-${name}`);
+        });
+    }
+
+    make_filters() {
+        const reload = () => {
+            this.start = 0;
+            this.load_page();
+        };
+        this.status_field = this.page.add_field({
+            fieldname: "status", fieldtype: "Select", label: __("Status"),
+            options: ["", ...FLEET_STATUSES], change: reload,
+        });
+        this.step_field = this.page.add_field({
+            fieldname: "step", fieldtype: "Select", label: __("Step"),
+            options: ["", ...FLEET_STEPS], change: reload,
+        });
+        this.search_field = this.page.add_field({
+            fieldname: "search", fieldtype: "Data", label: __("Search"), change: reload,
+        });
+    }
+
+    refresh() {
+        return Promise.all([this.load_overview(), this.load_page()]);
+    }
+
+    load_overview(sections) {
+        return frappe.xcall(`${FLEET_DASHBOARD_METHOD}.get_overview`, { sections }).then((overview) => {
+            if (overview.counts) {
+                this.counts = overview.counts;
+                this.render_counts();
+            }
+            if (overview.queues) this.render_queues(overview.queues);
+            if (overview.step_p95) this.render_p95(overview.step_p95);
+            if (overview.ssl) this.render_ssl(overview.ssl);
+            if (overview.capacity) this.render_capacity(overview.capacity);
+        });
+    }
+
+    load_page() {
+        return frappe.xcall(`${FLEET_DASHBOARD_METHOD}.get_subscriptions`, {
+            status: this.status_field.get_value(),
+            step: this.step_field.get_value(),
+            search: this.search_field.get_value(),
+            start: this.start,
+            page_length: FLEET_PAGE_LENGTH,
+        }).then((result) => {
+            this.rows = result.rows;
+            this.total = result.total;
+            this.render_list();
+        });
+    }
+
+    apply_update(data) {
+        // Move one subscription from its previous (status, step) group to the new one.
+        this.bump(data.previous_status, data.previous_step, -1);
+        this.bump(data.status, data.provisioning_step, 1);
+        this.render_counts();
+
+        const row = this.rows.find((r) => r.name === data.name);
+        if (row) {
+            ["status", "provisioning_step", "step_started_at", "last_error_code", "modified"].forEach((field) => {
+                if (data[field] !== undefined) row[field] = data[field];
+            });
+            this.render_list();
+        }
+
+        if (!this.live_timer) {
+            this.live_timer = setTimeout(() => {
+                this.live_timer = null;
+                this.load_overview(FLEET_LIVE_SECTIONS);
+            }, FLEET_LIVE_DELAY_MS);
+        }
+    }
+
+    bump(status, step, delta) {
+        if (!status) return;
+        step = step || "";
+        let group = this.counts.find((c) => c.status === status && c.provisioning_step === step);
+        if (!group) {
+            group = { status, provisioning_step: step, count: 0, oldest_step_started_at: null };
+            this.counts.push(group);
+        }
+        group.count = Math.max(group.count + delta, 0);
+    }
+
+    render_counts() {
+        const by_status = {};
+        this.counts.forEach((c) => { by_status[c.status] = (by_status[c.status] || 0) + c.count; });
+
+        this.$counts.html(FLEET_STATUSES.map((status) => `
+            <div class="col-md-3 col-sm-4" style="margin-bottom: 10px;">
+                <a class="fleet-status-card" data-status="${status}"
+                   style="display: block; border: 1px solid var(--border-color); border-radius: 8px; padding: 10px;">
+                    <span class="indicator-pill ${FLEET_STATUS_COLORS[status]}">${__(status)}</span>
+                    <div style="font-size: 22px; font-weight: 600; margin-top: 6px;">${by_status[status] || 0}</div>
+                </a>
+            </div>
+        `).join(""));
+
+        this.$counts.find(".fleet-status-card").on("click", (e) => {
+            this.status_field.set_value($(e.currentTarget).attr("data-status"));
+        });
+
+        const in_progress = this.counts.filter((c) => ["Queued", "Provisioning"].includes(c.status) && c.count);
+        this.$steps.html(this.table(
+            [__("Status"), __("Step"), __("Count"), __("Oldest Started")],
+            in_progress.map((c) => [
+                __(c.status),
+                c.provisioning_step,
+                c.count,
+                c.oldest_step_started_at ? frappe.datetime.comment_when(c.oldest_step_started_at) : "",
+            ])
+        ));
+    }
+
+    render_queues(queues) {
+        this.$queues.html(this.table(
+            [__("Queue"), __("Waiting"), __("Running")],
+            queues.map((q) => [q.queue, q.queued ?? __("n/a"), q.running ?? __("n/a")])
+        ));
+    }
+
+    render_p95(steps) {
+        this.$p95.html(this.table(
+            [__("Step"), __("p95")],
+            steps.map((s) => [s.step, `${s.p95_seconds}s`])
+        ));
+    }
+
+    render_ssl(rows) {
+        this.$ssl.html(this.table(
+            [__("SSL Status"), __("Count"), __("Due"), __("Gave Up")],
+            rows.map((r) => [__(r.ssl_status), r.count, r.due || 0, r.exhausted || 0])
+        ));
+    }
+
+    render_capacity(rows) {
+        this.$capacity.html(this.table(
+            [__("Server"), __("Resource"), __("Used (GB)"), __("Capacity (GB)"), __("Days Left"), __("Room for Tenants")],
+            rows.map((r) => [
+                r.server, __(r.resource), r.used_gb, r.capacity_gb ?? "",
+                r.days_left ?? "", r.tenants_that_fit ?? "",
+            ])
+        ));
+    }
+
+    render_list() {
+        const esc = frappe.utils.escape_html;
+        this.$list.html(this.table(
+            [__("Subscription"), __("Site"), __("Status"), __("Step"), __("Step Started"), __("Health"), __("SSL"), __("Last Error")],
+            this.rows.map((r) => [
+                `<a href="/app/cloud-subscription/${encodeURIComponent(r.name)}">${esc(r.name)}</a>`,
+                esc(r.site_name || ""),
+                `<span class="indicator-pill ${FLEET_STATUS_COLORS[r.status] || "gray"}">${__(r.status)}</span>`,
+                esc(r.provisioning_step || ""),
+                r.step_started_at ? frappe.datetime.comment_when(r.step_started_at) : "",
+                esc(r.health_status || ""),
+                esc(r.ssl_status || ""),
+                esc(r.last_error_code || ""),
+            ]),
+            false
+        ));
+
+        const last = Math.min(this.start + FLEET_PAGE_LENGTH, this.total);
+        this.$pager.empty().append(
+            $(`<button class="btn btn-default btn-xs">${__("Previous")}</button>`)
+                .prop("disabled", this.start === 0)
+                .on("click", () => { this.start -= FLEET_PAGE_LENGTH; this.load_page(); }),
+            $(`<span class="text-muted">${__("{0}-{1} of {2}", [this.total ? this.start + 1 : 0, last, this.total])}</span>`),
+            $(`<button class="btn btn-default btn-xs">${__("Next")}</button>`)
+                .prop("disabled", last >= this.total)
+                .on("click", () => { this.start += FLEET_PAGE_LENGTH; this.load_page(); }),
+        );
+    }
+
+    table(headers, rows, escape = true) {
+        if (!rows.length) return `<div class="text-muted">${__("Nothing to show")}</div>`;
+        const cell = (value) => (escape ? frappe.utils.escape_html(String(value)) : value);
+        return `
+            <table class="table table-bordered table-sm" style="font-size: 12px;">
+                <thead><tr>${headers.map((h) => `<th>${h}</th>`).join("")}</tr></thead>
+                <tbody>${rows.map((r) => `<tr>${r.map((v) => `<td>${cell(v)}</td>`).join("")}</tr>`).join("")}</tbody>
+            </table>
+        `;
+    }
+}
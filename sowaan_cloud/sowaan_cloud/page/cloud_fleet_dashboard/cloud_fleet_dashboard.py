@@ -0,0 +1,139 @@
+# Copyright (c) 2026, Sowaan and contributors
+# For license information, please see license.txt
+
+import json
+
+import frappe
+from frappe.utils import cint, now_datetime
+
+from sowaan_cloud.utils import metrics
+from sowaan_cloud.utils.cloud_settings import get_provisioning_queue
+from sowaan_cloud.utils.ssl import MAX_SSL_ATTEMPTS
+
+# Aggregates for the fleet dashboard. Each section is one grouped query (or
+# one Redis read); the dashboard keeps the status/step counts current from
+# cloud_fleet_update events and re-reads the other sections now and then.
+
+SECTIONS = ("counts", "queues", "step_p95", "ssl", "capacity")
+MAX_PAGE_LENGTH = 100
+LIST_FIELDS = (
+	"name",
+	"site_name",
+	"status",
+	"provisioning_step",
+	"step_started_at",
+	"health_status",
+	"ssl_status",
+	"last_error_code",
+	"modified",
+)
+
+
+@frappe.whitelist()
+def get_overview(sections=None):
+	frappe.only_for("System Manager")
+	sections = json.loads(sections) if isinstance(sections, str) else (sections or SECTIONS)
+	loaders = {
+		"counts": get_counts,
+		"queues": get_queue_depths,
+		"step_p95": get_step_p95,
+		"ssl": get_ssl_backlog,
+		"capacity": get_capacity,
+	}
+	return {section: loaders[section]() for section in sections if section in loaders}
+
+
+@frappe.whitelist()
+def get_subscriptions(status=None, step=None, search=None, start=0, page_length=20):
+	"""One page of subscriptions, newest change first, with the total for the filters."""
+	frappe.only_for("System Manager")
+	filters = {}
+	if status:
+		filters["status"] = status
+	if step:
+		filters["provisioning_step"] = step
+	or_filters = None
+	if search:
+		or_filters = {"name": ["like", f"%{search}%"], "site_name": ["like", f"%{search}%"]}
+
+	return {
+		"rows": frappe.get_all(
+			"Cloud Subscription",
+			filters=filters,
+			or_filters=or_filters,
+			fields=list(LIST_FIELDS),
+			order_by="modified desc",
+			start=cint(start),
+			page_length=min(cint(page_length) or 20, MAX_PAGE_LENGTH),
+		),
+		"total": frappe.get_all(
+			"Cloud Subscription",
+			filters=filters,
+			or_filters=or_filters,
+			fields=["count(name) as total"],
+		)[0].total,
+	}
+
+
+def get_counts():
+	"""Subscriptions per (status, step), with the oldest step start of each group."""
+	return frappe.db.sql(
+		"""
+		SELECT
+			status,
+			IFNULL(provisioning_step, '') AS provisioning_step,
+			COUNT(*) AS count,
+			MIN(step_started_at) AS oldest_step_started_at
+		FROM `tabCloud Subscription`
+		GROUP BY status, provisioning_step
+		""",
+		as_dict=True,
+	)
+
+
+def get_queue_depths():
+	"""Waiting and running jobs of the queues provisioning uses."""
+	from frappe.utils.background_jobs import get_queue
+	from rq.registry import StartedJobRegistry
+
+	depths = []
+	for name in dict.fromkeys([get_provisioning_queue(), "long", "short"]):
+		try:
+			queue = get_queue(name)
+			depths.append(
+				{"queue": name, "queued": queue.count, "running": StartedJobRegistry(queue=queue).count}
+			)
+		except Exception:
+			depths.append({"queue": name, "queued": None, "running": None})
+	return depths
+
+
+def get_step_p95():
+	"""95th percentile of each provisioning step's wall time, from the step duration histogram."""
+	p95 = metrics.histogram_quantile(metrics.STEP_DURATION, 0.95, by="step")
+	return [{"step": step, "p95_seconds": round(value, 1)} for step, value in sorted(p95.items())]
+
+
+def get_ssl_backlog():
+	return frappe.db.sql(
+		"""
+		SELECT
+			ssl_status,
+			COUNT(*) AS count,
+			SUM(next_ssl_attempt_at <= %(now)s AND ssl_attempts < %(max_attempts)s) AS due,
+			SUM(ssl_attempts >= %(max_attempts)s) AS exhausted,
+			MIN(next_ssl_attempt_at) AS oldest_attempt_at
+		FROM `tabCloud Subscription`
+		WHERE provisioned = 1 AND ssl_status IN ('Pending', 'Failed')
+		GROUP BY ssl_status
+		""",
+		{"now": now_datetime(), "max_attempts": MAX_SSL_ATTEMPTS},
+		as_dict=True,
+	)
+
+
+def get_capacity():
+	"""Per-server usage and headroom, as in the Capacity Forecast report."""
+	from sowaan_cloud.sowaan_cloud.report.capacity_forecast.capacity_forecast import get_data
+
+	return get_data(frappe._dict(days=30))
@@ -0,0 +1,14 @@
+// Copyright (c) 2026, Sowaan and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Capacity Forecast"] = {
+	filters: [
+		{
+			fieldname: "days",
+			label: __("Trend Over (Days)"),
+			fieldtype: "Int",
+			default: 30,
+			reqd: 1,
+		},
+	],
+};
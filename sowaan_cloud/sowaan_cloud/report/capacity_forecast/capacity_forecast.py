@@ -0,0 +1,188 @@
+# Copyright (c) 2026, Sowaan and contributors
+# For license information, please see license.txt
+
+import shutil
+import socket
+
+import frappe
+from frappe.utils import add_days, cint, flt, getdate
+
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+
+MB = 1024 * 1024
+LOCAL_DB_HOSTS = ("", "localhost", "127.0.0.1", "::1")
+
+
+def execute(filters=None):
+	filters = frappe._dict(filters or {})
+	data = get_data(filters)
+	return get_columns(), data, None, None, get_summary(data)
+
+
+def get_columns():
+	return [
+		{"fieldname": "server", "label": "Server", "fieldtype": "Data", "width": 160},
+		{"fieldname": "resource", "label": "Resource", "fieldtype": "Data", "width": 150},
+		{"fieldname": "used_gb", "label": "Used (GB)", "fieldtype": "Float", "width": 110},
+		{"fieldname": "capacity_gb", "label": "Capacity (GB)", "fieldtype": "Float", "width": 120},
+		{"fieldname": "growth_mb_per_day", "label": "Growth (MB/day)", "fieldtype": "Float", "width": 140},
+		{"fieldname": "days_left", "label": "Days Left", "fieldtype": "Int", "width": 100},
+		{"fieldname": "full_on", "label": "Full On", "fieldtype": "Date", "width": 110},
+		{"fieldname": "tenants", "label": "Tenants", "fieldtype": "Int", "width": 90},
+		{"fieldname": "tenants_that_fit", "label": "Room for Tenants", "fieldtype": "Int", "width": 140},
+	]
+
+
+def get_data(filters):
+	settings = get_cloud_settings()
+	from_date = add_days(getdate(), -cint(filters.days or 30))
+	totals = frappe.db.sql(
+		"""
+		SELECT
+			sample_date,
+			IFNULL(db_host, '') AS db_host,
+			SUM(db_size_mb) AS db_size_mb,
+			SUM(files_size_mb) AS files_size_mb,
+			SUM(live) AS live,
+			COUNT(*) AS tenants
+		FROM `tabCloud Usage Sample`
+		WHERE sample_date >= %(from_date)s
+		GROUP BY sample_date, db_host
+		ORDER BY sample_date
+		""",
+		{"from_date": from_date},
+		as_dict=True,
+	)
+	if not totals:
+		return []
+
+	server = socket.gethostname()
+	db_hosts = sorted({t.db_host for t in totals})
+	latest_date = max(t.sample_date for t in totals)
+	latest = {t.db_host: t for t in totals if t.sample_date == latest_date}
+	tenants = sum(t.tenants for t in latest.values())
+
+	def series(field, hosts=None):
+		by_date = {}
+		for t in totals:
+			if hosts is None or t.db_host in hosts:
+				by_date[t.sample_date] = by_date.get(t.sample_date, 0) + flt(t[field])
+		return sorted(by_date.items())
+
+	rows = []
+
+	# Bench disk: site files plus the databases stored on this machine.
+	disk = shutil.disk_usage(settings.bench_path)
+	local_hosts = [h for h in db_hosts if h in LOCAL_DB_HOSTS]
+	files = series("files_size_mb")
+	local_db = series("db_size_mb", local_hosts)
+	per_tenant = (_last(files) + _last(local_db)) / tenants if tenants else 0
+	rows.append(
+		_row(
+			server,
+			"Disk",
+			used_mb=(disk.total - disk.free) / MB,
+			capacity_mb=disk.total / MB,
+			growth=_slope(files) + _slope(local_db),
+			tenants=tenants,
+			per_tenant_mb=per_tenant,
+		)
+	)
+
+	# RAM: grows with the number of live (served, scheduled) tenants.
+	memory = _read_meminfo()
+	if memory:
+		live = series("live")
+		live_now = _last(live)
+		used = memory["MemTotal"] - memory["MemAvailable"]
+		per_tenant = flt(settings.ram_per_tenant_mb) or (used / live_now if live_now else 0)
+		rows.append(
+			_row(
+				server,
+				"RAM",
+				used_mb=used,
+				capacity_mb=memory["MemTotal"],
+				growth=_slope(live) * per_tenant,
+				tenants=cint(live_now),
+				per_tenant_mb=per_tenant,
+			)
+		)
+
+	# Database storage on each database host.
+	limit_mb = flt(settings.db_storage_limit_gb) * 1024
+	for host in db_hosts:
+		db = series("db_size_mb", [host])
+		host_tenants = latest[host].tenants if host in latest else 0
+		capacity = limit_mb or (disk.total / MB if host in LOCAL_DB_HOSTS else 0)
+		rows.append(
+			_row(
+				host or server,
+				"Database Storage",
+				used_mb=_last(db),
+				capacity_mb=capacity,
+				growth=_slope(db),
+				tenants=host_tenants,
+				per_tenant_mb=_last(db) / host_tenants if host_tenants else 0,
+			)
+		)
+
+	return rows
+
+
+def get_summary(data):
+	forecasts = [d for d in data if d.full_on]
+	first = min(forecasts, key=lambda d: d.full_on) if forecasts else None
+	room = [d.tenants_that_fit for d in data if d.tenants_that_fit is not None]
+	return [
+		{
+			"label": "First Limit Reached",
+			"value": f"{first.resource} on {first.server}, {frappe.format(first.full_on, 'Date')}" if first else "None in sight",
+			"indicator": "Red" if first and first.days_left < 30 else "Green",
+			"datatype": "Data",
+		},
+		{"label": "Room for Tenants", "value": min(room) if room else 0, "indicator": "Blue", "datatype": "Int"},
+	]
+
+
+def _row(server, resource, used_mb, capacity_mb, growth, tenants, per_tenant_mb):
+	free = capacity_mb - used_mb
+	days_left = cint(free / growth) if capacity_mb and growth > 0 else None
+	return frappe._dict(
+		server=server,
+		resource=resource,
+		used_gb=flt(used_mb / 1024, 2),
+		capacity_gb=flt(capacity_mb / 1024, 2) if capacity_mb else None,
+		growth_mb_per_day=flt(growth, 2),
+		days_left=days_left,
+		full_on=add_days(getdate(), days_left) if days_left is not None else None,
+		tenants=tenants,
+		tenants_that_fit=cint(free / per_tenant_mb) if capacity_mb and per_tenant_mb > 0 else None,
+	)
+
+
+def _slope(points):
+	"""Least-squares slope of (date, value) points, in value per day."""
+	if len(points) < 2:
+		return 0.0
+	first = points[0][0]
+	xs = [(date - first).days for date, _value in points]
+	ys = [value for _date, value in points]
+	mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+	variance = sum((x - mean_x) ** 2 for x in xs)
+	if not variance:
+		return 0.0
+	return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys, strict=True)) / variance
+
+
+def _last(points):
+	return points[-1][1] if points else 0
+
+
+def _read_meminfo():
+	"""MemTotal and MemAvailable in MB, or None off Linux."""
+	try:
+		with open("/proc/meminfo") as f:
+			values = {line.split(":")[0]: int(line.split()[1]) / 1024 for line in f}
+	except OSError:
+		return None
+	return {key: values[key] for key in ("MemTotal", "MemAvailable")}
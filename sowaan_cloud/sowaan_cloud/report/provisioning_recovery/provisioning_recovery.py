@@ -0,0 +1,60 @@
+# Copyright (c) 2026, Sowaan and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import add_days, getdate
+
+
+def execute(filters=None):
+	filters = frappe._dict(filters or {})
+	data = get_data(filters)
+	return get_columns(), data, None, None, get_summary(data)
+
+
+def get_columns():
+	return [
+		{"fieldname": "step", "label": "Step", "fieldtype": "Data", "width": 160},
+		{"fieldname": "event_type", "label": "Event", "fieldtype": "Data", "width": 180},
+		{"fieldname": "error_code", "label": "Error Class", "fieldtype": "Data", "width": 180},
+		{"fieldname": "events", "label": "Events", "fieldtype": "Int", "width": 90},
+		{"fieldname": "subscriptions", "label": "Subscriptions", "fieldtype": "Int", "width": 120},
+		{"fieldname": "lost_minutes", "label": "Time Lost (min)", "fieldtype": "Float", "width": 140},
+		{"fieldname": "avg_lost_minutes", "label": "Avg Lost (min)", "fieldtype": "Float", "width": 130},
+	]
+
+
+def get_data(filters):
+	to_date = add_days(getdate(filters.to_date), 1)
+	return frappe.db.sql(
+		"""
+		SELECT
+			step,
+			event_type,
+			IFNULL(error_code, '') AS error_code,
+			COUNT(*) AS events,
+			COUNT(DISTINCT subscription) AS subscriptions,
+			ROUND(SUM(lost_seconds) / 60, 1) AS lost_minutes,
+			ROUND(AVG(lost_seconds) / 60, 1) AS avg_lost_minutes
+		FROM `tabCloud Provisioning Event`
+		WHERE creation >= %(from_date)s AND creation < %(to_date)s
+		GROUP BY step, event_type, error_code
+		ORDER BY event_type, events DESC
+		""",
+		{"from_date": filters.from_date, "to_date": to_date},
+		as_dict=True,
+	)
+
+
+def get_summary(data):
+	resumed = sum(d.events for d in data if d.event_type == "Resumed")
+	gave_up = sum(d.events for d in data if d.event_type == "Resume Limit Reached")
+	retried = sum(d.events for d in data if d.event_type == "Retry Scheduled")
+	recovered = sum(d.events for d in data if d.event_type == "Retry Succeeded")
+	lost = sum(d.lost_minutes or 0 for d in data)
+	return [
+		{"label": "Resumed Runs", "value": resumed, "indicator": "Blue", "datatype": "Int"},
+		{"label": "Gave Up", "value": gave_up, "indicator": "Red", "datatype": "Int"},
+		{"label": "Automatic Retries", "value": retried, "indicator": "Blue", "datatype": "Int"},
+		{"label": "Recovered by Retry", "value": recovered, "indicator": "Green", "datatype": "Int"},
+		{"label": "Time Lost (min)", "value": lost, "indicator": "Orange", "datatype": "Float"},
+	]
@@ -0,0 +1,98 @@
+# Copyright (c) 2026, Sowaan and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import flt
+
+
+def execute(filters=None):
+	filters = frappe._dict(filters or {})
+	data = get_data(filters)
+	return get_columns(), data, None, None, get_summary(data)
+
+
+def get_columns():
+	return [
+		{"fieldname": "site_name", "label": "Site", "fieldtype": "Data", "width": 220},
+		{"fieldname": "subscription", "label": "Subscription", "fieldtype": "Link", "options": "Cloud Subscription", "width": 140},
+		{"fieldname": "db_host", "label": "Database Host", "fieldtype": "Data", "width": 130},
+		{"fieldname": "db_size_mb", "label": "Database (MB)", "fieldtype": "Float", "width": 120},
+		{"fieldname": "db_growth_mb", "label": "Database Growth (MB)", "fieldtype": "Float", "width": 160},
+		{"fieldname": "rows_added", "label": "Rows Added", "fieldtype": "Int", "width": 110},
+		{"fieldname": "files_size_mb", "label": "Files (MB)", "fieldtype": "Float", "width": 100},
+		{"fieldname": "files_growth_mb", "label": "Files Growth (MB)", "fieldtype": "Float", "width": 140},
+		{"fieldname": "requests", "label": "Requests", "fieldtype": "Int", "width": 100},
+		{"fieldname": "jobs", "label": "Scheduled Jobs", "fieldtype": "Int", "width": 120},
+		{"fieldname": "job_hours", "label": "Job Hours", "fieldtype": "Float", "width": 100},
+		{"fieldname": "peak_active_users", "label": "Peak Active Users", "fieldtype": "Int", "width": 140},
+	]
+
+
+def get_data(filters):
+	samples = frappe.get_all(
+		"Cloud Usage Sample",
+		filters={"sample_date": ["between", [filters.from_date, filters.to_date]]},
+		fields=[
+			"site_name",
+			"subscription",
+			"db_host",
+			"db_size_mb",
+			"db_rows",
+			"files_size_mb",
+			"requests",
+			"jobs",
+			"job_seconds",
+			"active_users",
+		],
+		order_by="sample_date asc",
+	)
+
+	sites = {}
+	for s in samples:
+		site = sites.get(s.site_name)
+		if not site:
+			site = sites[s.site_name] = frappe._dict(
+				site_name=s.site_name,
+				first_db_mb=s.db_size_mb,
+				first_rows=s.db_rows,
+				first_files_mb=s.files_size_mb,
+				requests=0,
+				jobs=0,
+				job_hours=0,
+				peak_active_users=0,
+			)
+		# Rows come in date order: the last one holds the current size.
+		site.update(
+			subscription=s.subscription,
+			db_host=s.db_host,
+			db_size_mb=s.db_size_mb,
+			db_growth_mb=flt(s.db_size_mb - site.first_db_mb, 2),
+			rows_added=s.db_rows - site.first_rows,
+			files_size_mb=s.files_size_mb,
+			files_growth_mb=flt(s.files_size_mb - site.first_files_mb, 2),
+		)
+		site.requests += s.requests
+		site.jobs += s.jobs
+		site.job_hours = flt(site.job_hours + s.job_seconds / 3600, 2)
+		site.peak_active_users = max(site.peak_active_users, s.active_users)
+
+	return sorted(sites.values(), key=lambda d: d.db_size_mb, reverse=True)
+
+
+def get_summary(data):
+	return [
+		{"label": "Tenants", "value": len(data), "indicator": "Blue", "datatype": "Int"},
+		{
+			"label": "Database Total (MB)",
+			"value": sum(d.db_size_mb for d in data),
+			"indicator": "Blue",
+			"datatype": "Float",
+		},
+		{
+			"label": "Files Total (MB)",
+			"value": sum(d.files_size_mb for d in data),
+			"indicator": "Blue",
+			"datatype": "Float",
+		},
+		{"label": "Requests", "value": sum(d.requests for d in data), "indicator": "Green", "datatype": "Int"},
+	]
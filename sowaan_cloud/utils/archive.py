@@ -0,0 +1,213 @@
+import frappe # type: ignore
+import base64
+import json
+import os
+import zlib
+from frappe.query_builder import Table # type: ignore
+from frappe.utils import add_days, cint, now_datetime # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+from sowaan_cloud.utils.provision import is_provisioning_in_flight
+
+# Archive of terminal Cloud Subscriptions.
+#
+# archive_subscriptions runs daily and moves, ARCHIVE_BATCH_SIZE at a time,
+# Failed and Cancelled subscriptions unchanged for archive_after_days (Cloud
+# Settings) out of Cloud Subscription, together with their Version and
+# Comment rows. Suspended ones follow once their site directory is gone:
+# while it exists the nginx state map needs the row to keep the site
+# suspended. Each becomes one Cloud Subscription Archive row holding the
+# searchable columns and the whole record, logs included, as compressed
+# JSON. Stored passwords are not kept.
+#
+# Archived company and instance names stay reserved (see reserved_names).
+# get_subscription reads through to the archive, so a name still resolves
+# after its subscription was archived.
+
+ARCHIVE_BATCH_SIZE = 200
+ARCHIVED_STATUSES = ("Failed", "Cancelled")
+
+# Columns copied to the archive row; everything else lives in the payload.
+ARCHIVE_COLUMNS = (
+    "company_name",
+    "instance_name",
+    "site_name",
+    "user_email",
+    "status",
+    "provisioning_step",
+    "last_error_code",
+)
+
+
+def archive_subscriptions():
+    settings = get_cloud_settings()
+    days = cint(settings.archive_after_days)
+    if not days:
+        return
+
+    cutoff = add_days(now_datetime(), -days)
+    sites_dir = os.path.join(settings.bench_path, "sites")
+    total, after = 0, ""
+    while True:
+        # Walked by name, so candidates that have to stay are not read again.
+        rows = _candidates(cutoff, after)
+        if not rows:
+            break
+        after = rows[-1].name
+
+        names = [row.name for row in rows if _can_archive(row, sites_dir)]
+        if names:
+            total += len(archive_batch(names))
+        if len(rows) < ARCHIVE_BATCH_SIZE:
+            break
+
+    if total:
+        frappe.logger("provisioning").info(f"[ARCHIVE] Archived {total} subscriptions")
+
+
+def archive_batch(names):
+    """Move the given subscriptions to the archive in one transaction. Returns the names moved."""
+    rows = frappe.get_all("Cloud Subscription", filters={"name": ["in", names]}, fields=["*"])
+    versions = _group(
+        frappe.get_all(
+            "Version",
+            filters={"ref_doctype": "Cloud Subscription", "docname": ["in", names]},
+            fields=["docname", "owner", "creation", "data"],
+            order_by="creation asc",
+        ),
+        "docname",
+    )
+    comments = _group(
+        frappe.get_all(
+            "Comment",
+            filters={"reference_doctype": "Cloud Subscription", "reference_name": ["in", names]},
+            fields=["reference_name", "comment_type", "owner", "creation", "content"],
+            order_by="creation asc",
+        ),
+        "reference_name",
+    )
+
+    now = now_datetime()
+    values = []
+    for row in rows:
+        raw = json.dumps(
+            {"doc": row, "versions": versions.get(row.name, []), "comments": comments.get(row.name, [])},
+            default=str,
+        ).encode()
+        payload = base64.b64encode(zlib.compress(raw, 9)).decode()
+        values.append([
+            row.name, now, now, "Administrator", "Administrator", row.name,
+            *(row.get(column) for column in ARCHIVE_COLUMNS),
+            row.creation, now, payload, len(raw), len(payload),
+        ])
+
+    frappe.db.bulk_insert(
+        "Cloud Subscription Archive",
+        [
+            "name", "creation", "modified", "owner", "modified_by", "subscription",
+            *ARCHIVE_COLUMNS,
+            "subscribed_on", "archived_on", "payload", "payload_size", "compressed_size",
+        ],
+        values,
+        ignore_duplicates=True,
+    )
+    # Only rows written now leave the live table; a name archived before is not overwritten.
+    moved = frappe.get_all(
+        "Cloud Subscription Archive",
+        filters={"name": ["in", names], "archived_on": now},
+        pluck="name",
+    )
+    if moved:
+        table = frappe.qb.DocType("Cloud Subscription")
+        frappe.qb.from_(table).delete().where(table.name.isin(moved)).run()
+        frappe.db.delete("Version", {"ref_doctype": "Cloud Subscription", "docname": ["in", moved]})
+        frappe.db.delete("Comment", {"reference_doctype": "Cloud Subscription", "reference_name": ["in", moved]})
+        auth = Table("__Auth")
+        frappe.qb.from_(auth).delete().where(
+            (auth.doctype == "Cloud Subscription") & auth.name.isin(moved)
+        ).run()
+    frappe.db.commit()
+    return moved
+
+
+def get_subscription(name):
+    """
+    The subscription as a dict, from the archive if it was archived (with
+    ``archived`` set and its logs restored). None if neither has it.
+    """
+    if frappe.db.exists("Cloud Subscription", name):
+        return frappe.get_doc("Cloud Subscription", name).as_dict()
+
+    payload = frappe.db.get_value("Cloud Subscription Archive", name, "payload")
+    if not payload:
+        return None
+    record = decode_payload(payload)
+    return frappe._dict(record["doc"], archived=1)
+
+
+@frappe.whitelist()
+def get_archived_subscription(name):
+    """Archived record (doc, versions, comments) for the archive form."""
+    frappe.has_permission("Cloud Subscription Archive", "read", name, throw=True)
+    return decode_payload(frappe.db.get_value("Cloud Subscription Archive", name, "payload"))
+
+
+def decode_payload(payload):
+    return json.loads(zlib.decompress(base64.b64decode(payload)))
+
+
+def reserved_names(company_names=(), instance_names=()):
+    """
+    The company names (casefolded) and instance names among those given
+    that belong to archived subscriptions.
+    """
+    companies, instances = set(), set()
+    if company_names:
+        companies = {
+            name.casefold()
+            for name in frappe.get_all(
+                "Cloud Subscription Archive",
+                filters={"company_name": ["in", list(company_names)]},
+                pluck="company_name",
+            )
+        }
+    if instance_names:
+        instances = set(
+            frappe.get_all(
+                "Cloud Subscription Archive",
+                filters={"instance_name": ["in", list(instance_names)]},
+                pluck="instance_name",
+            )
+        )
+    return companies, instances
+
+
+def _candidates(cutoff, after):
+    table = frappe.qb.DocType("Cloud Subscription")
+    return (
+        frappe.qb.from_(table)
+        .select(table.name, table.status, table.site_name)
+        .where(
+            (table.name > after)
+            & (
+                (table.status.isin(ARCHIVED_STATUSES) & (table.modified < cutoff))
+                | ((table.status == "Suspended") & (table.suspended_on < cutoff))
+            )
+        )
+        .orderby(table.name)
+        .limit(ARCHIVE_BATCH_SIZE)
+        .run(as_dict=True)
+    )
+
+
+def _can_archive(row, sites_dir):
+    if is_provisioning_in_flight(row.name):
+        return False
+    # A suspended site that still exists is kept suspended by its row in the nginx state map.
+    return not (row.status == "Suspended" and row.site_name and os.path.isdir(os.path.join(sites_dir, row.site_name)))
+
+
+def _group(rows, key):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.pop(key), []).append(row)
+    return grouped
@@ -0,0 +1,170 @@
+import frappe # type: ignore
+import hashlib
+import os
+import shutil
+from io import BytesIO
+from PIL import Image # type: ignore
+
+# Content-addressed store for branding uploads, kept under the control site's
+# public files so derivatives can still be served over HTTP to remote tenants:
+#
+#   public/files/branding_store/<sha[:2]>/<sha>/original.<ext>
+#   public/files/branding_store/<sha[:2]>/<sha>/<variant>.png
+#
+# Identical uploads (same bytes) share one directory, so derivatives are
+# generated once per hash no matter how many subscriptions use the image.
+STORE_DIRNAME = "branding_store"
+TENANT_DIRNAME = "branding"
+
+# Per-field derivative definitions. ``max_size`` is a bounding box; images are
+# never upscaled. Letterheads are sized for A4 width at 300 dpi.
+DERIVATIVES = {
+    "company_logo": {"variant": "web", "max_size": (512, 512)},
+    "letterhead_header": {"variant": "print", "max_size": (2480, 700)},
+    "letterhead_footer": {"variant": "print", "max_size": (2480, 700)},
+}
+
+# Tenants only ever reference the PNG (logos and print letterheads).
+DERIVATIVE_FORMATS = {
+    "png": {"format": "PNG", "optimize": True},
+}
+
+
+def get_store_path(*parts):
+    return frappe.get_site_path("public", "files", STORE_DIRNAME, *parts)
+
+
+def get_store_url(*parts):
+    return "/" + "/".join(["files", STORE_DIRNAME, *parts])
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def read_upload(file_url):
+    """Return the bytes of an uploaded File, or None for external / missing files."""
+    if not file_url or file_url.startswith("http"):
+        return None
+
+    file_name = frappe.db.get_value("File", {"file_url": file_url}, "name")
+    if not file_name:
+        return None
+
+    return frappe.get_doc("File", file_name).get_content()
+
+
+def ingest(content, file_url):
+    """
+    Store ``content`` in the asset store and return its hash.
+    Re-ingesting the same bytes is a no-op.
+    """
+    sha = content_hash(content)
+    ext = os.path.splitext(file_url or "")[1].lower() or ".bin"
+    obj_dir = get_store_path(sha[:2], sha)
+    original = os.path.join(obj_dir, f"original{ext}")
+
+    if not os.path.exists(original):
+        os.makedirs(obj_dir, exist_ok=True)
+        _atomic_write(original, content)
+        frappe.logger("provisioning").info(f"[BRANDING] Stored new asset {sha[:12]}")
+
+    return sha
+
+
+def ensure_derivatives(sha, field):
+    """
+    Generate the derivatives configured for ``field`` once per hash.
+    Returns {fmt: absolute path}.
+    """
+    spec = DERIVATIVES[field]
+    obj_dir = get_store_path(sha[:2], sha)
+    paths = {
+        fmt: os.path.join(obj_dir, f"{spec['variant']}.{fmt}")
+        for fmt in DERIVATIVE_FORMATS
+    }
+
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+
+    original = _find_original(obj_dir)
+    with Image.open(original) as img:
+        img.load()
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        img.thumbnail(spec["max_size"], Image.LANCZOS)
+
+        for fmt, path in paths.items():
+            if os.path.exists(path):
+                continue
+            buf = BytesIO()
+            img.save(buf, **DERIVATIVE_FORMATS[fmt])
+            _atomic_write(path, buf.getvalue())
+
+    frappe.logger("provisioning").info(
+        f"[BRANDING] Generated {spec['variant']} derivatives for {sha[:12]}"
+    )
+    return paths
+
+
+def link_into_site(src, site_path, filename):
+    """
+    Place ``src`` in the tenant's public files without going over HTTP.
+    Hardlinks when both live on the same filesystem, copies otherwise.
+    Returns the tenant-relative file URL.
+    """
+    dest_dir = os.path.join(site_path, "public", "files", TENANT_DIRNAME)
+    os.makedirs(dest_dir, exist_ok=True)
+    dest = os.path.join(dest_dir, filename)
+
+    if not os.path.exists(dest):
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+
+    return f"/files/{TENANT_DIRNAME}/{filename}"
+
+
+def prepare_branding_asset(file_url, field, site_path=None):
+    """
+    Resolve one branding upload to the URL a tenant should use.
+
+    Returns (url, is_local). With ``site_path`` the print/web PNG derivative
+    is linked into the tenant and a tenant-relative URL is returned;
+    otherwise a control-plane URL to the derivative is returned. Falls back
+    to the original URL when the upload can't be read or decoded.
+    """
+    content = read_upload(file_url)
+    if content is None:
+        return file_url, False
+
+    try:
+        sha = ingest(content, file_url)
+        paths = ensure_derivatives(sha, field)
+    except Exception:
+        frappe.logger("provisioning").exception(
+            f"[BRANDING] Could not process {file_url}, using original"
+        )
+        return file_url, False
+
+    variant = DERIVATIVES[field]["variant"]
+    if site_path and os.path.isdir(site_path):
+        url = link_into_site(paths["png"], site_path, f"{sha[:16]}-{variant}.png")
+        return url, True
+
+    return get_store_url(sha[:2], sha, f"{variant}.png"), False
+
+
+def _find_original(obj_dir):
+    for name in os.listdir(obj_dir):
+        if name.startswith("original"):
+            return os.path.join(obj_dir, name)
+    raise FileNotFoundError(f"No original in {obj_dir}")
+
+
+def _atomic_write(path, content):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
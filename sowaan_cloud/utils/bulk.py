@@ -0,0 +1,380 @@
+import frappe # type: ignore
+import csv
+import io
+import json
+from collections import Counter, defaultdict
+from frappe.query_builder import Table # type: ignore
+from frappe.query_builder.functions import Count # type: ignore
+from frappe.utils import cint, now_datetime # type: ignore
+from frappe.utils.password import encrypt # type: ignore
+from sowaan_cloud.utils.archive import reserved_names
+from sowaan_cloud.utils.locks import LeaseLock
+from sowaan_cloud.utils.provision import _VALID_INSTANCE_RE, enqueue_provisioning, publish_fleet_update
+from sowaan_cloud.utils.tracing import new_trace_id
+
+# Bulk (reseller) provisioning.
+#
+# A partner submits many tenants at once (api/bulk.py or `bench bulk-provision`).
+# The rows are validated together, a handful of queries for the whole batch
+# rather than several per row, and every accepted row is inserted in one
+# statement as a Queued Cloud Subscription of a Cloud Provisioning Batch.
+# dispatch_queued_subscriptions then moves Queued subscriptions to
+# Provisioning, highest batch priority first, keeping at most
+# max_parallel of a batch and Cloud Settings' max_concurrent_provisioning
+# overall in flight. It runs every minute and whenever a bulk subscription
+# finishes provisioning.
+
+BULK_FIELDS = ("company_name", "abbr", "instance_name", "user_email", "user_password", "selected_package", "country")
+REQUIRED_FIELDS = {
+    "company_name": "Company Name",
+    "abbr": "Abbreviation",
+    "instance_name": "Instance Name",
+    "user_email": "Email",
+    "user_password": "Password",
+    "selected_package": "Package",
+}
+DEFAULT_COUNTRY = "Saudi Arabia"
+MAX_BULK_ROWS = 1000
+
+OPEN_BATCH_STATUSES = ("Queued", "Running")
+PENDING_STATUSES = ("Draft", "Queued", "Provisioning")
+DISPATCH_JOB_ID = "bulk-provisioning-dispatch"
+DISPATCH_LEASE_TTL = 60
+
+
+def parse_tenants(tenants=None, csv_content=None):
+    """Rows from a JSON list of objects or from CSV text with a header row."""
+    if csv_content:
+        rows = list(csv.DictReader(io.StringIO(csv_content.lstrip("\ufeff"))))
+    else:
+        rows = frappe.parse_json(tenants) if isinstance(tenants, str) else tenants
+
+    if not rows or not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        frappe.throw("Provide the tenants as a non-empty list of objects or as CSV with a header row.")
+    if len(rows) > MAX_BULK_ROWS:
+        frappe.throw(f"At most {MAX_BULK_ROWS} tenants per batch; split the list.")
+
+    return [
+        {
+            field: str(row.get(field) or "") if field == "user_password" else str(row.get(field) or "").strip()
+            for field in BULK_FIELDS
+        }
+        for row in rows
+    ]
+
+
+def validate_tenants(rows):
+    """
+    Apply create_subscription's checks to every row. Returns (accepted, rejected):
+    accepted is a list of (row number, row), rejected a list of result dicts.
+    """
+    errors = {}
+    for row_no, row in enumerate(rows, 1):
+        missing = [label for field, label in REQUIRED_FIELDS.items() if not row[field].strip()]
+        if missing:
+            errors[row_no] = f"{', '.join(missing)} required"
+        elif not _VALID_INSTANCE_RE.match(row["instance_name"]):
+            errors[row_no] = "Instance name may only contain lowercase letters, numbers, and hyphens"
+        elif len(row["user_password"]) < 8:
+            errors[row_no] = "Password must be at least 8 characters"
+        row["country"] = row["country"] or DEFAULT_COUNTRY
+
+    # Names compare case-insensitively, like the unique keys.
+    companies = Counter(row["company_name"].casefold() for row in rows)
+    instances = Counter(row["instance_name"] for row in rows)
+    taken_companies = {
+        name.casefold()
+        for name in frappe.get_all(
+            "Cloud Subscription",
+            filters={"company_name": ["in", [row["company_name"] for row in rows]]},
+            pluck="company_name",
+        )
+    }
+    taken_instances = set(
+        frappe.get_all(
+            "Cloud Subscription",
+            filters={"instance_name": ["in", list(instances)]},
+            pluck="instance_name",
+        )
+    )
+    # Names of archived subscriptions stay reserved.
+    archived_companies, archived_instances = reserved_names([row["company_name"] for row in rows], list(instances))
+    taken_companies |= archived_companies
+    taken_instances |= archived_instances
+    packages = set(
+        frappe.get_all(
+            "Cloud Package",
+            filters={"name": ["in", list({row["selected_package"] for row in rows})]},
+            pluck="name",
+        )
+    )
+
+    for row_no, row in enumerate(rows, 1):
+        if row_no in errors:
+            continue
+        if row["company_name"].casefold() in taken_companies:
+            errors[row_no] = f'A subscription for "{row["company_name"]}" already exists'
+        elif row["instance_name"] in taken_instances:
+            errors[row_no] = f'Instance name "{row["instance_name"]}" is already taken'
+        elif companies[row["company_name"].casefold()] > 1:
+            errors[row_no] = f'Company "{row["company_name"]}" appears more than once in the batch'
+        elif instances[row["instance_name"]] > 1:
+            errors[row_no] = f'Instance name "{row["instance_name"]}" appears more than once in the batch'
+        elif row["selected_package"] not in packages:
+            errors[row_no] = f'Package "{row["selected_package"]}" does not exist'
+
+    accepted = [(row_no, row) for row_no, row in enumerate(rows, 1) if row_no not in errors]
+    rejected = [_rejected_row(row_no, rows[row_no - 1], error) for row_no, error in sorted(errors.items())]
+    return accepted, rejected
+
+
+def create_batch(rows, priority=0, max_parallel=4, source=None):
+    """
+    Validate ``rows``, insert the accepted ones as Queued subscriptions of a
+    new Cloud Provisioning Batch and start the dispatcher. Returns the batch name.
+    """
+    accepted, rejected = validate_tenants(rows)
+
+    batch = frappe.get_doc({
+        "doctype": "Cloud Provisioning Batch",
+        "source": source,
+        "priority": cint(priority),
+        "max_parallel": cint(max_parallel),
+        "total_rows": len(rows),
+    }).insert(ignore_permissions=True)
+
+    inserted = _insert_subscriptions(batch.name, accepted) if accepted else {}
+    # A concurrent signup can take a name between validation and insert.
+    rejected += [
+        _rejected_row(row_no, row, "Company or instance name was taken meanwhile")
+        for row_no, row in accepted
+        if row_no not in inserted
+    ]
+    rejected.sort(key=lambda r: r["row"])
+
+    batch.db_set({
+        "accepted": len(inserted),
+        "rejected": len(rejected),
+        "rejected_rows": json.dumps(rejected, indent=1) if rejected else None,
+        "status": "Queued" if inserted else "Completed",
+        "finished_at": None if inserted else now_datetime(),
+    })
+    frappe.db.commit()
+
+    frappe.logger("provisioning").info(
+        f"[BULK] {batch.name}: {len(inserted)} subscriptions queued, {len(rejected)} rows rejected"
+    )
+    if inserted:
+        enqueue_dispatch()
+    return batch.name
+
+
+def batch_status(batch):
+    """Per-row results and aggregate progress of a batch."""
+    doc = frappe.get_doc("Cloud Provisioning Batch", batch)
+    rows = [
+        {
+            "row": sub.batch_row,
+            "subscription": sub.name,
+            "company_name": sub.company_name,
+            "instance_name": sub.instance_name,
+            "status": sub.status,
+            "provisioning_step": sub.provisioning_step,
+            "site_name": sub.site_name if sub.provisioned else None,
+            "error": sub.last_error_code if sub.status == "Failed" else None,
+        }
+        for sub in frappe.get_all(
+            "Cloud Subscription",
+            filters={"provisioning_batch": batch},
+            fields=[
+                "name",
+                "batch_row",
+                "company_name",
+                "instance_name",
+                "status",
+                "provisioning_step",
+                "provisioned",
+                "site_name",
+                "last_error_code",
+            ],
+            order_by="batch_row asc",
+        )
+    ]
+    rows += [{**row, "status": "Rejected"} for row in json.loads(doc.rejected_rows or "[]")]
+    rows.sort(key=lambda r: r["row"])
+
+    progress = Counter(row["status"] for row in rows)
+    done = sum(count for status, count in progress.items() if status not in PENDING_STATUSES)
+    return {
+        "batch": doc.name,
+        "status": doc.status,
+        "priority": doc.priority,
+        "total": doc.total_rows,
+        "progress": dict(progress),
+        "percent_complete": round(100 * done / doc.total_rows, 1) if doc.total_rows else 100,
+        "started_at": doc.started_at,
+        "finished_at": doc.finished_at,
+        "rows": rows,
+    }
+
+
+def enqueue_dispatch():
+    frappe.enqueue(
+        "sowaan_cloud.utils.bulk.dispatch_queued_subscriptions",
+        queue="short",
+        job_id=DISPATCH_JOB_ID,
+        deduplicate=True,
+    )
+
+
+def dispatch_queued_subscriptions():
+    """Start provisioning of Queued bulk subscriptions within the throughput limits."""
+    lock = LeaseLock(DISPATCH_JOB_ID, ttl=DISPATCH_LEASE_TTL)
+    if not lock.acquire():
+        return
+
+    try:
+        _dispatch()
+    finally:
+        lock.release()
+
+
+def _dispatch():
+    batches = frappe.get_all(
+        "Cloud Provisioning Batch",
+        filters={"status": ["in", OPEN_BATCH_STATUSES]},
+        fields=["name", "status", "max_parallel"],
+        order_by="priority desc, creation asc",
+    )
+    if not batches:
+        return
+
+    counts = _status_counts([b.name for b in batches])
+    limit = cint(frappe.db.get_single_value("Cloud Settings", "max_concurrent_provisioning"))
+    free = limit - frappe.db.count("Cloud Subscription", {"status": "Provisioning"}) if limit else None
+    dispatched = 0
+
+    for batch in batches:
+        queued, in_flight = counts[batch.name]["Queued"], counts[batch.name]["Provisioning"]
+        if not queued:
+            if not in_flight:
+                frappe.db.set_value(
+                    "Cloud Provisioning Batch", batch.name, {"status": "Completed", "finished_at": now_datetime()}
+                )
+                frappe.db.commit()
+            continue
+
+        slots = queued
+        if batch.max_parallel:
+            slots = min(slots, batch.max_parallel - in_flight)
+        if free is not None:
+            slots = min(slots, free)
+        if slots <= 0:
+            continue
+
+        subs = frappe.get_all(
+            "Cloud Subscription",
+            filters={"provisioning_batch": batch.name, "status": "Queued"},
+            fields=["name", "trace_id", "site_name", "provisioning_step"],
+            order_by="batch_row asc",
+            limit=slots,
+        )
+        table = frappe.qb.DocType("Cloud Subscription")
+        frappe.qb.update(table).set(table.status, "Provisioning").where(
+            table.name.isin([s.name for s in subs]) & (table.status == "Queued")
+        ).run()
+        if batch.status == "Queued":
+            frappe.db.set_value(
+                "Cloud Provisioning Batch", batch.name, {"status": "Running", "started_at": now_datetime()}
+            )
+        frappe.db.commit()
+
+        for sub in subs:
+            enqueue_provisioning(sub.name, trace_id=sub.trace_id)
+            publish_fleet_update({
+                "name": sub.name,
+                "site_name": sub.site_name,
+                "status": "Provisioning",
+                "provisioning_step": sub.provisioning_step,
+                "previous_status": "Queued",
+                "previous_step": sub.provisioning_step,
+            })
+
+        dispatched += len(subs)
+        if free is not None:
+            free -= len(subs)
+
+    if dispatched:
+        frappe.logger("provisioning").info(f"[BULK] Dispatched {dispatched} queued subscriptions")
+
+
+def _status_counts(batch_names):
+    counts = defaultdict(Counter)
+    table = frappe.qb.DocType("Cloud Subscription")
+    for batch, status, count in (
+        frappe.qb.from_(table)
+        .select(table.provisioning_batch, table.status, Count("*"))
+        .where(table.provisioning_batch.isin(batch_names))
+        .groupby(table.provisioning_batch, table.status)
+        .run()
+    ):
+        counts[batch][status] = count
+    return counts
+
+
+def _insert_subscriptions(batch, accepted):
+    """
+    Insert the accepted rows in one statement (duplicates are skipped) and
+    store their passwords. Returns {row number: subscription name} of the rows inserted.
+    """
+    now, user = now_datetime(), frappe.session.user
+    fields = [
+        "name", "creation", "modified", "owner", "modified_by",
+        "company_name", "abbr", "instance_name", "user_email", "user_password", "selected_package", "country",
+        "currency", "status", "provisioning_step", "trace_id", "provisioning_logs", "provisioning_batch", "batch_row",
+    ]
+    frappe.db.bulk_insert(
+        "Cloud Subscription",
+        fields,
+        [
+            [
+                row["company_name"], now, now, user, user,
+                row["company_name"], row["abbr"], row["instance_name"], row["user_email"],
+                # The real password goes to __Auth below, as Document._save_passwords would.
+                "*" * len(row["user_password"]),
+                row["selected_package"], row["country"],
+                "SAR", "Queued", "INIT", new_trace_id(),
+                f"[REQUEST] Bulk batch {batch}, row {row_no}, by {user}", batch, row_no,
+            ]
+            for row_no, row in accepted
+        ],
+        ignore_duplicates=True,
+    )
+
+    inserted = dict(
+        frappe.get_all(
+            "Cloud Subscription",
+            filters={"provisioning_batch": batch},
+            fields=["batch_row", "name"],
+            as_list=True,
+        )
+    )
+
+    auth = Table("__Auth")
+    query = frappe.qb.into(auth).columns(auth.doctype, auth.name, auth.fieldname, auth.password, auth.encrypted)
+    for row_no, row in accepted:
+        if row_no in inserted:
+            query = query.insert("Cloud Subscription", inserted[row_no], "user_password", encrypt(row["user_password"]), 1)
+    if inserted:
+        query.run()
+
+    return inserted
+
+
+def _rejected_row(row_no, row, error):
+    return {
+        "row": row_no,
+        "company_name": row["company_name"],
+        "instance_name": row["instance_name"],
+        "error": error,
+    }
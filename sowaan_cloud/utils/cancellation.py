@@ -0,0 +1,151 @@
+import frappe # type: ignore
+import os
+import time
+from sowaan_cloud.utils import metrics
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+from sowaan_cloud.utils.locks import LeaseLock
+from sowaan_cloud.utils.site_config import read_site_config
+
+# Cancellation of a running provisioning.
+#
+# cancel_provisioning marks the subscription Cancelled and, when a worker is
+# provisioning it, raises a Redis flag holding the time of the request. The
+# worker polls the flag from the executor while a bench command runs (see
+# executor.cancel_scope) and between steps; once it is seen the command's
+# process group is terminated, the run ends and the worker is free again.
+# The time from the request to that moment is recorded as
+# sowaan_provisioning_cancel_release_seconds.
+#
+# What the run had created is removed afterwards by release_cancelled_site
+# on the long queue: the database and its user, the site directory (moved
+# to archived/sites) and the DNS record.
+
+CANCELLABLE_STATUSES = ("Draft", "Queued", "Provisioning", "Failed")
+CANCEL_FLAG_TTL = 86400
+CLEANUP_TIMEOUT = 900
+
+
+def cancel_flag_key(docname):
+    return frappe.cache().make_key(f"provision_cancel:{docname}")
+
+
+def request_cancel(docname):
+    frappe.cache().set(cancel_flag_key(docname), time.time(), ex=CANCEL_FLAG_TTL)
+
+
+def is_cancel_requested(docname):
+    return frappe.cache().get(cancel_flag_key(docname)) is not None
+
+
+def pop_cancel_request(docname):
+    """Clear the flag; returns the Unix time it was raised, or None."""
+    redis = frappe.cache()
+    key = cancel_flag_key(docname)
+    value = redis.get(key)
+    redis.delete(key)
+    return float(value) if value else None
+
+
+@frappe.whitelist()
+def cancel_provisioning(name):
+    frappe.only_for("System Manager")
+    from sowaan_cloud.utils.provision import is_provisioning_in_flight, publish_fleet_update
+
+    status, step, provisioned = frappe.db.get_value(
+        "Cloud Subscription", name, ["status", "provisioning_step", "provisioned"]
+    )
+    if status not in CANCELLABLE_STATUSES or provisioned:
+        frappe.throw(f"A {status} subscription cannot be cancelled.")
+
+    in_flight = is_provisioning_in_flight(name)
+    if in_flight:
+        # The worker stops its command and enqueues the cleanup once it is free.
+        request_cancel(name)
+
+    # modified is left alone so the worker's next save of its copy does not fail.
+    frappe.db.set_value(
+        "Cloud Subscription", name, {"status": "Cancelled", "next_retry_at": None}, update_modified=False
+    )
+    frappe.db.commit()
+    frappe.logger("provisioning").info(f"[CANCEL] {name}: cancellation requested (running: {bool(in_flight)})")
+    publish_fleet_update({
+        "name": name,
+        "status": "Cancelled",
+        "provisioning_step": step,
+        "previous_status": status,
+        "previous_step": step,
+    })
+
+    if not in_flight:
+        enqueue_cleanup(name)
+
+
+def finish_cancellation(docname):
+    """Called by the worker after a cancelled run has released the subscription."""
+    requested_at = pop_cancel_request(docname)
+    if requested_at:
+        released_after = max(time.time() - requested_at, 0)
+        metrics.observe(metrics.CANCEL_RELEASE, released_after)
+        frappe.logger("provisioning").info(
+            f"[CANCEL] {docname}: worker released {released_after:.1f}s after the request"
+        )
+    enqueue_cleanup(docname)
+
+
+def enqueue_cleanup(docname):
+    frappe.enqueue(
+        "sowaan_cloud.utils.cancellation.release_cancelled_site",
+        queue="long",
+        docname=docname,
+        timeout=CLEANUP_TIMEOUT,
+        job_id=f"cancel-cleanup::{docname}",
+        deduplicate=True,
+    )
+
+
+def release_cancelled_site(docname):
+    """Drop the database and DNS record of a cancelled subscription and archive its site directory."""
+    from sowaan_cloud.utils.mariadb import default_db_host, drop_databases_and_users
+    from sowaan_cloud.utils.orphans import archive_site
+    from sowaan_cloud.utils.provision import (
+        append_log,
+        delete_cloudflare_dns,
+        find_cloudflare_dns_records,
+        provisioning_lock_name,
+        update_subscription_state,
+    )
+
+    lock = LeaseLock(provisioning_lock_name(docname))
+    if not lock.acquire():
+        # Still running; that worker enqueues the cleanup again when it exits.
+        return
+
+    try:
+        sub = frappe.get_doc("Cloud Subscription", docname)
+        # Provisioning may have been restarted since the cancellation.
+        if sub.status != "Cancelled" or sub.provisioned or not sub.site_name:
+            return
+
+        settings = get_cloud_settings()
+        site_path = os.path.join(settings.bench_path, "sites", sub.site_name)
+        removed = []
+
+        if os.path.isdir(site_path):
+            config = read_site_config(site_path)
+            if config.get("db_name"):
+                drop_databases_and_users([config["db_name"]], host=config.get("db_host") or default_db_host())
+                removed.append(f"database {config['db_name']}")
+            archive_site(settings.bench_path, sub.site_name)
+            removed.append("site directory")
+
+        if settings.enable_dns:
+            for record in find_cloudflare_dns_records(sub.site_name):
+                delete_cloudflare_dns(record["id"])
+                removed.append(f"DNS {record['type']} record")
+
+        update_subscription_state(sub, step="INIT")
+        append_log(sub, f"[CANCEL] Removed: {', '.join(removed) or 'nothing was created'}")
+        frappe.db.commit()
+        frappe.logger("provisioning").info(f"[CANCEL] Released {sub.site_name}: {', '.join(removed) or 'nothing'}")
+    finally:
+        lock.release()
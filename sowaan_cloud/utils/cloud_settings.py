@@ -1,4 +1,9 @@
 import frappe
 
 def get_cloud_settings():
-    return frappe.get_single("Cloud Settings")
\ No newline at end of file
+    return frappe.get_single("Cloud Settings")
+
+
+def get_provisioning_queue():
+    """RQ queue for control-plane jobs (provisioning, SSL, wake-ups)."""
+    return frappe.db.get_single_value("Cloud Settings", "provisioning_queue") or "long"
@@ -0,0 +1,11 @@
+import frappe # type: ignore
+
+
+def record_provisioning_event(subscription, event_type, **fields):
+    """Append a Cloud Provisioning Event (resumes, retries, recoveries)."""
+    frappe.get_doc({
+        "doctype": "Cloud Provisioning Event",
+        "subscription": subscription,
+        "event_type": event_type,
+        **fields,
+    }).insert(ignore_permissions=True)
@@ -0,0 +1,217 @@
+import frappe # type: ignore
+import contextvars
+import os
+import selectors
+import signal
+import subprocess
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Streaming subprocess executor for bench commands.
+#
+# Output is read incrementally from both pipes and handed line by line to
+# the provisioning log and the realtime progress channel, so memory stays
+# flat regardless of how much ``bench migrate`` prints. Only a bounded tail
+# is kept for error analysis (analyze_provisioning_error / provisioning_logs).
+#
+# Inside a cancel_scope the scope's check is polled while a command runs;
+# once it reports a cancellation the command's process group is terminated
+# and CommandCancelled raised, so the worker does not wait for it to end.
+
+TAIL_LINES = 200
+READ_CHUNK = 64 * 1024
+KILL_GRACE_SECONDS = 10
+CANCEL_POLL_INTERVAL = 1.0
+CANCEL_GRACE_SECONDS = 5
+
+# Realtime event carrying live command output to the Cloud Subscription form.
+PROGRESS_EVENT = "cloud_provisioning_output"
+PROGRESS_FLUSH_INTERVAL = 1.0
+
+_progress_docname = contextvars.ContextVar("sowaan_progress_docname", default=None)
+_cancel_check = contextvars.ContextVar("sowaan_cancel_check", default=None)
+
+
+class CommandCancelled(subprocess.SubprocessError):
+    """The command was terminated because its cancel_scope was cancelled."""
+
+    def __init__(self, cmd, output=""):
+        super().__init__(f"Cancelled: {cmd}")
+        self.cmd = cmd
+        self.output_combined = output
+
+
+@contextmanager
+def progress_channel(docname):
+    """Publish output of commands run inside the block to ``docname``'s form."""
+    token = _progress_docname.set(docname)
+    try:
+        yield
+    finally:
+        _progress_docname.reset(token)
+
+
+@contextmanager
+def cancel_scope(check):
+    """Poll ``check()`` while commands run inside the block; a truthy result cancels the running one."""
+    token = _cancel_check.set(check)
+    try:
+        yield
+    finally:
+        _cancel_check.reset(token)
+
+
+class _LineForwarder:
+    """Logs each line and publishes them to the progress channel in small batches."""
+
+    def __init__(self, label):
+        self.label = label
+        self.docname = _progress_docname.get()
+        self.batch = []
+        self.last_flush = time.monotonic()
+        self.logger = frappe.logger("provisioning")
+
+    def __call__(self, stream, line):
+        self.logger.info(f"[{self.label}] {line}")
+        if not self.docname:
+            return
+        self.batch.append(line)
+        if time.monotonic() - self.last_flush >= PROGRESS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self.batch or not self.docname:
+            return
+        try:
+            frappe.publish_realtime(
+                PROGRESS_EVENT,
+                {"docname": self.docname, "command": self.label, "lines": self.batch},
+                doctype="Cloud Subscription",
+                docname=self.docname,
+            )
+        except Exception:
+            pass
+        self.batch = []
+        self.last_flush = time.monotonic()
+
+
+def stream_command(args, label, timeout=None, keep_output=False, on_line=None):
+    """
+    Run ``args`` and stream its output.
+
+    Every complete line from stdout/stderr goes to ``on_line(stream, line)``
+    (default: provisioning log + progress channel). Returns a
+    CompletedProcess whose ``stdout`` is the full output when
+    ``keep_output`` is set and the bounded tail otherwise.
+
+    Raises CalledProcessError on a non-zero exit, TimeoutExpired once
+    ``timeout`` seconds pass and CommandCancelled when the cancel_scope's
+    check fires (the process group is terminated first). All carry
+    ``output_combined`` with the tail of the output.
+    """
+    forwarder = on_line or _LineForwarder(label)
+    cancel_check = _cancel_check.get()
+    tail = deque(maxlen=TAIL_LINES)
+    captured = [] if keep_output else None
+
+    proc = subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+    deadline = time.monotonic() + timeout if timeout else None
+    next_cancel_check = time.monotonic() + CANCEL_POLL_INTERVAL
+    partial = {proc.stdout.fileno(): b"", proc.stderr.fileno(): b""}
+    names = {proc.stdout.fileno(): "stdout", proc.stderr.fileno(): "stderr"}
+
+    def emit(fd, raw):
+        line = raw.decode("utf-8", errors="replace").rstrip("\r")
+        tail.append(line)
+        if captured is not None and names[fd] == "stdout":
+            captured.append(line)
+        forwarder(names[fd], line)
+
+    sel = selectors.DefaultSelector()
+    sel.register(proc.stdout, selectors.EVENT_READ)
+    sel.register(proc.stderr, selectors.EVENT_READ)
+
+    try:
+        while sel.get_map():
+            wait = 1.0
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    terminate_process_group(proc)
+                    err = subprocess.TimeoutExpired(args, timeout, output="\n".join(tail))
+                    err.output_combined = "\n".join(tail) + f"\n[{label}] timed out after {timeout}s"
+                    raise err
+
+            if cancel_check and time.monotonic() >= next_cancel_check:
+                next_cancel_check = time.monotonic() + CANCEL_POLL_INTERVAL
+                if _cancel_requested(cancel_check):
+                    terminate_process_group(proc, grace=CANCEL_GRACE_SECONDS)
+                    raise CommandCancelled(label, "\n".join(tail) + f"\n[{label}] cancelled")
+
+            for key, _ in sel.select(timeout=wait):
+                fd = key.fileobj.fileno()
+                chunk = os.read(fd, READ_CHUNK)
+
+                if not chunk:
+                    sel.unregister(key.fileobj)
+                    if partial[fd]:
+                        emit(fd, partial[fd])
+                        partial[fd] = b""
+                    continue
+
+                *lines, partial[fd] = (partial[fd] + chunk).replace(b"\r\n", b"\n").split(b"\n")
+                for raw in lines:
+                    emit(fd, raw)
+
+        returncode = proc.wait()
+    finally:
+        sel.close()
+        if proc.poll() is None:
+            terminate_process_group(proc)
+        proc.stdout.close()
+        proc.stderr.close()
+        if hasattr(forwarder, "flush"):
+            forwarder.flush()
+
+    output = "\n".join(captured) if captured is not None else "\n".join(tail)
+
+    if returncode != 0:
+        err = subprocess.CalledProcessError(returncode, args, output="\n".join(tail))
+        err.output_combined = "\n".join(tail)
+        raise err
+
+    return subprocess.CompletedProcess(args, returncode, stdout=output, stderr="")
+
+
+def _cancel_requested(check):
+    try:
+        return check()
+    except Exception:
+        # A check that cannot be answered (e.g. Redis restarting) is not a cancellation.
+        return False
+
+
+def terminate_process_group(proc, grace=KILL_GRACE_SECONDS):
+    """SIGTERM the whole process group, then SIGKILL it if it's still alive after ``grace``."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        except PermissionError:
+            # sudo runs as root; signalling it directly still relays to the child.
+            proc.send_signal(sig)
+
+        try:
+            proc.wait(timeout=grace)
+            return
+        except subprocess.TimeoutExpired:
+            continue
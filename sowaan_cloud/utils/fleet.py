@@ -0,0 +1,502 @@
+import frappe # type: ignore
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from frappe.utils import cint, flt, now_datetime # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+from sowaan_cloud.utils.inventory import get_inventory, installed_app_set, refresh_site_inventory
+from sowaan_cloud.utils.locks import LeaseLock
+from sowaan_cloud.utils.provision import ensure_apps, execute_on_site, get_installed_apps, run_migrate
+from sowaan_cloud.utils.scheduler_policy import apply_scheduler_policy
+
+# Fleet operations: run one bench operation (migrate, package upgrade,
+# scheduler policy) across every Active tenant.
+#
+# A Cloud Fleet Operation is planned into one Cloud Fleet Operation Site row
+# per site, ordered by package and database size (smallest first), skipping
+# sites that have none of the upgraded apps installed. The runner runs the
+# canary rows one at a time, then the rest with bounded parallelism, and halts
+# when a canary fails or the error rate crosses max_error_rate. Every row
+# records its own status and timing, so a paused, halted or crashed run
+# resumes where it stopped: finished rows are never run twice. A dry run
+# only records on each row what would change.
+#
+#     bench --site <control> execute sowaan_cloud.utils.fleet.migrate_fleet \
+#         --kwargs '{"upgraded_apps": ["zatca", "sowaan_client"]}'
+#
+# Package Upgrade diffs each tenant against the current Cloud Package
+# definition and applies only the delta: install-app for missing apps, then
+# missing company modules and user roles (see utils/tenant.py).
+#
+#     bench --site <control> execute sowaan_cloud.utils.fleet.upgrade_packages \
+#         --kwargs '{"package": "Standard", "dry_run": 1}'
+
+FLEET_LEASE_TTL = 120
+FLEET_JOB_TIMEOUT = 12 * 3600
+MAX_FLEET_CONCURRENCY = 16
+# Finished sites needed before the error rate can halt a run.
+ERROR_RATE_MIN_SAMPLE = 5
+
+PROGRESS_EVENT = "cloud_fleet_progress"
+
+
+def migrate_site(row, ctx):
+    if ctx.dry_run:
+        return "Would migrate"
+    run_migrate(row.site_name, ctx.bench_path)
+    # migrate re-syncs Scheduled Job Types from hooks, undoing the hourly stagger.
+    try:
+        return apply_scheduler_policy(row.subscription, ctx.bench_path)
+    except Exception as e:
+        # The migrate itself succeeded; do not count the site as failed.
+        return f"Scheduler policy not applied: {str(e)[-500:]}"
+
+
+def scheduler_policy_site(row, ctx):
+    return apply_scheduler_policy(row.subscription, ctx.bench_path, dry_run=ctx.dry_run)
+
+
+def upgrade_package(row, ctx):
+    package = ctx.packages.get(row.package)
+    if not package:
+        frappe.throw(f"Cloud Package {row.package} not found.")
+
+    installed = get_installed_apps(row.site_name, ctx.bench_path)
+    missing_apps = [app for app in package["apps"] if app not in installed]
+    if missing_apps and not ctx.dry_run:
+        ensure_apps(row.site_name, ctx.bench_path, missing_apps)
+
+    delta = execute_on_site(
+        row.site_name,
+        ctx.bench_path,
+        "sowaan_cloud.utils.tenant.apply_package_delta",
+        {
+            "modules": package["modules"],
+            "roles": package["roles"],
+            "user_email": frappe.db.get_value("Cloud Subscription", row.subscription, "user_email"),
+            "dry_run": ctx.dry_run,
+        },
+    ) or {}
+
+    return describe_delta({"apps": missing_apps, **delta})
+
+
+# Cloud Fleet Operation.operation -> callable(row, ctx); a returned string is
+# stored as the row's changes.
+OPERATIONS = {
+    "Migrate": migrate_site,
+    "Package Upgrade": upgrade_package,
+    "Scheduler Policy": scheduler_policy_site,
+}
+
+
+def get_package_definition(package):
+    pkg = frappe.get_doc("Cloud Package", package)
+    return {
+        "apps": [row.app_name for row in pkg.apps],
+        "modules": [row.module_name for row in pkg.modules],
+        "roles": [row.role for row in pkg.roles],
+    }
+
+
+def describe_delta(delta):
+    lines = [
+        f"{label}: " + ", ".join(f"+{item}" for item in delta[key])
+        for key, label in (("apps", "Apps"), ("modules", "Modules"), ("roles", "Roles"))
+        if delta.get(key)
+    ]
+    lines += delta.get("warnings") or []
+    return "\n".join(lines) or "Up to date"
+
+
+def fleet_job_id(name):
+    return f"fleet::{name}"
+
+
+def fleet_lock_name(name):
+    return f"fleet:{name}"
+
+
+def migrate_fleet(upgraded_apps=None, concurrency=4, canary_count=2, max_error_rate=10, dry_run=False):
+    """Create and start a fleet migrate; returns the operation name."""
+    if isinstance(upgraded_apps, (list, tuple)):
+        upgraded_apps = "\n".join(upgraded_apps)
+
+    return _start_new_operation({
+        "operation": "Migrate",
+        "upgraded_apps": upgraded_apps,
+        "concurrency": concurrency,
+        "canary_count": canary_count,
+        "max_error_rate": max_error_rate,
+        "dry_run": cint(dry_run),
+    })
+
+
+def upgrade_packages(package=None, concurrency=4, canary_count=2, max_error_rate=10, dry_run=True):
+    """
+    Create and start a package upgrade (dry run unless told otherwise) for
+    one package or all of them; returns the operation name.
+    """
+    return _start_new_operation({
+        "operation": "Package Upgrade",
+        "package": package,
+        "concurrency": concurrency,
+        "canary_count": canary_count,
+        "max_error_rate": max_error_rate,
+        "dry_run": cint(dry_run),
+    })
+
+
+@frappe.whitelist()
+def apply_dry_run(name):
+    """Create a Draft copy of a completed dry run that applies the changes for real."""
+    frappe.only_for("System Manager")
+    op = frappe.get_doc("Cloud Fleet Operation", name)
+
+    if not (op.dry_run and op.status == "Completed"):
+        frappe.throw("Only a completed dry run can be applied.")
+
+    copy = frappe.copy_doc(op)
+    copy.dry_run = 0
+    copy.insert(ignore_permissions=True)
+    return copy.name
+
+
+def _start_new_operation(values):
+    op = frappe.get_doc({"doctype": "Cloud Fleet Operation", **values}).insert(ignore_permissions=True)
+    start_fleet_operation(op.name)
+    frappe.db.commit()
+    return op.name
+
+
+@frappe.whitelist()
+def plan_fleet_operation(name):
+    """(Re)build the site rows of a Draft operation."""
+    frappe.only_for("System Manager")
+    op = frappe.get_doc("Cloud Fleet Operation", name)
+
+    if op.status != "Draft":
+        frappe.throw("Only a Draft operation can be planned.")
+
+    _plan(op)
+    op.save(ignore_permissions=True)
+    return op.total_sites
+
+
+@frappe.whitelist()
+def start_fleet_operation(name):
+    """Start, or resume a Paused / Halted operation."""
+    frappe.only_for("System Manager")
+    op = frappe.get_doc("Cloud Fleet Operation", name)
+
+    if op.status in ("Queued", "Running"):
+        frappe.throw("This operation is already running.")
+    if op.status == "Completed":
+        frappe.throw("This operation has already completed.")
+
+    if not op.sites:
+        _plan(op)
+
+    op.status = "Queued"
+    op.halt_reason = None
+    op.save(ignore_permissions=True)
+
+    frappe.enqueue(
+        "sowaan_cloud.utils.fleet.run_fleet_operation",
+        queue="long",
+        name=name,
+        timeout=FLEET_JOB_TIMEOUT,
+        job_id=fleet_job_id(name),
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
+
+
+@frappe.whitelist()
+def pause_fleet_operation(name):
+    """Stop starting new sites; those already running finish first."""
+    frappe.only_for("System Manager")
+    frappe.db.set_value("Cloud Fleet Operation", name, "status", "Paused")
+
+
+def _plan(op):
+    upgraded = {a.strip() for a in (op.upgraded_apps or "").replace(",", "\n").splitlines() if a.strip()}
+
+    filters = {"status": "Active", "provisioned": 1, "site_name": ["is", "set"]}
+    if op.operation == "Package Upgrade" and op.package:
+        filters["selected_package"] = op.package
+
+    subs = frappe.get_all(
+        "Cloud Subscription",
+        filters=filters,
+        fields=["name", "site_name", "selected_package"],
+    )
+
+    # Sizes and installed apps come from the inventory, brought up to date first.
+    site_names = [s.site_name for s in subs]
+    if site_names:
+        refresh_site_inventory(site_names)
+    inventory = get_inventory(site_names, fields=["name", "db_size_mb", "installed_apps"])
+    upgrading = op.operation == "Package Upgrade"
+    packages = _load_packages({s.selected_package for s in subs}) if upgrading else {}
+
+    rows = []
+    for s in subs:
+        entry = inventory.get(s.site_name)
+        apps = installed_app_set(entry)
+        row = {
+            "subscription": s.name,
+            "site_name": s.site_name,
+            "package": s.selected_package,
+            "db_size_mb": entry.db_size_mb if entry else 0,
+            "status": "Pending",
+        }
+
+        if upgrading:
+            # Modules and roles are only known inside the tenant; the app
+            # part of the delta is previewed here and confirmed by the run.
+            package = packages.get(s.selected_package)
+            if not package:
+                row.update(status="Skipped", changes="No package")
+            elif apps is not None:
+                row["changes"] = describe_delta({"apps": [a for a in package["apps"] if a not in apps]})
+        elif upgraded and apps is not None and not (apps & upgraded):
+            # None of the upgraded apps is installed. An unknown app list
+            # (no db_name, query failed) is migrated to be safe.
+            row["status"] = "Skipped"
+
+        rows.append(row)
+
+    rows.sort(key=lambda r: (r["package"] or "", r["db_size_mb"]))
+
+    canaries = 0
+    for row in rows:
+        if row["status"] == "Pending" and canaries < cint(op.canary_count):
+            row["is_canary"] = 1
+            canaries += 1
+
+    op.set("sites", rows)
+    op.total_sites = len(rows)
+    op.skipped = sum(1 for r in rows if r["status"] == "Skipped")
+    op.succeeded = op.failed = 0
+
+
+def run_fleet_operation(name):
+    lock = LeaseLock(fleet_lock_name(name), ttl=FLEET_LEASE_TTL)
+    if not lock.acquire():
+        frappe.logger("provisioning").info(f"[FLEET] {name} is already running in another worker, exiting")
+        return
+
+    try:
+        _run_fleet_operation(name)
+    finally:
+        lock.release()
+
+
+def _run_fleet_operation(name):
+    op = frappe.get_doc("Cloud Fleet Operation", name)
+    if op.status not in ("Queued", "Running"):
+        return
+
+    # Rows a dead worker left Running are run again, and so are canaries that
+    # failed: a resumed run has to get through its canaries before the rest.
+    row_table = frappe.qb.DocType("Cloud Fleet Operation Site")
+    (
+        frappe.qb.update(row_table)
+        .set(row_table.status, "Pending")
+        .where(
+            (row_table.parent == name)
+            & (
+                (row_table.status == "Running")
+                | ((row_table.status == "Failed") & (row_table.is_canary == 1))
+            )
+        )
+    ).run()
+
+    frappe.db.set_value(
+        "Cloud Fleet Operation",
+        name,
+        {"status": "Running", "started_at": op.started_at or now_datetime(), "finished_at": None},
+    )
+    frappe.db.commit()
+
+    pending = frappe.get_all(
+        "Cloud Fleet Operation Site",
+        filters={"parent": name, "parenttype": "Cloud Fleet Operation", "status": "Pending"},
+        fields=["name", "subscription", "site_name", "package", "is_canary"],
+        order_by="idx asc",
+    )
+    ctx = frappe._dict(
+        bench_path=get_cloud_settings().bench_path,
+        dry_run=cint(op.dry_run),
+        # Package definitions as of this run, shared read-only by the workers.
+        packages=_load_packages({r.package for r in pending}) if op.operation == "Package Upgrade" else {},
+    )
+    runner = _FleetRunner(op, ctx)
+
+    for row in [r for r in pending if r.is_canary]:
+        if runner.stop_requested():
+            return runner.finish()
+        if not _run_site(op.operation, row, ctx):
+            return runner.finish(halt_reason=f"Canary site {row.site_name} failed.")
+        runner.record()
+
+    runner.run_parallel(deque(r for r in pending if not r.is_canary))
+    runner.finish()
+
+
+class _FleetRunner:
+    def __init__(self, op, ctx):
+        self.name = op.name
+        self.operation = op.operation
+        self.ctx = ctx
+        self.concurrency = max(1, min(cint(op.concurrency) or 1, MAX_FLEET_CONCURRENCY))
+        self.max_error_rate = flt(op.max_error_rate)
+        self.halt_reason = None
+
+    def run_parallel(self, pending):
+        site, sites_path, user = frappe.local.site, frappe.local.sites_path, frappe.session.user
+        in_flight = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while pending or in_flight:
+                while pending and len(in_flight) < self.concurrency and not self.halt_reason:
+                    if self.stop_requested():
+                        pending.clear()
+                        break
+                    row = pending.popleft()
+                    in_flight[pool.submit(_run_site_in_thread, site, sites_path, user, self.operation, row, self.ctx)] = row
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    row = in_flight.pop(future)
+                    if future.exception():
+                        # Failed before the row could record it (e.g. no DB connection).
+                        frappe.db.set_value(
+                            "Cloud Fleet Operation Site",
+                            row.name,
+                            {"status": "Failed", "error": str(future.exception())[-2000:], "finished_at": now_datetime()},
+                            update_modified=False,
+                        )
+
+                counts = self.record()
+                if not self.halt_reason and self._error_rate_exceeded(counts):
+                    self.halt_reason = (
+                        f"Error rate {counts['Failed']}/{counts['Failed'] + counts['Success']} "
+                        f"exceeded {self.max_error_rate}%."
+                    )
+                    pending.clear()
+
+    def _error_rate_exceeded(self, counts):
+        finished = counts["Failed"] + counts["Success"]
+        return finished >= ERROR_RATE_MIN_SAMPLE and counts["Failed"] * 100 > self.max_error_rate * finished
+
+    def stop_requested(self):
+        # New transaction so a Paused status set from the desk is visible.
+        frappe.db.commit()
+        return frappe.db.get_value("Cloud Fleet Operation", self.name, "status") != "Running"
+
+    def record(self):
+        """Refresh the counters on the operation from its rows and publish progress."""
+        frappe.db.commit()
+        counts = dict.fromkeys(("Pending", "Running", "Success", "Failed", "Skipped"), 0)
+        for status, count in frappe.get_all(
+            "Cloud Fleet Operation Site",
+            filters={"parent": self.name, "parenttype": "Cloud Fleet Operation"},
+            fields=["status", "count(name) as count"],
+            group_by="status",
+            as_list=True,
+        ):
+            counts[status] = count
+
+        frappe.db.set_value(
+            "Cloud Fleet Operation",
+            self.name,
+            {"succeeded": counts["Success"], "failed": counts["Failed"], "skipped": counts["Skipped"]},
+            update_modified=False,
+        )
+        frappe.db.commit()
+        frappe.publish_realtime(
+            PROGRESS_EVENT,
+            {"name": self.name, **counts},
+            doctype="Cloud Fleet Operation",
+            docname=self.name,
+        )
+        return counts
+
+    def finish(self, halt_reason=None):
+        halt_reason = halt_reason or self.halt_reason
+        counts = self.record()
+        status = frappe.db.get_value("Cloud Fleet Operation", self.name, "status")
+
+        if halt_reason:
+            status = "Halted"
+        elif status == "Running" and not counts["Pending"] and not counts["Running"]:
+            status = "Completed"
+
+        frappe.db.set_value(
+            "Cloud Fleet Operation",
+            self.name,
+            {"status": status, "halt_reason": halt_reason, "finished_at": now_datetime()},
+        )
+        frappe.db.commit()
+        frappe.logger("provisioning").info(
+            f"[FLEET] {self.name} {status}: {counts['Success']} ok, {counts['Failed']} failed, "
+            f"{counts['Skipped']} skipped, {counts['Pending']} pending"
+            + (f" ({halt_reason})" if halt_reason else "")
+        )
+
+
+def _run_site_in_thread(site, sites_path, user, operation, row, ctx):
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    frappe.set_user(user)
+    try:
+        return _run_site(operation, row, ctx)
+    finally:
+        frappe.destroy()
+
+
+def _load_packages(names):
+    packages = {}
+    for name in filter(None, names):
+        if frappe.db.exists("Cloud Package", name):
+            packages[name] = get_package_definition(name)
+    return packages
+
+
+def _run_site(operation, row, ctx):
+    """Run the operation on one site and record the outcome on its row. Returns True on success."""
+    frappe.db.set_value(
+        "Cloud Fleet Operation Site",
+        row.name,
+        {"status": "Running", "started_at": now_datetime(), "error": None},
+        update_modified=False,
+    )
+    frappe.db.commit()
+
+    start = time.monotonic()
+    changes = None
+    try:
+        changes = OPERATIONS[operation](row, ctx)
+        status, error = "Success", None
+    except Exception as e:
+        output = getattr(e, "output_combined", None) or str(e)
+        status, error = "Failed", output[-2000:]
+        frappe.logger("provisioning").error(f"[FLEET] {operation} failed on {row.site_name}")
+
+    values = {
+        "status": status,
+        "error": error,
+        "finished_at": now_datetime(),
+        "duration": round(time.monotonic() - start, 1),
+    }
+    if changes is not None:
+        values["changes"] = changes
+
+    frappe.db.set_value("Cloud Fleet Operation Site", row.name, values, update_modified=False)
+    frappe.db.commit()
+    return status == "Success"
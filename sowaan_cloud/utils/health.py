@@ -0,0 +1,265 @@
+import frappe # type: ignore
+import asyncio
+import ssl
+import time
+from urllib.parse import urlsplit
+from frappe.utils import cint, now_datetime # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+
+# Fleet health monitor.
+#
+# check_fleet_health probes /api/method/ping of every Active tenant from one
+# asyncio event loop, PROBE_CONCURRENCY requests at a time. Through local
+# nginx (the default) each worker keeps one keep-alive connection to nginx
+# and reuses it for every site it probes, only changing the Host header, so
+# a tick over thousands of sites costs a few hundred connections and is not
+# affected by DNS or SSL issuance. Sites with an issued certificate are
+# redirected to HTTPS by nginx, so over a plain HTTP address they are probed
+# through a second shared connection to port 443 of the same address. Through
+# the public URL every site gets its own verified HTTPS connection.
+#
+# Latency, HTTP status and the streak of consecutive failed probes are
+# written to the subscription in one bulk update. A tenant is Failing from
+# the first failed probe and Degraded after health_degraded_after of them
+# in a row (Cloud Settings); one good probe makes it Healthy again.
+
+PING_PATH = "/api/method/ping"
+PROBE_TIMEOUT = 5
+PROBE_CONCURRENCY = 100
+HEALTH_UPDATE_CHUNK = 500
+DEFAULT_DEGRADED_AFTER = 3
+DEFAULT_PROBE_ADDRESS = "http://127.0.0.1"
+USER_AGENT = "sowaan-cloud-health"
+
+
+def check_fleet_health():
+    subs = frappe.get_all(
+        "Cloud Subscription",
+        filters={"status": "Active", "provisioned": 1, "site_name": ["is", "set"]},
+        fields=["name", "site_name", "health_status", "unhealthy_streak", "ssl_status"],
+    )
+    if not subs:
+        return
+
+    started = time.monotonic()
+    results = probe_sites(
+        [s.site_name for s in subs],
+        tls_sites={s.site_name for s in subs if s.ssl_status == "Issued"},
+    )
+    degraded, recovered = record_health(subs, results)
+
+    failed = sum(1 for r in results.values() if not r.ok)
+    frappe.logger("provisioning").info(
+        f"[HEALTH] Probed {len(subs)} sites in {time.monotonic() - started:.1f}s: "
+        f"{failed} failed, {len(degraded)} newly degraded, {len(recovered)} recovered"
+    )
+    if degraded:
+        frappe.log_error(
+            title=f"{len(degraded)} tenant sites degraded",
+            message="\n".join(degraded),
+        )
+
+
+def check_site_health(site_name):
+    """Probe one site now and record the result on its subscription. Returns True if healthy."""
+    sub = frappe.db.get_value(
+        "Cloud Subscription",
+        {"site_name": site_name},
+        ["name", "site_name", "health_status", "unhealthy_streak", "ssl_status"],
+        as_dict=True,
+    )
+    results = probe_sites([site_name], tls_sites={site_name} if sub and sub.ssl_status == "Issued" else ())
+    if sub:
+        record_health([sub], results)
+    return results[site_name].ok
+
+
+def probe_sites(site_names, via=None, address=None, tls_sites=()):
+    """
+    {site_name: result} where result has ok, http_status, latency_ms and
+    error. ``tls_sites`` are those nginx serves over HTTPS only.
+    """
+    if via is None:
+        settings = get_cloud_settings()
+        via, address = settings.health_check_via, settings.health_check_address
+
+    targets = None
+    if via != "Public URL":
+        plain = urlsplit(address or DEFAULT_PROBE_ADDRESS)
+        tls = plain if plain.scheme == "https" else plain._replace(scheme="https", netloc=plain.hostname)
+        targets = (plain, tls)
+    return asyncio.run(_probe_all(site_names, targets, set(tls_sites)))
+
+
+def record_health(subs, results):
+    """
+    Write the probe results of ``subs`` in bulk. Returns the site names that
+    became Degraded and those that recovered from it.
+    """
+    degraded_after = cint(frappe.db.get_single_value("Cloud Settings", "health_degraded_after")) or DEFAULT_DEGRADED_AFTER
+    now = now_datetime()
+    updates, degraded, recovered = {}, [], []
+
+    for sub in subs:
+        result = results.get(sub.site_name)
+        if not result:
+            continue
+
+        streak = 0 if result.ok else cint(sub.unhealthy_streak) + 1
+        if result.ok:
+            status = "Healthy"
+        else:
+            status = "Degraded" if streak >= degraded_after else "Failing"
+
+        if status == "Degraded" and sub.health_status != "Degraded":
+            degraded.append(sub.site_name)
+        elif status == "Healthy" and sub.health_status == "Degraded":
+            recovered.append(sub.site_name)
+
+        updates[sub.name] = {
+            "health_status": status,
+            "unhealthy_streak": streak,
+            "last_health_check": now,
+            "health_latency_ms": result.latency_ms,
+            "health_http_status": result.http_status,
+            "health_error": (result.error or "")[:140] or None,
+        }
+
+    if updates:
+        frappe.db.bulk_update("Cloud Subscription", updates, chunk_size=HEALTH_UPDATE_CHUNK, update_modified=False)
+        frappe.db.commit()
+    return degraded, recovered
+
+
+class _Connection:
+    """A keep-alive HTTP/1.1 connection, optionally over TLS."""
+
+    def __init__(self, host, port, tls, server_hostname=None):
+        self.host, self.port, self.tls = host, port, tls
+        self.server_hostname = server_hostname
+        self.reader = self.writer = None
+
+    @property
+    def is_open(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def open(self):
+        context = None
+        if self.tls:
+            context = ssl.create_default_context()
+            if not self.server_hostname:
+                # Local nginx: routed by Host, the certificate is not the tenant's.
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, ssl=context, server_hostname=self.server_hostname if self.tls else None
+        )
+
+    async def get(self, host, path):
+        """Send a GET and read the whole response. Returns (status, body)."""
+        self.writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n"
+            f"Accept: application/json\r\n\r\n".encode("latin-1")
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip().lower()
+
+        if "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            body = await self._read_chunked()
+        else:
+            body = await self.reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection") == "close":
+            self.close()
+        return status, body
+
+    async def _read_chunked(self):
+        body = b""
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if not size:
+                # Trailers, then the blank line.
+                while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return body
+            body += (await self.reader.readexactly(size + 2))[:-2]
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def _probe_all(site_names, targets, tls_sites):
+    queue = asyncio.Queue()
+    for site_name in site_names:
+        queue.put_nowait(site_name)
+
+    results = {}
+    await asyncio.gather(
+        *(_probe_worker(queue, results, targets, tls_sites) for _ in range(min(PROBE_CONCURRENCY, len(site_names))))
+    )
+    return results
+
+
+async def _probe_worker(queue, results, targets, tls_sites):
+    # Through local nginx one connection (per scheme) serves every site this worker probes.
+    shared = {}
+    try:
+        while not queue.empty():
+            site_name = queue.get_nowait()
+            if targets:
+                target = targets[1] if site_name in tls_sites else targets[0]
+                conn = shared.get(target)
+                if conn is None:
+                    tls = target.scheme == "https"
+                    conn = shared[target] = _Connection(target.hostname, target.port or (443 if tls else 80), tls)
+            else:
+                conn = _Connection(site_name, 443, True, server_hostname=site_name)
+            results[site_name] = await _probe(conn, site_name)
+            if not targets:
+                conn.close()
+    finally:
+        for conn in shared.values():
+            conn.close()
+
+
+async def _probe(conn, site_name):
+    started = time.monotonic()
+    status = None
+    try:
+        async def request():
+            if not conn.is_open:
+                await conn.open()
+            return await conn.get(site_name, PING_PATH)
+
+        status, body = await asyncio.wait_for(request(), PROBE_TIMEOUT)
+        error = None if status == 200 and b"pong" in body else f"HTTP {status}"
+    except asyncio.TimeoutError:
+        conn.close()
+        error = f"Timed out after {PROBE_TIMEOUT}s"
+    except Exception as e:
+        conn.close()
+        error = f"{type(e).__name__}: {e}"
+
+    return frappe._dict(
+        ok=error is None,
+        http_status=status,
+        latency_ms=round((time.monotonic() - started) * 1000),
+        error=error,
+    )
@@ -0,0 +1,254 @@
+import frappe # type: ignore
+import os
+from frappe.utils import add_days, cint, get_datetime, getdate, now_datetime # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings, get_provisioning_queue
+from sowaan_cloud.utils.inventory import get_inventory, refresh_site_inventory
+from sowaan_cloud.utils.locks import LeaseLock
+from sowaan_cloud.utils.mariadb import DUMP_TIMEOUT, drop_database, dump_database, restore_database
+from sowaan_cloud.utils.nginx import sync_site_state_map
+from sowaan_cloud.utils.scheduler_policy import scheduler_paused, set_scheduler_flag
+from sowaan_cloud.utils.site_config import SiteConfigTransaction, read_site_config
+from sowaan_cloud.utils.trials import get_site_path
+
+# Hibernation of idle trial sites.
+#
+# A trial tenant whose users have not made a request for hibernate_idle_days
+# (Cloud Settings) is hibernated: its scheduler is paused, its keys are
+# evicted from the shared Redis cache and, with hibernate_drop_database, its
+# database is dumped (gzip) to the hibernation storage and dropped. The
+# subscription goes to Hibernated, which the nginx state map routes to the
+# control site's /waking page; that page wakes the site on the first request
+# (restore, unpause, back to Active) and sends the visitor on.
+#
+# Activity comes from the site inventory (tabUser.last_active of each tenant).
+
+HIBERNATION_BATCH_SIZE = 100
+CACHE_EVICT_BATCH = 500
+HIBERNATION_LEASE_TTL = 300
+
+
+def hibernation_lock_name(name):
+    return f"hibernation:{name}"
+
+
+def wake_job_id(name):
+    return f"wake::{name}"
+
+
+def hibernate_idle_sites():
+    settings = get_cloud_settings()
+    idle_days = cint(settings.hibernate_idle_days)
+    if not idle_days:
+        return
+
+    refresh_site_inventory()
+    names = find_idle_sites(idle_days)
+    for start in range(0, len(names), HIBERNATION_BATCH_SIZE):
+        hibernate_sites(names[start:start + HIBERNATION_BATCH_SIZE], drop_db=cint(settings.hibernate_drop_database))
+
+
+def find_idle_sites(idle_days):
+    """Active, unconverted trials with no user activity (or wake-up) in the last ``idle_days`` days."""
+    cutoff = add_days(now_datetime(), -idle_days)
+    subs = frappe.get_all(
+        "Cloud Subscription",
+        filters={
+            "status": "Active",
+            "provisioned": 1,
+            "site_name": ["is", "set"],
+            "converted_on": ["is", "not set"],
+        },
+        fields=["name", "site_name", "creation", "last_woken_on"],
+    )
+    inventory = get_inventory([s.site_name for s in subs], fields=["name", "last_active_at"])
+
+    idle = []
+    for s in subs:
+        if s.site_name not in inventory:
+            # Never inventoried: activity unknown.
+            continue
+        seen = [get_datetime(d) for d in (inventory[s.site_name].last_active_at, s.creation, s.last_woken_on) if d]
+        if max(seen) < cutoff:
+            idle.append(s.name)
+    return idle
+
+
+def hibernate_sites(names, drop_db=False):
+    """
+    Hibernate a batch: every site is taken out of service first (one nginx
+    reload for the batch), then databases are dumped and dropped one by one,
+    only once that reload succeeded.
+    """
+    hibernated = []
+    for name in names:
+        try:
+            _pause_site(name)
+            hibernated.append(name)
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(title=f"Hibernation failed for {name}")
+
+    if not hibernated:
+        return []
+
+    try:
+        sync_site_state_map()
+    except Exception:
+        # nginx still serves these hosts as live sites: keep their databases.
+        # They stay Hibernated with the database in place (as without
+        # drop_db) until the state map reconcile gets the reload through.
+        frappe.log_error(title="Hibernation: nginx reload failed, databases kept")
+        drop_db = False
+
+    if drop_db:
+        for name in hibernated:
+            try:
+                _archive_database(name)
+            except Exception:
+                frappe.db.rollback()
+                frappe.log_error(title=f"Hibernation: database dump failed for {name}")
+
+    frappe.logger("provisioning").info(f"[HIBERNATE] Hibernated {len(hibernated)} sites")
+    return hibernated
+
+
+@frappe.whitelist()
+def hibernate(name, drop_db=None):
+    frappe.only_for("System Manager")
+    if frappe.db.get_value("Cloud Subscription", name, "status") != "Active":
+        frappe.throw("Only an Active site can be hibernated.")
+    if drop_db is None:
+        drop_db = get_cloud_settings().hibernate_drop_database
+    frappe.enqueue(
+        "sowaan_cloud.utils.hibernation.hibernate_sites",
+        queue="long",
+        names=[name],
+        drop_db=cint(drop_db),
+        timeout=DUMP_TIMEOUT,
+        enqueue_after_commit=True,
+    )
+
+
+@frappe.whitelist()
+def wake(name):
+    frappe.only_for("System Manager")
+    enqueue_wake(name)
+
+
+def enqueue_wake(name):
+    """Enqueue wake_site once; repeated requests while it is queued or running do nothing."""
+    frappe.enqueue(
+        "sowaan_cloud.utils.hibernation.wake_site",
+        queue=get_provisioning_queue(),
+        name=name,
+        timeout=DUMP_TIMEOUT,
+        job_id=wake_job_id(name),
+        deduplicate=True,
+    )
+
+
+def wake_site(name):
+    lock = LeaseLock(hibernation_lock_name(name), ttl=HIBERNATION_LEASE_TTL)
+    # A dump of this site may still be running.
+    if not lock.acquire(wait=DUMP_TIMEOUT):
+        return
+
+    try:
+        _wake_site(name)
+    finally:
+        lock.release()
+
+
+def evict_site_cache(db_name):
+    """Delete the tenant's keys (frappe prefixes them with "<db_name>|") from the shared cache."""
+    redis = frappe.cache()
+    deleted, batch = 0, []
+
+    for key in redis.scan_iter(match=f"{db_name}|*", count=CACHE_EVICT_BATCH):
+        batch.append(key)
+        if len(batch) >= CACHE_EVICT_BATCH:
+            deleted += redis.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += redis.unlink(*batch)
+
+    return deleted
+
+
+def _pause_site(name):
+    site_name = frappe.db.get_value("Cloud Subscription", name, "site_name")
+    site_path = get_site_path(site_name)
+
+    with SiteConfigTransaction(site_path) as config:
+        config.set("pause_scheduler", 1)
+
+    db_name = read_site_config(site_path).get("db_name")
+    evicted = evict_site_cache(db_name) if db_name else 0
+
+    frappe.db.set_value("Cloud Subscription", name, {"status": "Hibernated", "hibernated_on": now_datetime()})
+    frappe.db.commit()
+    frappe.logger("provisioning").info(f"[HIBERNATE] {site_name}: scheduler paused, {evicted} cache keys evicted")
+
+
+def _archive_database(name):
+    lock = LeaseLock(hibernation_lock_name(name), ttl=HIBERNATION_LEASE_TTL)
+    if not lock.acquire():
+        return
+
+    try:
+        # Woken up meanwhile: nothing to archive.
+        if frappe.db.get_value("Cloud Subscription", name, "status") != "Hibernated":
+            return
+
+        site_name = frappe.db.get_value("Cloud Subscription", name, "site_name")
+        config = read_site_config(get_site_path(site_name))
+        db_name, db_host = config.get("db_name"), config.get("db_host")
+
+        path = os.path.join(get_storage_path(), f"{db_name}.sql.gz")
+        dump_database(db_name, path, host=db_host)
+        if not os.path.getsize(path):
+            frappe.throw(f"Empty dump for {site_name}")
+
+        # Record the dump before dropping, so a crash in between still restores on wake.
+        frappe.db.set_value("Cloud Subscription", name, "hibernation_dump", path)
+        frappe.db.commit()
+        drop_database(db_name, host=db_host)
+        frappe.logger("provisioning").info(f"[HIBERNATE] {site_name}: database dumped to {path} and dropped")
+    finally:
+        lock.release()
+
+
+def _wake_site(name):
+    sub = frappe.get_doc("Cloud Subscription", name)
+    if sub.status != "Hibernated":
+        return
+
+    site_path = get_site_path(sub.site_name)
+    config = read_site_config(site_path)
+
+    if sub.hibernation_dump:
+        restore_database(config.get("db_name"), sub.hibernation_dump, host=config.get("db_host"))
+
+    values = {"status": "Active", "hibernated_on": None, "hibernation_dump": None, "last_woken_on": now_datetime()}
+    # A trial that ran out while asleep wakes up suspended.
+    if sub.trial_ends_on and not sub.converted_on and getdate(sub.trial_ends_on) < getdate():
+        values.update(status="Suspended", suspended_on=now_datetime())
+
+    with SiteConfigTransaction(site_path) as txn:
+        set_scheduler_flag(txn, scheduler_paused(values["status"], sub.selected_package))
+
+    frappe.db.set_value("Cloud Subscription", name, values)
+    frappe.db.commit()
+    sync_site_state_map()
+
+    if sub.hibernation_dump and os.path.exists(sub.hibernation_dump):
+        os.remove(sub.hibernation_dump)
+
+    frappe.logger("provisioning").info(f"[HIBERNATE] {sub.site_name} woken up ({values['status']})")
+
+
+def get_storage_path():
+    settings = get_cloud_settings()
+    path = settings.hibernation_storage_path or os.path.join(settings.bench_path, "hibernated")
+    os.makedirs(path, exist_ok=True)
+    return path
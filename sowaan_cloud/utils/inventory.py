@@ -0,0 +1,221 @@
+import frappe # type: ignore
+import json
+import os
+from collections import defaultdict
+from frappe.utils import flt, now_datetime # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+from sowaan_cloud.utils.mariadb import (
+    default_db_host,
+    get_app_versions_by_db,
+    get_last_active_by_db,
+    get_schema_sizes,
+)
+from sowaan_cloud.utils.site_config import read_site_config
+
+# Cloud Site Inventory: one row per provisioned tenant with its installed apps
+# and versions, database and files size, selected site_config flags and last
+# migrate and activity times, so the control plane can answer "what does the fleet look
+# like" without a bench process per site.
+#
+# The refresh is incremental: site_config.json is parsed only when its mtime
+# changed, files are only summed when a files directory changed, and the
+# database part is a couple of bulk queries per database host. Rows are
+# written only when something differs.
+
+# site_config keys copied to the inventory. Never credentials.
+CONFIG_FLAGS = (
+    "maintenance_mode",
+    "pause_scheduler",
+    "developer_mode",
+    "skip_setup_wizard",
+    "request_profiling",
+    "quota",
+    "limits",
+)
+
+# Values written from the filesystem / databases on each refresh.
+INVENTORY_FIELDS = (
+    "subscription",
+    "package",
+    "db_name",
+    "db_host",
+    "config_flags",
+    "config_mtime",
+    "db_size_mb",
+    "files_size_mb",
+    "files_mtime",
+    "installed_apps",
+    "app_versions",
+    "last_migrated_at",
+    "last_active_at",
+)
+
+
+def refresh_site_inventory(site_names=None):
+    """
+    Bring the inventory up to date for ``site_names`` (default: every
+    provisioned tenant; rows of sites that are gone are removed then).
+    Returns the number of rows inserted or changed.
+    """
+    sites_dir = os.path.join(get_cloud_settings().bench_path, "sites")
+    filters = {"provisioned": 1, "site_name": ["is", "set"]}
+    if site_names:
+        filters["site_name"] = ["in", list(site_names)]
+
+    subs = frappe.get_all(
+        "Cloud Subscription",
+        filters=filters,
+        fields=["name", "site_name", "selected_package", "hibernation_dump"],
+    )
+    if site_names and not subs:
+        return 0
+
+    existing = {
+        row.name: row
+        for row in frappe.get_all(
+            "Cloud Site Inventory",
+            filters={"name": ["in", [s.site_name for s in subs]]} if site_names else None,
+            fields=["name", *INVENTORY_FIELDS],
+        )
+    }
+
+    dropped = {s.site_name for s in subs if s.hibernation_dump}
+    current = {}
+    for sub in subs:
+        previous = existing.get(sub.site_name) or frappe._dict()
+        current[sub.site_name] = _read_site_files(sub, previous, os.path.join(sites_dir, sub.site_name))
+
+    # A hibernated site whose database was dumped and dropped keeps its last known values.
+    _read_databases({site: values for site, values in current.items() if site not in dropped})
+
+    changed = 0
+    for site_name, values in current.items():
+        if _write_row(site_name, values, existing.get(site_name)):
+            changed += 1
+
+    if current:
+        table = frappe.qb.DocType("Cloud Site Inventory")
+        frappe.qb.update(table).set(table.refreshed_at, now_datetime()).where(
+            table.name.isin(list(current))
+        ).run()
+
+    removed = [] if site_names else [name for name in existing if name not in current]
+    for name in removed:
+        frappe.delete_doc("Cloud Site Inventory", name, ignore_permissions=True, force=True)
+
+    frappe.db.commit()
+    frappe.logger("provisioning").info(
+        f"[INVENTORY] Refreshed {len(current)} sites: {changed} changed, {len(removed)} removed"
+    )
+    return changed
+
+
+def get_inventory(site_names=None, fields=None):
+    """Inventory rows as dicts keyed by site name."""
+    rows = frappe.get_all(
+        "Cloud Site Inventory",
+        filters={"name": ["in", list(site_names)]} if site_names is not None else None,
+        fields=fields or ["name", *INVENTORY_FIELDS],
+    )
+    return {row.name: row for row in rows}
+
+
+def installed_app_set(row):
+    return set((row.installed_apps or "").split()) if row and row.installed_apps else None
+
+
+def _read_site_files(sub, previous, site_path):
+    values = {
+        "subscription": sub.name,
+        "package": sub.selected_package,
+        "db_name": previous.db_name,
+        "db_host": previous.db_host,
+    }
+
+    config_mtime = _mtime(os.path.join(site_path, "site_config.json"))
+    if config_mtime != flt(previous.config_mtime, 6):
+        config = read_site_config(site_path)
+        values.update(
+            db_name=config.get("db_name"),
+            db_host=config.get("db_host") or default_db_host(),
+            config_flags=json.dumps({k: config[k] for k in CONFIG_FLAGS if k in config}, sort_keys=True),
+            config_mtime=config_mtime,
+        )
+
+    # Uploads land directly in these directories, so their mtime moves with them.
+    file_dirs = [os.path.join(site_path, "public", "files"), os.path.join(site_path, "private", "files")]
+    files_mtime = max(_mtime(d) for d in file_dirs)
+    if files_mtime != flt(previous.files_mtime, 6):
+        values.update(
+            files_size_mb=flt(sum(_dir_size(d) for d in file_dirs) / (1024 * 1024), 2),
+            files_mtime=files_mtime,
+        )
+
+    return values
+
+
+def _read_databases(current):
+    by_host = defaultdict(list)
+    for values in current.values():
+        if values.get("db_name"):
+            by_host[values["db_host"] or default_db_host()].append(values["db_name"])
+
+    for host, db_names in by_host.items():
+        try:
+            sizes = get_schema_sizes(db_names, host=host)
+            versions = get_app_versions_by_db(db_names, host=host)
+            last_active = get_last_active_by_db(db_names, host=host)
+        except Exception:
+            # Keep the last known values for this host.
+            frappe.log_error(title=f"Site inventory: database host {host} unreachable")
+            continue
+
+        for values in current.values():
+            db_name = values.get("db_name")
+            if (values["db_host"] or default_db_host()) != host or (db_name not in sizes and db_name not in versions):
+                continue
+            apps = versions.get(db_name) or {"apps": {}, "migrated_at": None}
+            values.update(
+                db_size_mb=flt(sizes.get(db_name, 0) / (1024 * 1024), 2),
+                installed_apps="\n".join(sorted(apps["apps"])),
+                app_versions=json.dumps(apps["apps"], sort_keys=True),
+                last_migrated_at=apps["migrated_at"],
+                last_active_at=last_active.get(db_name),
+            )
+
+
+def _write_row(site_name, values, previous):
+    if previous is None:
+        frappe.get_doc({"doctype": "Cloud Site Inventory", "site_name": site_name, **values}).insert(
+            ignore_permissions=True
+        )
+        return True
+
+    changed = {field: value for field, value in values.items() if _differs(field, previous.get(field), value)}
+    if changed:
+        frappe.db.set_value("Cloud Site Inventory", site_name, changed, update_modified=False)
+    return bool(changed)
+
+
+def _differs(field, old, new):
+    if field in ("config_mtime", "files_mtime"):
+        return flt(old, 6) != flt(new, 6)
+    return (old or None) != (new or None)
+
+
+def _mtime(path):
+    try:
+        return round(os.stat(path).st_mtime, 6)
+    except OSError:
+        return 0
+
+
+def _dir_size(path):
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
@@ -0,0 +1,141 @@
+import frappe # type: ignore
+import threading
+import time
+import uuid
+
+# Compare-and-set scripts so a worker can only renew or release its own lease.
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLock:
+    """
+    Redis lease lock with heartbeat renewal.
+
+    The lease expires after ``ttl`` seconds unless the holder keeps renewing
+    it, so a killed worker never blocks a subscription for longer than one
+    TTL. A background thread renews every ``ttl / 3`` seconds and stamps a
+    heartbeat key that outlives the lease (see ``last_heartbeat``).
+
+        lock = LeaseLock("provision:ACME")
+        if not lock.acquire():
+            return  # someone else holds it
+        try:
+            ...
+        finally:
+            lock.release()
+    """
+
+    def __init__(self, name, ttl=120):
+        self.name = name
+        self.ttl = ttl
+        self.token = uuid.uuid4().hex
+        self.redis = frappe.cache()
+        self.key = self.redis.make_key(f"lease:{name}")
+        self.heartbeat_key = self.redis.make_key(f"lease_hb:{name}")
+        self.acquired_at = None
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self, wait=0, poll_interval=0.5):
+        """Try to take the lease, waiting up to ``wait`` seconds. Returns True on success."""
+        start = time.monotonic()
+
+        while True:
+            if self.redis.set(self.key, self.token, nx=True, px=int(self.ttl * 1000)):
+                self.acquired_at = time.monotonic()
+                self._beat()
+                self._start_heartbeat()
+                frappe.logger("provisioning").info(
+                    f"[LOCK] Acquired {self.name} after {self.acquired_at - start:.2f}s"
+                )
+                return True
+
+            if time.monotonic() - start >= wait:
+                frappe.logger("provisioning").info(
+                    f"[LOCK] {self.name} is held by another worker (waited {time.monotonic() - start:.2f}s)"
+                )
+                return False
+
+            time.sleep(poll_interval)
+
+    def release(self):
+        if self.acquired_at is None:
+            return
+
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+        self.redis.eval(_RELEASE_SCRIPT, 1, self.key, self.token)
+        frappe.logger("provisioning").info(
+            f"[LOCK] Released {self.name}, held {time.monotonic() - self.acquired_at:.2f}s"
+        )
+        self.acquired_at = None
+
+    def _start_heartbeat(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._heartbeat_loop,
+            name=f"lease-heartbeat:{self.name}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _heartbeat_loop(self):
+        interval = max(self.ttl / 3, 1)
+        while not self._stop.wait(interval):
+            try:
+                renewed = self.redis.eval(
+                    _RENEW_SCRIPT, 1, self.key, self.token, int(self.ttl * 1000)
+                )
+            except Exception:
+                # Transient Redis error: the lease still has up to 2/3 TTL left.
+                continue
+
+            if not renewed:
+                self.lost = True
+                return
+
+            self._beat()
+
+    def _beat(self):
+        # Kept for a day so the stuck-job sweeper can tell when a dead worker last ran.
+        self.redis.set(self.heartbeat_key, time.time(), ex=86400)
+
+    def __enter__(self):
+        if not self.acquire():
+            raise LeaseHeldError(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class LeaseHeldError(Exception):
+    pass
+
+
+def is_lease_held(name):
+    redis = frappe.cache()
+    # Raw GET: RedisWrapper.exists() would prefix the key a second time.
+    return redis.get(redis.make_key(f"lease:{name}")) is not None
+
+
+def last_heartbeat(name):
+    """Unix timestamp of the holder's last heartbeat for ``name``, or None."""
+    redis = frappe.cache()
+    value = redis.get(redis.make_key(f"lease_hb:{name}"))
+    return float(value) if value else None
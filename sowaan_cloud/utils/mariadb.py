@@ -0,0 +1,332 @@
+import frappe # type: ignore
+import os
+import re
+import shlex
+import subprocess
+from contextlib import contextmanager
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+
+# Direct MariaDB access to tenant schemas, with the root credentials from
+# Cloud Settings (the ones bench new-site uses). Lets fleet-wide questions be
+# answered with a few queries against the server instead of one bench
+# process per site.
+
+# Frappe db names are "_" + hex; refuse anything that would need quoting.
+_SCHEMA_RE = re.compile(r"^[A-Za-z0-9_]+$")
+
+QUERY_CHUNK = 100
+DUMP_TIMEOUT = 3600
+
+
+def default_db_host():
+    return frappe.conf.get("db_host") or "127.0.0.1"
+
+
+def root_credentials(host=None):
+    return {
+        "host": host or default_db_host(),
+        "port": int(frappe.conf.get("db_port") or 3306),
+        "user": frappe.conf.get("root_login") or "root",
+        "password": get_cloud_settings().get_password("sql_password"),
+    }
+
+
+@contextmanager
+def root_connection(host=None):
+    """Root connection to ``host`` (a tenant's db_host), or the bench's own server."""
+    import pymysql # type: ignore
+
+    conn = pymysql.connect(**root_credentials(host), charset="utf8mb4", autocommit=True)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def valid_schemas(db_names):
+    return [db for db in set(db_names) if db and _SCHEMA_RE.match(db)]
+
+
+def get_schema_sizes(db_names, host=None):
+    """{db_name: bytes of data + indexes} from information_schema, in one query per chunk."""
+    db_names = valid_schemas(db_names)
+    sizes = {}
+
+    with root_connection(host) as conn, conn.cursor() as cur:
+        for chunk in _chunks(db_names):
+            cur.execute(
+                f"""
+                SELECT table_schema, SUM(data_length + index_length)
+                FROM information_schema.tables
+                WHERE table_schema IN ({", ".join(["%s"] * len(chunk))})
+                GROUP BY table_schema
+                """,
+                chunk,
+            )
+            sizes.update({db: int(size or 0) for db, size in cur.fetchall()})
+
+    return sizes
+
+
+def get_installed_apps_by_db(db_names, host=None):
+    """{db_name: set of installed app names}, read from each tenant's tabInstalled Application."""
+    db_names = valid_schemas(db_names)
+    installed = {}
+
+    with root_connection(host) as conn, conn.cursor() as cur:
+        for chunk in _chunks(db_names):
+            chunk = _schemas_with_tables(cur, chunk, "tabInstalled Application")
+            if not chunk:
+                continue
+            cur.execute(
+                " UNION ALL ".join(
+                    f"SELECT %s, app_name FROM `{db}`.`tabInstalled Application`" for db in chunk
+                ),
+                chunk,
+            )
+            for db, app in cur.fetchall():
+                installed.setdefault(db, set()).add(app)
+
+    return installed
+
+
+def is_site_installed(db_name, host=None):
+    """True once bench new-site has finished installing Frappe into ``db_name``."""
+    if not (db_name and _SCHEMA_RE.match(db_name)):
+        return False
+
+    with root_connection(host) as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = %s AND table_name = 'tabInstalled Application'",
+            (db_name,),
+        )
+        if not cur.fetchone()[0]:
+            return False
+        cur.execute(f"SELECT COUNT(*) FROM `{db_name}`.`tabInstalled Application` WHERE app_name = 'frappe'")
+        return bool(cur.fetchone()[0])
+
+
+def get_app_versions_by_db(db_names, host=None):
+    """
+    {db_name: {"apps": {app_name: version}, "migrated_at": datetime}}. bench
+    migrate rewrites tabInstalled Application, so its latest modified is the
+    time of the last migrate.
+    """
+    db_names = valid_schemas(db_names)
+    result = {}
+
+    with root_connection(host) as conn, conn.cursor() as cur:
+        for chunk in _chunks(db_names):
+            chunk = _schemas_with_tables(cur, chunk, "tabInstalled Application")
+            if not chunk:
+                continue
+            cur.execute(
+                " UNION ALL ".join(
+                    f"SELECT %s, app_name, app_version, modified FROM `{db}`.`tabInstalled Application`"
+                    for db in chunk
+                ),
+                chunk,
+            )
+            for db, app, version, modified in cur.fetchall():
+                entry = result.setdefault(db, {"apps": {}, "migrated_at": None})
+                entry["apps"][app] = version
+                if modified and (entry["migrated_at"] is None or modified > entry["migrated_at"]):
+                    entry["migrated_at"] = modified
+
+    return result
+
+
+def get_last_active_by_db(db_names, host=None):
+    """{db_name: latest tabUser.last_active of the tenant's own users}, None if nobody ever logged in."""
+    db_names = valid_schemas(db_names)
+    last_active = {}
+
+    with root_connection(host) as conn, conn.cursor() as cur:
+        for chunk in _chunks(db_names):
+            chunk = _schemas_with_tables(cur, chunk, "tabUser")
+            if not chunk:
+                continue
+            cur.execute(
+                " UNION ALL ".join(
+                    f"SELECT %s, MAX(last_active) FROM `{db}`.`tabUser` "
+                    "WHERE name NOT IN ('Administrator', 'Guest')"
+                    for db in chunk
+                ),
+                chunk,
+            )
+            last_active.update(dict(cur.fetchall()))
+
+    return last_active
+
+
+def get_schema_stats(db_names, host=None):
+    """{db_name: (bytes of data + indexes, estimated rows)} from information_schema, one query per chunk."""
+    db_names = valid_schemas(db_names)
+    stats = {}
+
+    with root_connection(host) as conn, conn.cursor() as cur:
+        for chunk in _chunks(db_names):
+            cur.execute(
+                f"""
+                SELECT table_schema, SUM(data_length + index_length), SUM(table_rows)
+                FROM information_schema.tables
+                WHERE table_schema IN ({", ".join(["%s"] * len(chunk))})
+                GROUP BY table_schema
+                """,
+                chunk,
+            )
+            stats.update({db: (int(size or 0), int(rows or 0)) for db, size, rows in cur.fetchall()})
+
+    return stats
+
+
+def get_activity_by_db(db_names, since, host=None):
+    """
+    {db_name: (active users, scheduled jobs, job seconds)} since ``since``:
+    users with last_active after it, and tabScheduled Job Log entries
+    created after it (duration = modified - creation).
+    """
+    db_names = valid_schemas(db_names)
+    activity = {}
+
+    with root_connection(host) as conn, conn.cursor() as cur:
+        for chunk in _chunks(db_names):
+            chunk = _schemas_with_tables(cur, chunk, "tabUser", "tabScheduled Job Log")
+            if not chunk:
+                continue
+            cur.execute(
+                " UNION ALL ".join(
+                    f"""
+                    SELECT %s,
+                        (SELECT COUNT(*) FROM `{db}`.`tabUser`
+                            WHERE last_active >= %s AND name NOT IN ('Administrator', 'Guest')),
+                        COUNT(*),
+                        SUM(TIMESTAMPDIFF(MICROSECOND, creation, modified)) / 1000000
+                    FROM `{db}`.`tabScheduled Job Log`
+                    WHERE creation >= %s
+                    """
+                    for db in chunk
+                ),
+                [value for db in chunk for value in (db, since, since)],
+            )
+            activity.update({db: (int(users or 0), int(jobs or 0), float(seconds or 0)) for db, users, jobs, seconds in cur.fetchall()})
+
+    return activity
+
+
+def get_frappe_schemas(host=None):
+    """
+    {db_name: (bytes, newest table creation time)} of every schema on the
+    server named like a Frappe site database ("_" + 16 hex digits).
+    """
+    with root_connection(host) as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.schema_name, SUM(t.data_length + t.index_length), MAX(t.create_time)
+            FROM information_schema.schemata s
+            LEFT JOIN information_schema.tables t ON t.table_schema = s.schema_name
+            WHERE s.schema_name REGEXP '^_[0-9a-f]{16}$'
+            GROUP BY s.schema_name
+            """
+        )
+        return {db: (int(size or 0), created) for db, size, created in cur.fetchall()}
+
+
+def drop_databases_and_users(db_names, host=None):
+    """
+    Drop the schemas and the DB users bench new-site created for them (same
+    name, any host part) over one connection. Returns the schemas dropped.
+    """
+    db_names = valid_schemas(db_names)
+    dropped = []
+
+    with root_connection(host) as conn, conn.cursor() as cur:
+        users = []
+        for chunk in _chunks(db_names):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cur.execute(f"SELECT User, Host FROM mysql.user WHERE User IN ({placeholders})", chunk)
+            users += cur.fetchall()
+
+        for db_name in db_names:
+            cur.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
+            dropped.append(db_name)
+        for user, user_host in users:
+            cur.execute("DROP USER IF EXISTS %s@%s", (user, user_host))
+
+    return dropped
+
+
+def dump_database(db_name, path, host=None):
+    """mysqldump | gzip ``db_name`` into ``path``, replacing it only once the dump is complete."""
+    _check_schema(db_name)
+    creds = root_credentials(host)
+    tmp = f"{path}.partial"
+    _run_mysql_client(
+        f"mysqldump --single-transaction --quick --routines --triggers "
+        f"-h {shlex.quote(creds['host'])} -P {creds['port']} -u {shlex.quote(creds['user'])} {db_name} "
+        f"| gzip > {shlex.quote(tmp)} && mv {shlex.quote(tmp)} {shlex.quote(path)}",
+        creds,
+    )
+
+
+def restore_database(db_name, path, host=None):
+    """(Re)create ``db_name`` and load a gzipped dump written by dump_database into it."""
+    _check_schema(db_name)
+    creds = root_credentials(host)
+    with root_connection(host) as conn, conn.cursor() as cur:
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+    _run_mysql_client(
+        f"gunzip -c {shlex.quote(path)} "
+        f"| mysql -h {shlex.quote(creds['host'])} -P {creds['port']} -u {shlex.quote(creds['user'])} {db_name}",
+        creds,
+    )
+
+
+def drop_database(db_name, host=None):
+    """Drop the schema. The site's DB user and its grants are kept, so a restore needs nothing else."""
+    _check_schema(db_name)
+    with root_connection(host) as conn, conn.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
+
+
+def _check_schema(db_name):
+    if not (db_name and _SCHEMA_RE.match(db_name)):
+        frappe.throw(f"Invalid database name: {db_name}")
+
+
+def _run_mysql_client(command, creds):
+    # The password goes through the environment, never the command line.
+    subprocess.run(
+        ["bash", "-c", f"set -o pipefail; {command}"],
+        env={**os.environ, "MYSQL_PWD": creds["password"] or ""},
+        check=True,
+        capture_output=True,
+        text=True,
+        timeout=DUMP_TIMEOUT,
+    )
+
+
+def _schemas_with_tables(cur, schemas, *tables):
+    """
+    The schemas among ``schemas`` that have every one of ``tables``, in one
+    information_schema query. A UNION ALL over a schema that was dropped or
+    is half-installed would fail for the whole chunk.
+    """
+    cur.execute(
+        f"""
+        SELECT table_schema
+        FROM information_schema.tables
+        WHERE table_schema IN ({", ".join(["%s"] * len(schemas))})
+            AND table_name IN ({", ".join(["%s"] * len(tables))})
+        GROUP BY table_schema
+        HAVING COUNT(DISTINCT table_name) = %s
+        """,
+        [*schemas, *tables, len(tables)],
+    )
+    return [db for (db,) in cur.fetchall()]
+
+
+def _chunks(items, size=QUERY_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -0,0 +1,186 @@
+import frappe # type: ignore
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from frappe.utils import add_days, flt, get_datetime, getdate, now_datetime # type: ignore
+from sowaan_cloud.utils.inventory import get_inventory
+from sowaan_cloud.utils.mariadb import default_db_host, get_activity_by_db, get_schema_stats
+
+# Per-tenant usage metering.
+#
+# collect_usage_samples runs hourly and keeps one Cloud Usage Sample per site
+# per day (the daily rollup is the time series): database size and rows,
+# files size, active users, scheduled jobs and their run time, and requests.
+# The databases are read with one information_schema query and one activity
+# query per database host; files come from the site inventory; requests
+# from one incremental pass over the nginx metering log (see DEPLOYMENT.md),
+# resumed from the byte offset stored at the end of the previous pass.
+
+USAGE_RETENTION_DAYS = 400
+# Statuses whose sites are served and run jobs, i.e. use RAM.
+LIVE_STATUSES = ("Active", "Provisioning")
+
+# Columns of a new sample row and their value when not measured.
+SAMPLE_DEFAULTS = {
+    "subscription": None,
+    "db_host": None,
+    "live": 0,
+    "db_size_mb": 0,
+    "db_rows": 0,
+    "files_size_mb": 0,
+    "active_users": 0,
+    "jobs": 0,
+    "job_seconds": 0,
+    "requests": 0,
+}
+
+ACCESS_LOG_CURSOR = "sowaan_metering_log_cursor"
+# log_format sowaan_metering '$time_iso8601 $host $status $request_time';
+_ACCESS_LOG_LINE = re.compile(r"^(\d{4}-\d{2}-\d{2})T\S+\s+(\S+)")
+
+
+def collect_usage_samples():
+    today = getdate()
+    subs = frappe.get_all(
+        "Cloud Subscription",
+        filters={"provisioned": 1, "site_name": ["is", "set"]},
+        fields=["name", "site_name", "status", "hibernation_dump"],
+    )
+    inventory = get_inventory([s.site_name for s in subs], fields=["name", "db_name", "db_host", "files_size_mb"])
+
+    samples = {}
+    by_host = defaultdict(dict)
+    for sub in subs:
+        entry = inventory.get(sub.site_name) or frappe._dict()
+        samples[sub.site_name] = {
+            "subscription": sub.name,
+            "db_host": entry.db_host or default_db_host(),
+            "live": int(sub.status in LIVE_STATUSES),
+            "files_size_mb": flt(entry.files_size_mb, 2),
+        }
+        # A hibernated site with a dropped database has nothing to read.
+        if entry.db_name and not sub.hibernation_dump:
+            by_host[samples[sub.site_name]["db_host"]][entry.db_name] = sub.site_name
+
+    for host, sites_by_db in by_host.items():
+        try:
+            stats = get_schema_stats(sites_by_db, host=host)
+            activity = get_activity_by_db(sites_by_db, get_datetime(today), host=host)
+        except Exception:
+            frappe.log_error(title=f"Usage metering: database host {host} unreachable")
+            continue
+
+        for db_name, site_name in sites_by_db.items():
+            size, rows = stats.get(db_name, (0, 0))
+            users, jobs, job_seconds = activity.get(db_name, (0, 0, 0))
+            samples[site_name].update(
+                db_size_mb=flt(size / (1024 * 1024), 2),
+                db_rows=rows,
+                active_users=users,
+                jobs=jobs,
+                job_seconds=flt(job_seconds, 1),
+            )
+
+    requests, cursor = read_access_log()
+    _save_samples(today, samples, requests)
+    if cursor:
+        # Same transaction as the counts, so a failed run re-reads the same lines.
+        frappe.db.set_default(ACCESS_LOG_CURSOR, json.dumps(cursor))
+    frappe.db.commit()
+
+    frappe.logger("provisioning").info(
+        f"[METERING] Sampled {len(samples)} sites, {sum(requests.values())} new requests"
+    )
+
+
+def read_access_log():
+    """
+    Count new requests per (date, host) in the metering log since the stored
+    cursor. Returns (counts, new cursor); a rotated log is finished first.
+    """
+    path = frappe.conf.get("metering_access_log")
+    if not path or not os.path.exists(path):
+        return Counter(), None
+
+    cursor = json.loads(frappe.db.get_default(ACCESS_LOG_CURSOR) or "{}")
+    counts = Counter()
+    inode = os.stat(path).st_ino
+
+    offset = cursor.get("offset", 0)
+    if cursor.get("inode") != inode:
+        rotated = f"{path}.1"
+        if cursor.get("inode") and os.path.exists(rotated) and os.stat(rotated).st_ino == cursor["inode"]:
+            _count_requests(rotated, offset, counts)
+        offset = 0
+    elif os.path.getsize(path) < offset:
+        # Truncated in place.
+        offset = 0
+
+    offset = _count_requests(path, offset, counts)
+    return counts, {"inode": inode, "offset": offset}
+
+
+def purge_usage_samples():
+    table = frappe.qb.DocType("Cloud Usage Sample")
+    frappe.qb.from_(table).delete().where(
+        table.sample_date < add_days(getdate(), -USAGE_RETENTION_DAYS)
+    ).run()
+    frappe.db.commit()
+
+
+def _count_requests(path, offset, counts):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Still being written; picked up by the next pass.
+                break
+            offset += len(line)
+            match = _ACCESS_LOG_LINE.match(line.decode("utf-8", "replace"))
+            if match:
+                counts[(match.group(1), match.group(2))] += 1
+    return offset
+
+
+def _save_samples(today, samples, requests):
+    """Upsert today's rows and add the request counts to the day they belong to."""
+    values = {(site_name, str(today)): dict(sample) for site_name, sample in samples.items()}
+    for (day, host), count in requests.items():
+        if host in samples:
+            row = values.setdefault((host, day), {"subscription": samples[host]["subscription"]})
+            row["new_requests"] = count
+
+    dates = sorted({day for _site, day in values})
+    existing = {
+        (row.site_name, str(row.sample_date)): row
+        for row in frappe.get_all(
+            "Cloud Usage Sample",
+            filters={"sample_date": ["in", dates], "site_name": ["in", list(samples)]},
+            fields=["name", "site_name", "sample_date", "requests"],
+        )
+    } if values else {}
+
+    now = now_datetime()
+    inserts = []
+    for (site_name, day), row in values.items():
+        new_requests = row.pop("new_requests", 0)
+        previous = existing.get((site_name, day))
+        if previous:
+            if new_requests:
+                row["requests"] = (previous.requests or 0) + new_requests
+            if row:
+                frappe.db.set_value("Cloud Usage Sample", previous.name, row, update_modified=False)
+        else:
+            inserts.append({**SAMPLE_DEFAULTS, **row, "site_name": site_name, "sample_date": day, "requests": new_requests})
+
+    if inserts:
+        fields = ["site_name", "sample_date", *SAMPLE_DEFAULTS]
+        frappe.db.bulk_insert(
+            "Cloud Usage Sample",
+            ["name", "creation", "modified", "owner", "modified_by", *fields],
+            [
+                [frappe.generate_hash(length=10), now, now, "Administrator", "Administrator", *(row[f] for f in fields)]
+                for row in inserts
+            ],
+        )
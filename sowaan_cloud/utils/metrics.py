@@ -0,0 +1,201 @@
+import frappe # type: ignore
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Provisioning metrics, aggregated in Redis so every worker reports into the
+# same series and the endpoint in sowaan_cloud.api.metrics can render them
+# in Prometheus text format.
+#
+# Each metric is one Redis hash. Fields are the rendered label set, with a
+# suffix for histograms:  '<labels>|le=<bucket>', '<labels>|sum', '<labels>|count'.
+# Bucket fields are non-cumulative; render_prometheus() accumulates them.
+
+STEP_DURATION = "sowaan_provisioning_step_duration_seconds"
+QUEUE_WAIT = "sowaan_provisioning_queue_wait_seconds"
+COMMAND_DURATION = "sowaan_provisioning_command_duration_seconds"
+RUNS_TOTAL = "sowaan_provisioning_runs_total"
+SSL_RUNS_TOTAL = "sowaan_ssl_runs_total"
+DESK_BOOT = "sowaan_tenant_desk_boot_seconds"
+CANCEL_RELEASE = "sowaan_provisioning_cancel_release_seconds"
+
+_STEP_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600)
+_WAIT_BUCKETS = (0.5, 1, 5, 15, 30, 60, 300, 900, 1800)
+_BOOT_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+_CANCEL_BUCKETS = (1, 2, 5, 10, 15, 30, 60, 300)
+
+METRICS = {
+    STEP_DURATION: {
+        "type": "histogram",
+        "help": "Wall time of each provisioning step (site create, app install, bootstrap, migrate, DNS, SSL).",
+        "buckets": _STEP_BUCKETS,
+    },
+    QUEUE_WAIT: {
+        "type": "histogram",
+        "help": "Time a provisioning or SSL job waited in the RQ queue before a worker picked it up.",
+        "buckets": _WAIT_BUCKETS,
+    },
+    COMMAND_DURATION: {
+        "type": "histogram",
+        "help": "Wall time of bench/certbot subprocesses by command and exit code.",
+        "buckets": _STEP_BUCKETS,
+    },
+    RUNS_TOTAL: {
+        "type": "counter",
+        "help": "Provisioning runs by outcome and error class.",
+    },
+    SSL_RUNS_TOTAL: {
+        "type": "counter",
+        "help": "SSL issuance runs by outcome.",
+    },
+    DESK_BOOT: {
+        "type": "histogram",
+        "help": "Bootinfo build time of a new tenant's first desk load, before (cold) and after (warm) the warm-up.",
+        "buckets": _BOOT_BUCKETS,
+    },
+    CANCEL_RELEASE: {
+        "type": "histogram",
+        "help": "Time from a provisioning cancellation request until the worker running it was free again.",
+        "buckets": _CANCEL_BUCKETS,
+    },
+}
+
+
+def _key(name):
+    redis = frappe.cache()
+    return redis.make_key(f"metrics:{name}")
+
+
+def _labels(labels):
+    return ",".join(
+        f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())
+    )
+
+
+def _escape(value):
+    return str("" if value is None else value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def inc(name, amount=1, **labels):
+    """Increment a counter. Never raises: metrics must not break provisioning."""
+    try:
+        frappe.cache().hincrbyfloat(_key(name), _labels(labels), amount)
+    except Exception:
+        frappe.logger("provisioning").debug(f"[METRICS] Could not record {name}", exc_info=True)
+
+
+def observe(name, value, **labels):
+    """Record one histogram observation. Never raises."""
+    try:
+        label_str = _labels(labels)
+        bucket = next((b for b in METRICS[name]["buckets"] if value <= b), "+Inf")
+
+        pipe = frappe.cache().pipeline()
+        key = _key(name)
+        pipe.hincrbyfloat(key, f"{label_str}|le={bucket}", 1)
+        pipe.hincrbyfloat(key, f"{label_str}|sum", value)
+        pipe.hincrbyfloat(key, f"{label_str}|count", 1)
+        pipe.execute()
+    except Exception:
+        frappe.logger("provisioning").debug(f"[METRICS] Could not record {name}", exc_info=True)
+
+
+@contextmanager
+def timer(name, **labels):
+    """Observe the wall time of the block, whether it succeeds or raises."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(name, time.monotonic() - start, **labels)
+
+
+def observe_queue_wait(queue):
+    """Record how long the current RQ job waited before it started."""
+    try:
+        from rq import get_current_job # type: ignore
+
+        job = get_current_job()
+        if not job or not job.enqueued_at or not job.started_at:
+            return
+        observe(QUEUE_WAIT, (job.started_at - job.enqueued_at).total_seconds(), queue=queue, job=job.func_name)
+    except Exception:
+        frappe.logger("provisioning").debug("[METRICS] Could not record queue wait", exc_info=True)
+
+
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def _read(names):
+    """{name: {field: value}} for the given metrics."""
+    # Read through a pipeline: RedisWrapper.hgetall re-prefixes the key and unpickles values.
+    pipe = frappe.cache().pipeline()
+    for name in names:
+        pipe.hgetall(_key(name))
+    return {
+        name: {(k.decode() if isinstance(k, bytes) else k): float(v) for k, v in (raw or {}).items()}
+        for name, raw in zip(names, pipe.execute(), strict=True)
+    }
+
+
+def histogram_quantile(name, quantile, by):
+    """
+    Estimated ``quantile`` of histogram ``name`` per value of label ``by``,
+    interpolated within the bucket like Prometheus' histogram_quantile.
+    Observations above the last bucket are reported as its bound.
+    """
+    buckets = METRICS[name]["buckets"]
+    grouped = defaultdict(lambda: defaultdict(float))
+    for field, value in _read([name])[name].items():
+        label_str, _, suffix = field.rpartition("|")
+        grouped[dict(_LABEL.findall(label_str)).get(by, "")][suffix] += value
+
+    result = {}
+    for key, counts in grouped.items():
+        total = counts.get("count", 0)
+        if not total:
+            continue
+        rank = quantile * total
+        cumulative, lower = 0.0, 0.0
+        result[key] = buckets[-1]
+        for bucket in buckets:
+            in_bucket = counts.get(f"le={bucket}", 0)
+            if in_bucket and cumulative + in_bucket >= rank:
+                result[key] = lower + (bucket - lower) * (rank - cumulative) / in_bucket
+                break
+            cumulative += in_bucket
+            lower = bucket
+    return result
+
+
+def render_prometheus():
+    """All metrics in Prometheus text exposition format (0.0.4)."""
+    lines = []
+
+    for name, fields in _read(list(METRICS)).items():
+        spec = METRICS[name]
+        lines.append(f"# HELP {name} {spec['help']}")
+        lines.append(f"# TYPE {name} {spec['type']}")
+
+        if spec["type"] == "counter":
+            for label_str, value in sorted(fields.items()):
+                lines.append(f"{name}{{{label_str}}} {_fmt(value)}")
+            continue
+
+        for label_str in sorted({f.rsplit("|", 1)[0] for f in fields}):
+            sep = "," if label_str else ""
+            cumulative = 0.0
+            for bucket in spec["buckets"]:
+                cumulative += fields.get(f"{label_str}|le={bucket}", 0)
+                lines.append(f'{name}_bucket{{{label_str}{sep}le="{bucket}"}} {_fmt(cumulative)}')
+            count = fields.get(f"{label_str}|count", 0)
+            lines.append(f'{name}_bucket{{{label_str}{sep}le="+Inf"}} {_fmt(count)}')
+            lines.append(f"{name}_sum{{{label_str}}} {_fmt(fields.get(f'{label_str}|sum', 0))}")
+            lines.append(f"{name}_count{{{label_str}}} {_fmt(count)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _fmt(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
@@ -0,0 +1,102 @@
+import frappe # type: ignore
+import os
+import subprocess
+from sowaan_cloud.utils.site_config import atomic_write
+
+# nginx map of tenant hosts that must not be served normally.
+#
+# The map is regenerated from Cloud Subscription in one query and nginx is
+# reloaded only when its content changed, so bulk state changes cost a single
+# reload. reconcile_site_state_map runs every few minutes and gets a reload
+# that failed (or a status changed elsewhere) through. The bench's nginx
+# config needs, in the http block:
+#
+#     map $host $sowaan_site_state {
+#         default "";
+#         include /home/frappe/frappe-bench/config/nginx/sowaan_site_states.map;
+#     }
+#
+# and in the tenant server block, e.g.:
+#
+#     if ($sowaan_site_state = suspended) { return 302 https://sowaan.cloud/suspended; }
+#     if ($sowaan_site_state = hibernated) { return 302 https://sowaan.cloud/waking?site=$host&next=$request_uri; }
+
+SITE_STATE_MAP = "sowaan_site_states.map"
+
+# Cloud Subscription status -> value of $sowaan_site_state
+MAPPED_STATUSES = {
+    "Suspended": "suspended",
+    "Hibernated": "hibernated",
+}
+
+DEFAULT_RELOAD_COMMAND = "sudo nginx -t && sudo systemctl reload nginx"
+
+
+def get_map_path():
+    from frappe.utils import get_bench_path # type: ignore
+
+    return frappe.conf.get("nginx_site_state_map") or os.path.join(
+        get_bench_path(), "config", "nginx", SITE_STATE_MAP
+    )
+
+
+def render_site_state_map():
+    rows = frappe.get_all(
+        "Cloud Subscription",
+        filters={"status": ["in", list(MAPPED_STATUSES)], "site_name": ["is", "set"]},
+        fields=["site_name", "status"],
+        order_by="site_name asc",
+    )
+    return "".join(f"{r.site_name} {MAPPED_STATUSES[r.status]};\n" for r in rows)
+
+
+def sync_site_state_map(reload=True):
+    """
+    Rewrite the map from the database and reload nginx if it changed.
+    On a failed reload the previous map is put back, so the next sync
+    sees the difference again and retries. Returns True if nginx was reloaded.
+    """
+    path = get_map_path()
+    content = render_site_state_map()
+
+    try:
+        with open(path) as f:
+            previous = f.read()
+    except FileNotFoundError:
+        previous = None
+
+    if content == previous:
+        return False
+
+    atomic_write(path, content)
+    frappe.logger("provisioning").info(f"[NGINX] Site state map updated ({len(content.splitlines())} hosts)")
+
+    if not reload:
+        return False
+
+    try:
+        reload_nginx()
+    except Exception:
+        atomic_write(path, previous or "")
+        raise
+
+    return True
+
+
+def reconcile_site_state_map():
+    """Scheduled: sync the map, retrying a reload that failed earlier."""
+    try:
+        sync_site_state_map()
+    except Exception:
+        frappe.log_error(title="Site state map: nginx reload failed")
+
+
+def reload_nginx():
+    command = frappe.conf.get("nginx_reload_command") or DEFAULT_RELOAD_COMMAND
+    try:
+        subprocess.run(["bash", "-lc", command], check=True, capture_output=True, text=True, timeout=60)
+    except subprocess.CalledProcessError as e:
+        frappe.logger("provisioning").error(f"[NGINX] Reload failed: {e.stderr or e.stdout}")
+        raise
+
+    frappe.logger("provisioning").info("[NGINX] Reloaded")
@@ -0,0 +1,274 @@
+import frappe # type: ignore
+import os
+import shutil
+from collections import defaultdict
+from frappe.utils import add_days, cint, flt, now_datetime # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+from sowaan_cloud.utils.mariadb import default_db_host, drop_databases_and_users, get_frappe_schemas
+from sowaan_cloud.utils.nginx import reload_nginx, sync_site_state_map
+from sowaan_cloud.utils.provision import (
+    delete_cloudflare_dns,
+    is_provisioning_in_flight,
+    list_cloudflare_a_records,
+    run_as_frappe,
+)
+from sowaan_cloud.utils.site_config import read_site_config
+
+# Garbage collection of orphaned tenant resources.
+#
+# A provisioning run that fails or is cancelled after bench new-site leaves a
+# site directory, a database and its user, and possibly a DNS record behind;
+# so does a subscription deleted from the desk. scan_orphans cross-references
+# the bench's sites/ directory, the Frappe schemas on every database host,
+# the Cloudflare A records pointing at the server and the Cloud
+# Subscriptions, and lists whatever no subscription needs in Cloud Orphan
+# Resource. Only names under the tenant suffix are considered, never the
+# control site.
+#
+# reclaim_orphans removes the entries whose grace period has passed and
+# that are still orphaned: databases and users are dropped in one connection
+# per host, site directories moved to <bench>/archived/sites (where bench
+# drop-site puts them), DNS records deleted, and nginx regenerated and
+# reloaded once.
+
+# A subscription in one of these, with nothing provisioned, no longer needs its resources.
+RELEASED_STATUSES = ("Failed", "Cancelled")
+NON_SITE_DIRS = ("assets",)
+
+
+def collect_orphans():
+    """Daily: refresh the orphan list and, with Orphan Cleanup set to Reclaim, reclaim what is due."""
+    scan_orphans()
+    if get_cloud_settings().orphan_gc_mode == "Reclaim":
+        reclaim_orphans(dry_run=False)
+
+
+@frappe.whitelist()
+def scan(dry_run=True):
+    """Refresh the orphan list now; with dry_run=0, also reclaim what is due (in the background)."""
+    frappe.only_for("System Manager")
+    found = scan_orphans()
+    due = reclaim_orphans(dry_run=True)
+
+    if not cint(dry_run) and due:
+        frappe.enqueue(
+            "sowaan_cloud.utils.orphans.reclaim_orphans",
+            queue="long",
+            dry_run=False,
+            timeout=3600,
+            job_id="reclaim-orphans",
+            deduplicate=True,
+        )
+    return {"orphans": len(found), "due": due}
+
+
+def find_orphans(settings=None):
+    """Resources under the tenant suffix that no subscription needs, as dicts."""
+    settings = settings or get_cloud_settings()
+    if not settings.site_suffix:
+        return []
+
+    suffix = f".{settings.site_suffix}"
+    sites_dir = os.path.join(settings.bench_path, "sites")
+    owned, released = _site_owners()
+    protected = owned | {frappe.local.site}
+    orphans = []
+
+    # Every database referenced by a site directory belongs to that site.
+    referenced = defaultdict(set)
+    for entry in os.scandir(sites_dir):
+        if not entry.is_dir() or entry.name.startswith(".") or entry.name in NON_SITE_DIRS:
+            continue
+
+        config = read_site_config(entry.path)
+        db_host = config.get("db_host") or default_db_host()
+        if config.get("db_name"):
+            referenced[db_host].add(config["db_name"])
+
+        if entry.name.endswith(suffix) and entry.name not in protected:
+            orphans.append(frappe._dict(
+                resource_type="Site",
+                resource_name=entry.name,
+                db_name=config.get("db_name"),
+                db_host=db_host,
+                subscription=released.get(entry.name),
+                details="site_config.json present" if config else "No site_config.json (interrupted bench new-site)",
+            ))
+
+    referenced.setdefault(default_db_host(), set())
+    for db_host, db_names in referenced.items():
+        for db_name, (size, created) in get_frappe_schemas(db_host).items():
+            if db_name not in db_names:
+                orphans.append(frappe._dict(
+                    resource_type="Database",
+                    resource_name=f"{db_name}@{db_host}",
+                    db_name=db_name,
+                    db_host=db_host,
+                    size_mb=flt(size / (1024 * 1024), 2),
+                    details=f"No site directory uses it; newest table created {created or 'never'}",
+                ))
+
+    if settings.enable_dns and settings.server_ip:
+        for record in list_cloudflare_a_records(settings.server_ip.strip()):
+            if record["name"].endswith(suffix) and record["name"] not in protected:
+                orphans.append(frappe._dict(
+                    resource_type="DNS Record",
+                    resource_name=record["name"],
+                    record_id=record["id"],
+                    subscription=released.get(record["name"]),
+                    details=f"A {record['content']}",
+                ))
+
+    return orphans
+
+
+def scan_orphans():
+    """
+    Record the current orphans: new ones start their grace period, those no
+    longer orphaned (e.g. a retry took the site back) leave the list.
+    """
+    settings = get_cloud_settings()
+    found = find_orphans(settings)
+    now = now_datetime()
+
+    existing = {
+        (row.resource_type, row.resource_name): row.name
+        for row in frappe.get_all(
+            "Cloud Orphan Resource",
+            filters={"status": ["!=", "Reclaimed"]},
+            fields=["name", "resource_type", "resource_name"],
+        )
+    }
+
+    for orphan in found:
+        values = {
+            "db_name": orphan.db_name,
+            "db_host": orphan.db_host,
+            "size_mb": orphan.size_mb or 0,
+            "subscription": orphan.subscription,
+            "details": orphan.details,
+            "last_seen_on": now,
+        }
+        name = existing.pop((orphan.resource_type, orphan.resource_name), None)
+        if name:
+            frappe.db.set_value("Cloud Orphan Resource", name, values, update_modified=False)
+        else:
+            frappe.get_doc({
+                "doctype": "Cloud Orphan Resource",
+                "resource_type": orphan.resource_type,
+                "resource_name": orphan.resource_name,
+                "status": "Pending",
+                "first_seen_on": now,
+                "reclaim_after": add_days(now, cint(settings.orphan_grace_days)),
+                **values,
+            }).insert(ignore_permissions=True)
+
+    if existing:
+        frappe.db.delete("Cloud Orphan Resource", {"name": ["in", list(existing.values())]})
+    frappe.db.commit()
+
+    frappe.logger("provisioning").info(
+        f"[ORPHANS] {len(found)} orphaned resources, {len(existing)} no longer orphaned"
+    )
+    return found
+
+
+def reclaim_orphans(dry_run=True):
+    """
+    Remove listed orphans whose grace period has passed and which a fresh
+    scan still finds orphaned. With dry_run only returns what would go.
+    """
+    settings = get_cloud_settings()
+    current = {(o.resource_type, o.resource_name): o for o in find_orphans(settings)}
+    plan = [
+        frappe._dict(current[(row.resource_type, row.resource_name)], row=row.name)
+        for row in frappe.get_all(
+            "Cloud Orphan Resource",
+            filters={"status": ["in", ["Pending", "Failed"]], "reclaim_after": ["<=", now_datetime()]},
+            fields=["name", "resource_type", "resource_name"],
+        )
+        if (row.resource_type, row.resource_name) in current
+    ]
+
+    if cint(dry_run):
+        return [
+            {"resource_type": o.resource_type, "resource_name": o.resource_name, "db_name": o.db_name}
+            for o in plan
+        ]
+
+    failed = {}
+    by_host = defaultdict(list)
+    for orphan in plan:
+        if orphan.resource_type in ("Site", "Database") and orphan.db_name:
+            by_host[orphan.db_host].append(orphan)
+
+    for db_host, orphans in by_host.items():
+        try:
+            drop_databases_and_users([o.db_name for o in orphans], host=db_host)
+        except Exception as e:
+            failed.update({o.row: f"Dropping databases on {db_host}: {e}" for o in orphans})
+
+    archived = 0
+    for orphan in plan:
+        if orphan.row in failed or orphan.resource_type == "Database":
+            continue
+        try:
+            if orphan.resource_type == "Site":
+                archive_site(settings.bench_path, orphan.resource_name)
+                archived += 1
+                if orphan.subscription:
+                    # A retry must create the site again instead of resuming past it.
+                    frappe.db.set_value("Cloud Subscription", orphan.subscription, "provisioning_step", "INIT")
+            else:
+                delete_cloudflare_dns(orphan.record_id)
+        except Exception as e:
+            failed[orphan.row] = str(e)
+
+    if archived:
+        try:
+            run_as_frappe("bench setup nginx --yes", settings.bench_path)
+            sync_site_state_map(reload=False)
+            reload_nginx()
+        except Exception:
+            frappe.log_error(title="Orphan cleanup: nginx regeneration failed")
+
+    now = now_datetime()
+    for orphan in plan:
+        if orphan.row in failed:
+            values = {"status": "Failed", "error": failed[orphan.row][:1000]}
+        else:
+            values = {"status": "Reclaimed", "reclaimed_on": now, "error": None}
+        frappe.db.set_value("Cloud Orphan Resource", orphan.row, values, update_modified=False)
+    frappe.db.commit()
+
+    frappe.logger("provisioning").info(
+        f"[ORPHANS] Reclaimed {len(plan) - len(failed)} resources, {len(failed)} failed"
+    )
+    return [o.resource_name for o in plan if o.row not in failed]
+
+
+def _site_owners():
+    """
+    (site names a subscription still needs, {site name: subscription} of
+    failed or cancelled ones that do not).
+    """
+    owned, released = set(), {}
+    for sub in frappe.get_all(
+        "Cloud Subscription",
+        filters={"site_name": ["is", "set"]},
+        fields=["name", "site_name", "status", "provisioned"],
+    ):
+        if sub.status in RELEASED_STATUSES and not sub.provisioned and not is_provisioning_in_flight(sub.name):
+            released[sub.site_name] = sub.name
+        else:
+            owned.add(sub.site_name)
+    return owned, released
+
+
+def archive_site(bench_path, site_name):
+    archive_dir = os.path.join(bench_path, "archived", "sites")
+    os.makedirs(archive_dir, exist_ok=True)
+    shutil.move(
+        os.path.join(bench_path, "sites", site_name),
+        os.path.join(archive_dir, f"{site_name}-{now_datetime().strftime('%Y-%m-%d_%H%M%S')}"),
+    )
@@ -0,0 +1,67 @@
+import frappe # type: ignore
+import time
+
+# Opt-in per-request cost counters for load testing.
+#
+# With ``request_profiling: 1`` in site config, every request counts its
+# frappe.db.sql calls and Redis commands and reports them in response headers:
+#
+#     X-Sowaan-DB-Queries, X-Sowaan-Redis-Ops, X-Sowaan-Server-Ms
+#
+# Redis commands are counted where RedisWrapper sends them; commands queued
+# on a pipeline are not. Disabled (the default), the hooks only read the flag.
+
+DB_HEADER = "X-Sowaan-DB-Queries"
+REDIS_HEADER = "X-Sowaan-Redis-Ops"
+SERVER_MS_HEADER = "X-Sowaan-Server-Ms"
+
+_redis_counter_installed = False
+
+
+def before_request():
+    if not frappe.conf.get("request_profiling"):
+        return
+
+    _install_redis_counter()
+
+    stats = {"db": 0, "redis": 0, "start": time.perf_counter()}
+    frappe.local.sowaan_request_profile = stats
+
+    db = frappe.local.db
+    sql = db.sql
+
+    def counted_sql(*args, **kwargs):
+        stats["db"] += 1
+        return sql(*args, **kwargs)
+
+    db.sql = counted_sql
+
+
+def after_request(response=None, request=None):
+    stats = getattr(frappe.local, "sowaan_request_profile", None)
+    if not stats or response is None:
+        return
+
+    response.headers[DB_HEADER] = str(stats["db"])
+    response.headers[REDIS_HEADER] = str(stats["redis"])
+    response.headers[SERVER_MS_HEADER] = f"{(time.perf_counter() - stats['start']) * 1000:.1f}"
+    frappe.local.sowaan_request_profile = None
+
+
+def _install_redis_counter():
+    global _redis_counter_installed
+    if _redis_counter_installed:
+        return
+
+    from frappe.utils.redis_wrapper import RedisWrapper # type: ignore
+
+    execute_command = RedisWrapper.execute_command
+
+    def counted_execute_command(self, *args, **options):
+        stats = getattr(frappe.local, "sowaan_request_profile", None)
+        if stats:
+            stats["redis"] += 1
+        return execute_command(self, *args, **options)
+
+    RedisWrapper.execute_command = counted_execute_command
+    _redis_counter_installed = True
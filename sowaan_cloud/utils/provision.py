@@ -6,10 +6,28 @@ import os
 import json
 import pwd
 import base64
+import time
 import requests
 from datetime import datetime, date, timedelta
-from sowaan_cloud.utils.cloud_settings import get_cloud_settings
-from frappe.utils import get_url # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings, get_provisioning_queue
+from sowaan_cloud.utils.branding import prepare_branding_asset
+from sowaan_cloud.utils.locks import LeaseLock, is_lease_held
+from sowaan_cloud.utils import metrics
+from sowaan_cloud.utils.cancellation import finish_cancellation, is_cancel_requested, pop_cancel_request
+from sowaan_cloud.utils.executor import CommandCancelled, cancel_scope, progress_channel, stream_command
+from sowaan_cloud.utils.metrics import observe_queue_wait
+from sowaan_cloud.utils.tracing import (
+    TRACEPARENT_ENV,
+    current_traceparent,
+    record_queue_wait,
+    span,
+)
+from sowaan_cloud.utils.health import check_site_health
+from sowaan_cloud.utils.mariadb import get_installed_apps_by_db, is_site_installed
+from sowaan_cloud.utils.site_config import SiteConfigTransaction, read_site_config
+from sowaan_cloud.utils.retry_policy import record_retry_success, schedule_provisioning_retry
+from frappe.utils.background_jobs import is_job_enqueued # type: ignore
+from frappe.utils import get_url, now_datetime # type: ignore
 
 # Only lowercase letters, digits, hyphens; cannot start or end with a hyphen.
 _VALID_INSTANCE_RE = re.compile(r'^[a-z0-9][a-z0-9-]*[a-z0-9]$')
@@ -21,23 +39,144 @@ def frappe_user_exists():
     except KeyError:
         return False
 
+# Lease is renewed every TTL/3 while the job runs, so a dead worker frees it within a TTL.
+PROVISION_LEASE_TTL = 120
+
+# Per-command wall time limits (seconds), keyed by bench subcommand.
+COMMAND_TIMEOUTS = {
+    "new-site": 1200,
+    "install-app": 1800,
+    "migrate": 1800,
+    "execute": 1800,
+    "list-apps": 300,
+}
+DEFAULT_COMMAND_TIMEOUT = 1800
+
+CLOUDFLARE_API_BASE = "https://api.cloudflare.com/client/v4"
+
+# Realtime event moving a subscription between status/step counts on the fleet dashboard.
+FLEET_UPDATE_EVENT = "cloud_fleet_update"
+
+# Desk language warmed up for a new tenant besides English, by country.
+COUNTRY_LANGUAGES = {
+    "Saudi Arabia": "ar",
+    "United Arab Emirates": "ar",
+    "Kuwait": "ar",
+    "Bahrain": "ar",
+    "Qatar": "ar",
+    "Oman": "ar",
+    "Egypt": "ar",
+    "Jordan": "ar",
+    "Pakistan": "ur",
+    "Turkey": "tr",
+    "France": "fr",
+    "Germany": "de",
+}
+
+
+def provisioning_job_id(docname):
+    return f"provision::{docname}"
+
+
+def provisioning_lock_name(docname):
+    return f"provision:{docname}"
+
+
+def is_provisioning_in_flight(docname):
+    return is_lease_held(provisioning_lock_name(docname)) or is_job_enqueued(
+        provisioning_job_id(docname)
+    )
+
+
+def enqueue_provisioning(docname, trace_id=None, **kwargs):
+    """
+    Enqueue provision_from_subscription under a deterministic job id, so a
+    double-click or a retry while the job is queued/running collapses into
+    the existing job. Returns None in that case.
+
+    With ``pause_provisioning`` in site config nothing is enqueued; used for
+    load tests where signups must not create real sites.
+    """
+    if frappe.conf.get("pause_provisioning"):
+        frappe.logger("provisioning").info(f"[PROVISION] Paused, not enqueuing {docname}")
+        return None
+
+    return frappe.enqueue(
+        "sowaan_cloud.utils.provision.provision_from_subscription",
+        queue=get_provisioning_queue(),
+        docname=docname,
+        trace_id=trace_id,
+        timeout=3600,
+        is_async=True,
+        job_id=provisioning_job_id(docname),
+        deduplicate=True,
+        **kwargs,
+    )
+
+
 @frappe.whitelist()
 def create_instance(docname):
+    if is_provisioning_in_flight(docname):
+        frappe.throw("Provisioning is already running for this subscription.")
+
     doc = frappe.get_doc("Cloud Subscription", docname)
+    # A cancellation of an earlier run must not stop this one.
+    pop_cancel_request(docname)
 
     doc.provisioning_logs = ""
     doc.status = "Provisioning"
+    doc.retry_attempts = 0
+    doc.resume_attempts = 0
+    doc.next_retry_at = None
     doc.save(ignore_permissions=True)
 
-    frappe.enqueue(
-        "sowaan_cloud.utils.provision.provision_from_subscription",
-        queue="long",
-        docname=docname,
-        timeout=3600,
-        is_async=True,
-    )
+    enqueue_provisioning(docname, enqueue_after_commit=True)
+
+
+def provision_from_subscription(docname, trace_id=None):
+    """
+    Provision (or resume) a subscription while holding its lease lock.
+    A second worker that finds the lease held exits without doing anything.
+    """
+    name = docname if isinstance(docname, str) else docname.name
+    trace_id = trace_id or frappe.db.get_value("Cloud Subscription", name, "trace_id")
+    lock = LeaseLock(provisioning_lock_name(name), ttl=PROVISION_LEASE_TTL)
 
-def provision_from_subscription(docname):
+    if not lock.acquire():
+        frappe.logger("provisioning").info(
+            f"[PROVISION] {name} is already being provisioned by another worker, exiting"
+        )
+        return
+
+    observe_queue_wait(get_provisioning_queue())
+    record_queue_wait(trace_id)
+    try:
+        with span("provision_from_subscription", trace_id=trace_id, subscription=name), progress_channel(name):
+            # Running commands are terminated once a cancellation is requested or the lease is lost.
+            with cancel_scope(lambda: lock.lost or is_cancel_requested(name)):
+                _provision_from_subscription(docname, lock)
+    finally:
+        lock.release()
+        # After a lost lease the worker that took it over owns the subscription and its cleanup.
+        if not lock.lost:
+            _after_run(name)
+
+
+def _after_run(name):
+    status, batch = frappe.db.get_value("Cloud Subscription", name, ["status", "provisioning_batch"])
+    if status == "Cancelled":
+        finish_cancellation(name)
+    else:
+        # A cancellation requested after the run finished has nothing left to stop.
+        pop_cancel_request(name)
+    # Frees a slot for the next Queued subscription of a bulk batch.
+    if batch:
+        from sowaan_cloud.utils.bulk import enqueue_dispatch
+
+        enqueue_dispatch()
+
+
+def _provision_from_subscription(docname, lock=None):
     sub = frappe.get_doc("Cloud Subscription", docname) if isinstance(docname, str) else docname
 
     settings = get_cloud_settings()
@@ -60,6 +199,9 @@ def provision_from_subscription(docname):
     sql_password = settings.get_password("sql_password")
     site_path = os.path.join(bench_path, "sites", site_name)
 
+    if _should_stop(sub, sub.provisioning_step or "INIT", lock):
+        return
+
     try:
         if sub.status not in ("Provisioning", "Active"):
             sub.status = "Provisioning"
@@ -67,66 +209,99 @@ def provision_from_subscription(docname):
 
         # 1️⃣ SITE
         if sub.provisioning_step in (None, "INIT"):
-            sub.reload()
-            if sub.status == "Cancelled":
-                frappe.logger("provisioning").info(f"[PROVISION] Cancelled at INIT: {sub.name}")
-                return
-            create_site_if_missing(site_name, bench_path, sql_password)
+            with metrics.timer(metrics.STEP_DURATION, step="site_create"), span("site_create"):
+                create_site_if_missing(site_name, bench_path, sql_password)
             update_subscription_state(sub, step="SITE_CREATED")
 
         # 2️⃣ APPS
         if sub.provisioning_step == "SITE_CREATED":
-            sub.reload()
-            if sub.status == "Cancelled":
-                frappe.logger("provisioning").info(f"[PROVISION] Cancelled at SITE_CREATED: {sub.name}")
+            if _should_stop(sub, "SITE_CREATED", lock):
                 return
             pkg = frappe.get_doc("Cloud Package", sub.selected_package)
-            ensure_apps(site_name, bench_path, [row.app_name for row in pkg.apps])
-            enforce_site_config(site_path, {"skip_setup_wizard": 1})
-            trial_days = settings.trial_days or 15
-            enforce_trial_validity(site_path, trial_days)
+            with span("install_apps"):
+                ensure_apps(site_name, bench_path, [row.app_name for row in pkg.apps])
+            from sowaan_cloud.utils.scheduler_policy import scheduler_paused, set_scheduler_flag
+            trial_ends_on = date.today() + timedelta(days=settings.trial_days or 15)
+            # One locked, atomic write for every key provisioning sets.
+            with SiteConfigTransaction(site_path) as config:
+                config.set("skip_setup_wizard", 1)
+                config.update("quota", {"valid_till": trial_ends_on.isoformat()})
+                set_scheduler_flag(config, scheduler_paused("Active", sub.selected_package))
+            sub.trial_ends_on = trial_ends_on
             update_subscription_state(sub, step="APPS_INSTALLED")
 
         # 3️⃣ BOOTSTRAP
         if sub.provisioning_step == "APPS_INSTALLED":
-            sub.reload()
-            if sub.status == "Cancelled":
-                frappe.logger("provisioning").info(f"[PROVISION] Cancelled at APPS_INSTALLED: {sub.name}")
+            if _should_stop(sub, "APPS_INSTALLED", lock):
                 return
-            bootstrap_site(site_name, sub)
+            with metrics.timer(metrics.STEP_DURATION, step="bootstrap"), span("bootstrap"):
+                bootstrap_site(site_name, sub)
             update_subscription_state(sub, step="BOOTSTRAPPED")
 
         # 4️⃣ COMPLETE
         if sub.provisioning_step == "BOOTSTRAPPED":
-            sub.reload()
-            if sub.status == "Cancelled":
-                frappe.logger("provisioning").info(f"[PROVISION] Cancelled at BOOTSTRAPPED: {sub.name}")
+            if _should_stop(sub, "BOOTSTRAPPED", lock):
                 return
-            run_migrate(site_name, bench_path)
-            create_cloudflare_dns(site_name)
-
-            frappe.enqueue(
-                "sowaan_cloud.utils.ssl.issue_ssl_async",
-                queue="long",
-                site_name=site_name,
-                docname=sub.name,
-                timeout=900,
-            )
-
+            with metrics.timer(metrics.STEP_DURATION, step="migrate"), span("migrate"):
+                run_migrate(site_name, bench_path)
+            try:
+                from sowaan_cloud.utils.scheduler_policy import apply_scheduler_policy
+                apply_scheduler_policy(sub.name, bench_path)
+            except Exception:
+                frappe.log_error(title=f"Scheduler policy failed for {site_name}")
+            with metrics.timer(metrics.STEP_DURATION, step="dns"), span("dns"):
+                create_cloudflare_dns(site_name)
+
+            sub.provisioned = 1
+            sub.ssl_status = "Pending"
+            sub.next_ssl_attempt_at = now_datetime()
+            record_retry_success(sub)
             update_subscription_state(
                 sub,
                 status="Active",
                 step="COMPLETED",
             )
 
-            if not _site_is_healthy(site_name):
+            metrics.inc(metrics.RUNS_TOTAL, outcome="success", error_class="")
+
+            from sowaan_cloud.utils.ssl import enqueue_ssl_issue
+            enqueue_ssl_issue(site_name, sub.name, trace_id=sub.trace_id)
+
+            try:
+                from sowaan_cloud.utils.inventory import refresh_site_inventory
+                refresh_site_inventory([site_name])
+            except Exception:
+                frappe.log_error(title=f"Site inventory refresh failed for {site_name}")
+
+            try:
+                warm_up_site(sub, site_name, bench_path)
+            except Exception:
+                frappe.log_error(title=f"Warm-up failed for {site_name}")
+
+            if not check_site_health(site_name):
                 frappe.logger("provisioning").warning(
-                    f"[HEALTH] {site_name} marked Active but did not respond to health check — may still be initializing."
+                    f"[HEALTH] {site_name} marked Active but did not answer ping — may still be initializing."
                 )
 
+    except CommandCancelled:
+        if _lease_lost(sub, sub.provisioning_step or "INIT", lock):
+            return
+        # Our copy is stale: the cancellation changed status behind it.
+        sub.reload()
+        _record_cancellation(sub, sub.provisioning_step or "INIT")
+
     except Exception as e:
+        if _lease_lost(sub, sub.provisioning_step or "INIT", lock):
+            return
         raw = getattr(e, "output_combined", None) or getattr(e, "stderr", None) or str(e)
         err = analyze_provisioning_error(raw)
+
+        if schedule_provisioning_retry(sub, err, raw):
+            metrics.inc(metrics.RUNS_TOTAL, outcome="retry", error_class=err["code"])
+            return
+
+        metrics.inc(metrics.RUNS_TOTAL, outcome="failure", error_class=err["code"])
+
         update_subscription_state(
             sub,
             status="Failed",
@@ -136,48 +311,139 @@ def provision_from_subscription(docname):
         raise
 
 
-def _site_is_healthy(site_name):
-    try:
-        r = requests.get(f"https://{site_name}", timeout=15, allow_redirects=True)
-        return r.status_code < 500
-    except Exception:
+def _should_stop(sub, step, lock=None):
+    """
+    True if the run must stop before ``step``: its lease was lost, or ``sub``
+    (reloaded) was cancelled, which is then recorded.
+    """
+    if _lease_lost(sub, step, lock):
+        return True
+    sub.reload()
+    if sub.status != "Cancelled" and not is_cancel_requested(sub.name):
+        return False
+    _record_cancellation(sub, step)
+    return True
+
+
+def _lease_lost(sub, step, lock):
+    """
+    True if ``lock`` expired under this run. Another worker may be
+    provisioning the subscription by now, so nothing is written to it.
+    """
+    if not (lock and lock.lost):
         return False
+    frappe.logger("provisioning").warning(f"[PROVISION] Lease lost at {step}: {sub.name}, stopping without changes")
+    return True
+
+
+def _record_cancellation(sub, step):
+    frappe.logger("provisioning").info(f"[PROVISION] Cancelled at {step}: {sub.name}")
+    metrics.inc(metrics.RUNS_TOTAL, outcome="cancelled", error_class="")
+    update_subscription_state(sub, status="Cancelled")
+    append_log(sub, f"[CANCEL] Stopped at {step}")
+
 
+def warm_up_site(sub, site_name, bench_path):
+    """
+    Warm the new tenant's caches for its first login (see utils/tenant.warm_up)
+    and record the desk boot time before and after.
+    """
+    pkg = frappe.get_doc("Cloud Package", sub.selected_package)
+    languages = list(dict.fromkeys(["en", COUNTRY_LANGUAGES.get(sub.country, "en")]))
 
-def get_branding_payload(sub):
+    with metrics.timer(metrics.STEP_DURATION, step="warm_up"), span("warm_up") as warm_span:
+        result = execute_on_site(
+            site_name,
+            bench_path,
+            "sowaan_cloud.utils.tenant.warm_up",
+            {
+                "user_email": sub.user_email,
+                "modules": [row.module_name for row in pkg.modules],
+                "languages": languages,
+            },
+        ) or {}
+        if warm_span:
+            warm_span["attributes"].update(
+                cold_boot_seconds=result.get("cold_boot_seconds"),
+                warm_boot_seconds=result.get("warm_boot_seconds"),
+                doctypes=result.get("doctypes"),
+            )
+
+    if not result:
+        append_log(sub, "[WARM-UP] No result from the site")
+        return
+
+    for phase in ("cold", "warm"):
+        if result.get(f"{phase}_boot_seconds") is not None:
+            metrics.observe(metrics.DESK_BOOT, result[f"{phase}_boot_seconds"], phase=phase)
+
+    append_log(
+        sub,
+        f"[WARM-UP] Desk boot {result.get('cold_boot_seconds')}s cold, {result.get('warm_boot_seconds')}s warm; "
+        f"{result.get('doctypes', 0)} DocTypes, languages {', '.join(result.get('languages') or []) or '-'}"
+        + "".join(f"\n  {w}" for w in result.get("warnings") or []),
+    )
+
+
+def get_branding_payload(sub, site_path=None):
+    """
+    Branding URLs for the tenant bootstrap.
+
+    Uploads go through the content-addressed store in ``branding.py``. When
+    ``site_path`` is on this host the derivatives are linked straight into
+    the tenant's files and ``files_local`` is set, so the URLs are
+    tenant-relative and nothing needs to be fetched over HTTP. Uploads that
+    can't be processed fall back to an absolute control-plane URL.
+    """
     base_url = get_url()
+    files_local = bool(site_path and os.path.isdir(site_path))
 
-    def abs_url(path):
+    def resolve(path, field):
         if not path:
             return None
-        if path.startswith("http"):
-            return path
-        return base_url.rstrip("/") + path
+        url, is_local = prepare_branding_asset(path, field, site_path if files_local else None)
+        if url.startswith("http") or is_local:
+            return url
+        return base_url.rstrip("/") + url
 
     settings = get_cloud_settings()
 
     return {
-        "logo_file_url": abs_url(sub.company_logo),
-        "header_file_url": abs_url(sub.letterhead_header),
-        "footer_file_url": abs_url(sub.letterhead_footer),
+        "logo_file_url": resolve(sub.company_logo, "company_logo"),
+        "header_file_url": resolve(sub.letterhead_header, "letterhead_header"),
+        "footer_file_url": resolve(sub.letterhead_footer, "letterhead_footer"),
+        "files_local": files_local,
         "brand_name": sub.company_name,
         "create_letterhead": settings.create_letterhead,
     }
 
 
 def create_site_if_missing(site_name, bench_path, sql_password):
+    """
+    Create the site unless it exists. A directory left by an interrupted
+    bench new-site (no site_config, or a database without Frappe installed)
+    is not a site: it is created again over the leftovers with --force.
+    """
     site_path = os.path.join(bench_path, "sites", site_name)
+    force = False
 
     if os.path.isdir(site_path):
-        frappe.logger("provisioning").info(f"[SITE] Already exists: {site_name}")
-        return False
+        config = read_site_config(site_path)
+        # A database error propagates: --force over a complete site would wipe it.
+        if config.get("db_name") and is_site_installed(config["db_name"], host=config.get("db_host")):
+            frappe.logger("provisioning").info(f"[SITE] Already exists: {site_name}")
+            return False
 
-    frappe.logger("provisioning").info(f"[SITE] Creating new site: {site_name}")
+        frappe.logger("provisioning").warning(f"[SITE] Incomplete site left behind, recreating: {site_name}")
+        force = True
+    else:
+        frappe.logger("provisioning").info(f"[SITE] Creating new site: {site_name}")
 
     run_as_frappe(
         f"bench new-site {shlex.quote(site_name)} "
         f"--admin-password admin "
-        f"--db-root-password {shlex.quote(sql_password)}",
+        f"--db-root-password {shlex.quote(sql_password)}"
+        + (" --force" if force else ""),
         bench_path,
     )
 
@@ -185,6 +451,16 @@ def create_site_if_missing(site_name, bench_path, sql_password):
 
 
 def get_installed_apps(site_name, bench_path):
+    """Apps installed on the site, read from its database; bench list-apps if that is not possible."""
+    config = read_site_config(os.path.join(bench_path, "sites", site_name))
+    if config.get("db_name"):
+        try:
+            installed = get_installed_apps_by_db([config["db_name"]], host=config.get("db_host"))
+            if installed.get(config["db_name"]):
+                return installed[config["db_name"]]
+        except Exception as e:
+            frappe.logger("provisioning").warning(f"[APPS] Could not read apps of {site_name} from its database: {e}")
+
     result = run_as_frappe(
         f"bench --site {shlex.quote(site_name)} list-apps",
         bench_path,
@@ -211,52 +487,11 @@ def ensure_apps(site_name, bench_path, apps_to_install):
 
         frappe.logger("provisioning").info(f"[APPS] Installing {app}")
 
-        run_as_frappe(
-            f"bench --site {shlex.quote(site_name)} install-app {shlex.quote(app)}",
-            bench_path,
-        )
-
-
-def enforce_site_config(site_path, updates=None):
-    if updates is None:
-        updates = {}
-
-    config_path = os.path.join(site_path, "site_config.json")
-
-    if not os.path.exists(config_path):
-        frappe.throw("site_config.json not found")
-
-    with open(config_path) as f:
-        config = json.load(f)
-
-    changed = False
-    for key, value in updates.items():
-        if config.get(key) != value:
-            config[key] = value
-            changed = True
-
-    if changed:
-        with open(config_path, "w") as f:
-            json.dump(config, f, indent=2)
-
-        frappe.logger("provisioning").info(f"[CONFIG] site_config.json updated")
-
-
-def enforce_trial_validity(site_path, days):
-    valid_till = (date.today() + timedelta(days=days)).isoformat()
-
-    config_path = os.path.join(site_path, "site_config.json")
-    with open(config_path) as f:
-        config = json.load(f)
-
-    quota = config.get("quota", {})
-    quota["valid_till"] = valid_till
-    config["quota"] = quota
-
-    with open(config_path, "w") as f:
-        json.dump(config, f, indent=2)
-
-    frappe.logger("provisioning").info(f"[TRIAL] quota.valid_till set to {valid_till}")
+        with metrics.timer(metrics.STEP_DURATION, step=f"install_app:{app}"), span(f"install_app:{app}"):
+            run_as_frappe(
+                f"bench --site {shlex.quote(site_name)} install-app {shlex.quote(app)}",
+                bench_path,
+            )
 
 
 def bootstrap_site(site_name, doc):
@@ -264,6 +499,10 @@ def bootstrap_site(site_name, doc):
     user_password = doc.get_password("user_password")
     branding = None
 
+    if doc.company_logo or doc.letterhead_header or doc.letterhead_footer:
+        site_path = os.path.join(settings.bench_path, "sites", site_name)
+        branding = get_branding_payload(doc, site_path=site_path)
+
     pkg = frappe.get_doc("Cloud Package", doc.selected_package)
 
     kwargs = {
@@ -293,6 +532,25 @@ def bootstrap_site(site_name, doc):
     )
 
 
+def execute_on_site(site_name, bench_path, method, kwargs=None):
+    """Run ``method`` in the tenant via bench execute and return its JSON-decoded result."""
+    result = run_as_frappe(
+        f"bench --site {shlex.quote(site_name)} execute {shlex.quote(method)} "
+        f"--kwargs {shlex.quote(json.dumps(kwargs or {}))}",
+        bench_path,
+        capture_output=True,
+    )
+
+    # The return value is the last line; migrations or warnings may print before it.
+    for line in reversed((result.stdout or "").splitlines() if result else []):
+        try:
+            return json.loads(line)
+        except ValueError:
+            continue
+
+    return None
+
+
 def run_migrate(site_name, bench_path):
     frappe.logger("provisioning").info(f"[MIGRATE] Running migrations for {site_name}")
 
@@ -314,54 +572,171 @@ def update_subscription_state(sub, status=None, step=None, error=None):
     if status:
         sub.status = status
     if step:
+        if step != sub.provisioning_step:
+            sub.step_started_at = now_datetime()
+            # Progress was made: the stall sweeper's resume budget starts over.
+            sub.resume_attempts = 0
         sub.provisioning_step = step
     if error:
         sub.provisioning_logs = error
 
     sub.save(ignore_permissions=True)
+    before = sub.get_doc_before_save()
     append_log(sub, f"{sub.provisioning_step}")
     frappe.db.commit()
 
+    if not before or (before.status, before.provisioning_step) != (sub.status, sub.provisioning_step):
+        publish_fleet_update({
+            "name": sub.name,
+            "site_name": sub.site_name,
+            "status": sub.status,
+            "provisioning_step": sub.provisioning_step,
+            "previous_status": before.status if before else None,
+            "previous_step": before.provisioning_step if before else None,
+            "step_started_at": str(sub.step_started_at or ""),
+            "last_error_code": sub.last_error_code,
+            "modified": str(sub.modified),
+        })
+
+
+def publish_fleet_update(update):
+    """
+    Send a subscription's move from (previous_status, previous_step) to
+    (status, provisioning_step) to open fleet dashboards, i.e. to users who
+    can read Cloud Subscription.
+    """
+    from frappe.realtime import get_doctype_room # type: ignore
 
-def run_as_frappe(cmd, bench_path, capture_output=False):
+    try:
+        frappe.publish_realtime(FLEET_UPDATE_EVENT, update, room=get_doctype_room("Cloud Subscription"))
+    except Exception:
+        pass
+
+
+def command_label(cmd):
+    """Metric label for a bench command line: 'bench --site x install-app y' -> 'install-app'."""
+    tokens = shlex.split(cmd)
+    if tokens and tokens[0] == "bench":
+        tokens = tokens[1:]
+    if tokens[:1] == ["--site"]:
+        tokens = tokens[2:]
+    return tokens[0] if tokens else "unknown"
+
+
+def run_as_frappe(cmd, bench_path, capture_output=False, env=None, timeout=None):
+    """
+    Run a bench command from ``bench_path`` as the frappe user.
+
+    Output is streamed (see executor.py): lines go to the provisioning log
+    and the subscription's progress channel as they arrive, and only a
+    bounded tail is kept unless ``capture_output`` asks for the full stdout.
+    ``timeout`` defaults to COMMAND_TIMEOUTS for the bench subcommand.
+
+    ``env`` is exported inside the login shell (sudo would drop it otherwise).
+    The current trace context is passed on as TRACEPARENT.
+    """
     bench_path = os.path.abspath(bench_path)
-    full_cmd = f"cd {shlex.quote(bench_path)} && {cmd}"
+    label = command_label(cmd)
+    timeout = timeout or COMMAND_TIMEOUTS.get(label, DEFAULT_COMMAND_TIMEOUT)
+    with span(f"bench {label}") as cmd_span:
+        return _run_as_frappe(cmd, bench_path, label, cmd_span, env or {}, capture_output, timeout)
 
-    run_kwargs = {
-        "text": True,
-        "stdout": subprocess.PIPE,
-        "stderr": subprocess.PIPE,
-    }
+
+def shell_exports(env=None):
+    """
+    ``export K=V && `` prefix for bench shells. Site config key
+    ``provisioning_env`` adds variables to every command (e.g. PATH).
+    """
+    env = {**(frappe.conf.get("provisioning_env") or {}), **(env or {})}
+    return "".join(f"export {k}={shlex.quote(str(v))} && " for k, v in env.items())
+
+
+def _run_as_frappe(cmd, bench_path, label, cmd_span, env, capture_output, timeout):
+    if cmd_span:
+        env = {TRACEPARENT_ENV: current_traceparent(), **env}
+    full_cmd = f"cd {shlex.quote(bench_path)} && {shell_exports(env)}{cmd}"
+
+    if frappe_user_exists():
+        args = ["sudo", "-u", "frappe", "bash", "-lc", full_cmd]
+    else:
+        args = ["bash", "-lc", full_cmd]
+
+    start = time.monotonic()
+    exit_code = 0
 
     try:
-        if frappe_user_exists():
-            result = subprocess.run(
-                ["sudo", "-u", "frappe", "bash", "-lc", full_cmd],
-                check=True,
-                **run_kwargs,
-            )
-        else:
-            result = subprocess.run(
-                ["bash", "-lc", full_cmd],
-                check=True,
-                **run_kwargs,
-            )
+        return stream_command(args, label, timeout=timeout, keep_output=capture_output)
 
-        if result.stdout:
-            frappe.logger("provisioning").info(result.stdout)
+    except subprocess.TimeoutExpired as e:
+        exit_code = "timeout"
+        frappe.logger("provisioning").error(f"[CMD TIMEOUT] {label} after {timeout}s\n{e.output_combined}")
+        raise
 
-        return result
+    except CommandCancelled:
+        exit_code = "cancelled"
+        frappe.logger("provisioning").warning(f"[CMD CANCELLED] {label} terminated after {time.monotonic() - start:.1f}s")
+        raise
 
     except subprocess.CalledProcessError as e:
-        output = "\n".join(filter(None, [e.stdout, e.stderr]))
-        frappe.logger("provisioning").error(f"[CMD FAILED] {cmd}\n{output}")
-        e.output_combined = output
+        exit_code = e.returncode
+        frappe.logger("provisioning").error(f"[CMD FAILED] {label} exited {exit_code}\n{e.output_combined}")
         raise
 
+    finally:
+        if cmd_span:
+            cmd_span["attributes"]["exit_code"] = exit_code
+        metrics.observe(
+            metrics.COMMAND_DURATION,
+            time.monotonic() - start,
+            command=label,
+            exit_code=exit_code,
+        )
+
 
 def analyze_provisioning_error(raw_error: str) -> dict:
     error = raw_error.lower() if raw_error else ""
 
+    if "too many connections" in error:
+        return {
+            "code": "TOO_MANY_CONNECTIONS",
+            "title": "Database Busy",
+            "message": (
+                "The database server refused the connection because it is at its connection limit.\n"
+                "Provisioning will be retried automatically."
+            ),
+            "severity": "warning",
+        }
+
+    if "lock wait timeout" in error or "deadlock found" in error:
+        return {
+            "code": "LOCK_TIMEOUT",
+            "title": "Database Lock Timeout",
+            "message": (
+                "A database lock could not be acquired in time.\n"
+                "Provisioning will be retried automatically."
+            ),
+            "severity": "warning",
+        }
+
+    if any(s in error for s in (
+        "connection reset",
+        "connection refused",
+        "connection aborted",
+        "temporary failure in name resolution",
+        "max retries exceeded",
+        "read timed out",
+        "connect timeout",
+    )):
+        return {
+            "code": "NETWORK_ERROR",
+            "title": "Network Error",
+            "message": (
+                "A network call failed during provisioning.\n"
+                "Provisioning will be retried automatically."
+            ),
+            "severity": "warning",
+        }
+
     if "access denied for user" in error or "1045" in error:
         return {
             "code": "DB_AUTH_FAILED",
@@ -409,6 +784,11 @@ def analyze_provisioning_error(raw_error: str) -> dict:
     }
 
 
+def cloudflare_api_base():
+    # Overridable in site config, e.g. to point at a mock server in benchmarks.
+    return (frappe.conf.get("cloudflare_api_base") or CLOUDFLARE_API_BASE).rstrip("/")
+
+
 def cloudflare_headers(settings):
     token = settings.get_password("cloudflare_api_secret")
 
@@ -422,18 +802,22 @@ def cloudflare_headers(settings):
 
 
 def cloudflare_dns_exists(site_name):
+    return bool(find_cloudflare_dns_records(site_name))
+
+
+def find_cloudflare_dns_records(site_name):
     settings = get_cloud_settings()
     headers = cloudflare_headers(settings)
     zone_id = settings.get_password("cloudflare_zone_domain")
 
     r = requests.get(
-        f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records",
+        f"{cloudflare_api_base()}/zones/{zone_id}/dns_records",
         headers=headers,
         params={"name": site_name},
         timeout=10,
     )
     data = r.json()
-    return bool(data.get("result"))
+    return data.get("result") or []
 
 
 def create_cloudflare_dns(site_name):
@@ -457,10 +841,49 @@ def create_cloudflare_dns(site_name):
         "proxied": False,
     }
 
-    url = f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records"
+    url = f"{cloudflare_api_base()}/zones/{zone_id}/dns_records"
 
     r = requests.post(url, json=payload, headers=headers, timeout=10)
     data = r.json()
 
     if not data.get("success"):
         raise Exception(data)
+
+
+def list_cloudflare_a_records(content):
+    """All A records in the zone pointing at ``content`` (the server IP), following pagination."""
+    settings = get_cloud_settings()
+    headers = cloudflare_headers(settings)
+    zone_id = settings.get_password("cloudflare_zone_domain")
+    records, page = [], 1
+
+    while True:
+        r = requests.get(
+            f"{cloudflare_api_base()}/zones/{zone_id}/dns_records",
+            headers=headers,
+            params={"type": "A", "content": content, "per_page": 500, "page": page},
+            timeout=10,
+        )
+        data = r.json()
+        if not data.get("success"):
+            raise Exception(data)
+
+        records += data.get("result") or []
+        if page >= (data.get("result_info") or {}).get("total_pages", 1):
+            return records
+        page += 1
+
+
+def delete_cloudflare_dns(record_id):
+    settings = get_cloud_settings()
+    zone_id = settings.get_password("cloudflare_zone_domain")
+
+    r = requests.delete(
+        f"{cloudflare_api_base()}/zones/{zone_id}/dns_records/{record_id}",
+        headers=cloudflare_headers(settings),
+        timeout=10,
+    )
+    data = r.json()
+
+    if not data.get("success"):
+        raise Exception(data)
@@ -0,0 +1,107 @@
+import frappe # type: ignore
+import time
+from frappe.utils import add_to_date, get_datetime, now_datetime # type: ignore
+from sowaan_cloud.utils.events import record_provisioning_event
+from sowaan_cloud.utils.locks import last_heartbeat
+from sowaan_cloud.utils.provision import (
+    enqueue_provisioning,
+    is_provisioning_in_flight,
+    provisioning_lock_name,
+    update_subscription_state,
+)
+
+# How long a step may go without a heartbeat or state change before the
+# job behind it is presumed dead. Sized from the slowest bench command in
+# each step (new-site / install-app of erpnext dominate).
+STEP_STALL_THRESHOLDS = {
+    "INIT": 20 * 60,
+    "SITE_CREATED": 40 * 60,
+    "APPS_INSTALLED": 20 * 60,
+    "BOOTSTRAPPED": 20 * 60,
+}
+DEFAULT_STALL_THRESHOLD = 20 * 60
+
+MAX_RESUME_ATTEMPTS = 3
+
+
+def get_last_activity(sub):
+    """Latest of the lease heartbeat and the last step change, as a unix timestamp."""
+    candidates = [
+        last_heartbeat(provisioning_lock_name(sub.name)),
+        get_datetime(sub.step_started_at or sub.modified).timestamp(),
+    ]
+    return max(c for c in candidates if c)
+
+
+def sweep_stuck_provisioning():
+    """
+    Resume subscriptions left in "Provisioning" by a dead worker.
+    Runs via scheduler.
+
+    A subscription is stuck when it has been quiet for longer than its
+    step's threshold, nobody holds its lease and no job for it is queued.
+    It is re-enqueued from its recorded provisioning_step, up to
+    MAX_RESUME_ATTEMPTS times, after which it is marked Failed.
+    """
+    now = time.time()
+    oldest_allowed = min(STEP_STALL_THRESHOLDS.values(), default=DEFAULT_STALL_THRESHOLD)
+
+    for d in frappe.get_all(
+        "Cloud Subscription",
+        filters={
+            "status": "Provisioning",
+            "modified": ["<", add_to_date(now_datetime(), seconds=-oldest_allowed)],
+        },
+        fields=["name", "provisioning_step", "step_started_at", "modified", "next_retry_at"],
+    ):
+        # Waiting on a scheduled retry (retry_policy.py), not stuck.
+        if d.next_retry_at:
+            continue
+
+        step = d.provisioning_step or "INIT"
+        idle = now - get_last_activity(d)
+
+        if idle < STEP_STALL_THRESHOLDS.get(step, DEFAULT_STALL_THRESHOLD):
+            continue
+
+        if is_provisioning_in_flight(d.name):
+            continue
+
+        resume_subscription(d.name, step, idle)
+
+
+def resume_subscription(docname, step, lost_seconds):
+    sub = frappe.get_doc("Cloud Subscription", docname)
+    attempts = (sub.resume_attempts or 0) + 1
+
+    if attempts > MAX_RESUME_ATTEMPTS:
+        record_provisioning_event(
+            docname,
+            "Resume Limit Reached",
+            step=step,
+            attempt=attempts - 1,
+            lost_seconds=lost_seconds,
+        )
+        update_subscription_state(
+            sub,
+            status="Failed",
+            step=step,
+            error=f"Provisioning stalled at {step} and was resumed {MAX_RESUME_ATTEMPTS} times without progress.",
+        )
+        return
+
+    sub.resume_attempts = attempts
+    sub.save(ignore_permissions=True)
+    record_provisioning_event(
+        docname,
+        "Resumed",
+        step=step,
+        attempt=attempts,
+        lost_seconds=lost_seconds,
+    )
+    frappe.db.commit()
+
+    frappe.logger("provisioning").warning(
+        f"[RECOVERY] Resuming {docname} at {step} (attempt {attempts}, idle {lost_seconds:.0f}s)"
+    )
+    enqueue_provisioning(docname)
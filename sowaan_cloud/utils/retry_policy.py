@@ -0,0 +1,118 @@
+import frappe # type: ignore
+from frappe.utils import add_to_date, now_datetime # type: ignore
+from sowaan_cloud.utils.events import record_provisioning_event
+
+# Retry policy per analyze_provisioning_error() code.
+#   max_attempts: automatic retries before the subscription is marked Failed
+#   base_delay:   seconds before the first retry, doubled on each attempt
+#   max_delay:    backoff ceiling
+# Configuration errors (credentials, permissions) are not retried: they need
+# an operator and retrying only hides them.
+RETRY_POLICIES = {
+    "DB_AUTH_FAILED": {"max_attempts": 0},
+    "PERMISSION_DENIED": {"max_attempts": 0},
+    "SITE_EXISTS": {"max_attempts": 1, "base_delay": 30, "max_delay": 30},
+    "NETWORK_ERROR": {"max_attempts": 5, "base_delay": 30, "max_delay": 600},
+    "LOCK_TIMEOUT": {"max_attempts": 5, "base_delay": 20, "max_delay": 300},
+    "TOO_MANY_CONNECTIONS": {"max_attempts": 6, "base_delay": 60, "max_delay": 900},
+    "UNKNOWN_ERROR": {"max_attempts": 1, "base_delay": 120, "max_delay": 120},
+}
+
+RETRY_DISPATCH_BATCH_SIZE = 20
+
+
+def get_retry_policy(code):
+    return RETRY_POLICIES.get(code) or RETRY_POLICIES["UNKNOWN_ERROR"]
+
+
+def get_retry_delay(policy, attempt):
+    delay = policy.get("base_delay", 60) * (2 ** max(attempt - 1, 0))
+    return min(delay, policy.get("max_delay", delay))
+
+
+def schedule_provisioning_retry(sub, err, raw):
+    """
+    Schedule an automatic retry for a failed provisioning run if the error
+    class allows another attempt. Returns True when a retry was scheduled;
+    the subscription then stays "Provisioning" and is re-entered at
+    ``provisioning_step`` (the last completed step) once the backoff elapses.
+
+    Attempts are counted per consecutive error class: a different class
+    starts its own budget.
+    """
+    code = err["code"]
+    policy = get_retry_policy(code)
+    attempts = (sub.retry_attempts or 0) if sub.last_error_code == code else 0
+
+    if attempts >= policy["max_attempts"]:
+        if policy["max_attempts"]:
+            record_provisioning_event(
+                sub.name,
+                "Retries Exhausted",
+                step=sub.provisioning_step,
+                error_code=code,
+                attempt=attempts,
+            )
+        return False
+
+    attempt = attempts + 1
+    delay = get_retry_delay(policy, attempt)
+
+    sub.retry_attempts = attempt
+    sub.last_error_code = code
+    sub.next_retry_at = add_to_date(now_datetime(), seconds=delay)
+    sub.save(ignore_permissions=True)
+
+    record_provisioning_event(
+        sub.name,
+        "Retry Scheduled",
+        step=sub.provisioning_step,
+        error_code=code,
+        attempt=attempt,
+        details=(raw or "")[-2000:],
+    )
+
+    frappe.logger("provisioning").warning(
+        f"[RETRY] {sub.name} failed at {sub.provisioning_step} with {code}; "
+        f"retry {attempt}/{policy['max_attempts']} in {delay}s"
+    )
+    frappe.db.commit()
+    return True
+
+
+def record_retry_success(sub):
+    """Count a completed run that needed automatic retries, and reset the counters."""
+    if not sub.retry_attempts:
+        return
+
+    record_provisioning_event(
+        sub.name,
+        "Retry Succeeded",
+        step=sub.provisioning_step,
+        error_code=sub.last_error_code,
+        attempt=sub.retry_attempts,
+    )
+    sub.retry_attempts = 0
+    sub.next_retry_at = None
+
+
+def dispatch_due_retries():
+    """
+    Enqueue provisioning for subscriptions whose retry backoff has elapsed.
+    Runs via scheduler.
+    """
+    from sowaan_cloud.utils.provision import enqueue_provisioning
+
+    for name in frappe.get_all(
+        "Cloud Subscription",
+        filters={
+            "status": "Provisioning",
+            "next_retry_at": ["<=", now_datetime()],
+        },
+        order_by="next_retry_at asc",
+        limit=RETRY_DISPATCH_BATCH_SIZE,
+        pluck="name",
+    ):
+        frappe.db.set_value("Cloud Subscription", name, "next_retry_at", None, update_modified=False)
+        frappe.db.commit()
+        enqueue_provisioning(name)
@@ -0,0 +1,106 @@
+import frappe # type: ignore
+import os
+import zlib
+from frappe.utils import cint # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+from sowaan_cloud.utils.provision import execute_on_site
+from sowaan_cloud.utils.site_config import SiteConfigTransaction, read_site_config, update_site_configs
+
+# Scheduler policy of tenant sites.
+#
+# Every tenant runs the Frappe scheduler, so on a bench with hundreds of them
+# each tick enqueues the same hourly jobs for every site at once, on the
+# workers that also run provisioning. The control site therefore:
+#
+# - pauses the scheduler (pause_scheduler in site_config) of Suspended and
+#   Hibernated tenants and of packages with Disable Scheduler;
+# - moves each live tenant's hourly jobs to a fixed minute derived from a
+#   hash of its site name (see utils/tenant.stagger_hourly_jobs);
+# - runs its own jobs on Cloud Settings' provisioning queue, so a backlog of
+#   tenant jobs on the shared queues cannot hold up signups.
+#
+# The policy is applied during provisioning, after every fleet migrate, by
+# the Scheduler Policy fleet operation, and daily for the pause flags.
+
+PAUSED_STATUSES = ("Suspended", "Hibernated")
+
+
+def hourly_offset(site_name):
+    """Minute past the hour at which the site's hourly jobs run; stable per site."""
+    return zlib.crc32(site_name.encode()) % 60
+
+
+def scheduler_paused(status, package):
+    if status in PAUSED_STATUSES:
+        return True
+    return bool(package and cint(frappe.get_cached_value("Cloud Package", package, "disable_scheduler")))
+
+
+def set_scheduler_flag(txn, paused):
+    """Record the pause flag on a SiteConfigTransaction."""
+    if paused:
+        txn.set("pause_scheduler", 1)
+    else:
+        txn.unset("pause_scheduler")
+
+
+def apply_scheduler_policy(name, bench_path=None, dry_run=False):
+    """
+    Apply the full policy to one subscription's site: pause flag and, if the
+    scheduler runs, the hourly stagger. Returns a description of the changes.
+    """
+    sub = frappe.db.get_value(
+        "Cloud Subscription", name, ["site_name", "status", "selected_package"], as_dict=True
+    )
+    bench_path = bench_path or get_cloud_settings().bench_path
+    site_path = os.path.join(bench_path, "sites", sub.site_name)
+    paused = scheduler_paused(sub.status, sub.selected_package)
+    changes = []
+
+    if bool(cint(read_site_config(site_path).get("pause_scheduler"))) != paused:
+        changes.append("Scheduler paused" if paused else "Scheduler enabled")
+        if not dry_run:
+            txn = SiteConfigTransaction(site_path)
+            set_scheduler_flag(txn, paused)
+            txn.commit()
+
+    if not paused:
+        result = execute_on_site(
+            sub.site_name,
+            bench_path,
+            "sowaan_cloud.utils.tenant.stagger_hourly_jobs",
+            {"minute": hourly_offset(sub.site_name), "dry_run": cint(dry_run)},
+        ) or {}
+        if result.get("changed"):
+            changes.append(f"{result['changed']} hourly jobs moved to :{result['minute']:02d}")
+
+    return "\n".join(changes) or "Up to date"
+
+
+def sync_scheduler_flags():
+    """
+    Daily: set or clear pause_scheduler on every provisioned site from its
+    status and package. Only site_config is touched, in parallel.
+    """
+    sites_dir = os.path.join(get_cloud_settings().bench_path, "sites")
+    paused, running = [], []
+
+    for sub in frappe.get_all(
+        "Cloud Subscription",
+        filters={"provisioned": 1, "site_name": ["is", "set"], "status": ["in", ["Active", *PAUSED_STATUSES]]},
+        fields=["site_name", "status", "selected_package"],
+    ):
+        target = paused if scheduler_paused(sub.status, sub.selected_package) else running
+        target.append(os.path.join(sites_dir, sub.site_name))
+
+    update_site_configs(paused, lambda txn: set_scheduler_flag(txn, True))
+    update_site_configs(running, lambda txn: set_scheduler_flag(txn, False))
+
+
+def pause_schedulers(site_names):
+    """Pause the scheduler of a batch of sites (e.g. just suspended)."""
+    sites_dir = os.path.join(get_cloud_settings().bench_path, "sites")
+    return update_site_configs(
+        [os.path.join(sites_dir, site_name) for site_name in site_names],
+        lambda txn: set_scheduler_flag(txn, True),
+    )
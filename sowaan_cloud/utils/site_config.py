@@ -0,0 +1,200 @@
+import frappe # type: ignore
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from filelock import FileLock # type: ignore
+
+# Tenant site_config.json writes.
+#
+# Updates are collected on a SiteConfigTransaction and applied in a single
+# read-modify-write: the new file is written to a temp file in the same
+# directory, fsynced and renamed over the old one, so a crash never leaves a
+# truncated config. The read-modify-write holds sites/<site>/locks/site_config.lock,
+# the same lock frappe.installer.update_site_config (bench set-config, etc.)
+# takes, so concurrent bench writers are serialized with us.
+#
+#     with SiteConfigTransaction(site_path) as config:
+#         config.set("skip_setup_wizard", 1)
+#         config.update("quota", {"valid_till": "2026-12-31"})
+
+LOCK_TIMEOUT = 30
+BULK_WORKERS = 8
+
+
+class SiteConfigTransaction:
+    def __init__(self, site_path):
+        self.site_path = site_path
+        self.config_path = os.path.join(site_path, "site_config.json")
+        self.lock_path = os.path.join(site_path, "locks", "site_config.lock")
+        self._ops = []
+        self.previous = None
+
+    def set(self, key, value):
+        self._ops.append(("set", key, value))
+        return self
+
+    def update(self, key, values):
+        """Merge ``values`` into the dict at ``key`` (e.g. quota, limits)."""
+        self._ops.append(("update", key, dict(values)))
+        return self
+
+    def unset(self, key, subkey=None):
+        """Remove ``key``, or only ``subkey`` of the dict at ``key``."""
+        self._ops.append(("unset", key, subkey))
+        return self
+
+    def apply(self, config):
+        config = json.loads(json.dumps(config))
+        for op, key, value in self._ops:
+            if op == "set":
+                config[key] = value
+            elif op == "update":
+                config[key] = {**(config.get(key) or {}), **value}
+            elif value is None:
+                config.pop(key, None)
+            else:
+                (config.get(key) or {}).pop(value, None)
+        return config
+
+    def commit(self):
+        """Apply all pending updates in one write. Returns True if the file changed."""
+        if not self._ops:
+            return False
+
+        if not os.path.exists(self.config_path):
+            frappe.throw(f"site_config.json not found in {self.site_path}")
+
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with FileLock(self.lock_path, timeout=LOCK_TIMEOUT):
+            with open(self.config_path) as f:
+                previous = f.read()
+
+            current = json.loads(previous)
+            config = self.apply(current)
+            self._ops = []
+
+            if config == current:
+                return False
+
+            atomic_write(self.config_path, _dumps(config))
+            self.previous = previous
+
+        frappe.logger("provisioning").info(f"[CONFIG] {self.config_path} updated")
+        return True
+
+    def rollback(self):
+        """Put back the file as it was before commit()."""
+        if self.previous is None:
+            return
+        with FileLock(self.lock_path, timeout=LOCK_TIMEOUT):
+            atomic_write(self.config_path, self.previous)
+        self.previous = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.commit()
+
+
+def read_site_config(site_path):
+    """Parsed site_config.json of a site, or {} if it is missing or unreadable."""
+    try:
+        with open(os.path.join(site_path, "site_config.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_site_configs(site_paths, build, workers=BULK_WORKERS):
+    """
+    Bulk mode: apply a change to many sites in parallel. ``build(txn)``
+    records the updates on each site's transaction. Returns
+    {"changed": [...], "unchanged": [...], "failed": {site_path: error}}.
+    """
+    result = {"changed": [], "unchanged": [], "failed": {}}
+
+    def apply_one(site_path):
+        txn = SiteConfigTransaction(site_path)
+        build(txn)
+        return txn.commit()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(apply_one, path): path for path in site_paths}
+        for future, path in futures.items():
+            try:
+                result["changed" if future.result() else "unchanged"].append(path)
+            except Exception as e:
+                result["failed"][path] = str(e)
+
+    frappe.logger("provisioning").info(
+        f"[CONFIG] Bulk update: {len(result['changed'])} changed, "
+        f"{len(result['unchanged'])} unchanged, {len(result['failed'])} failed"
+    )
+    return result
+
+
+def get_tenant_site_paths():
+    """site directories of every provisioned subscription."""
+    from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+
+    bench_path = get_cloud_settings().bench_path
+    return [
+        os.path.join(bench_path, "sites", site_name)
+        for site_name in frappe.get_all(
+            "Cloud Subscription",
+            filters={"provisioned": 1, "site_name": ["is", "set"]},
+            pluck="site_name",
+        )
+    ]
+
+
+def set_config_on_all_sites(key, value, workers=BULK_WORKERS):
+    """
+    Set one key on every tenant, e.g.
+
+        bench --site <control> execute sowaan_cloud.utils.site_config.set_config_on_all_sites \
+            --kwargs '{"key": "limits", "value": {"space_usage": {"total": 5}}}'
+
+    Dict values are merged into the existing dict.
+    """
+    def build(txn):
+        if isinstance(value, dict):
+            txn.update(key, value)
+        else:
+            txn.set(key, value)
+
+    return update_site_configs(get_tenant_site_paths(), build, workers=int(workers))
+
+
+def atomic_write(path, content):
+    """Replace ``path`` via temp file, fsync and rename, keeping its permissions."""
+    mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".sowaan-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    # Make the rename itself durable.
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _dumps(config):
+    # Same layout as frappe.installer.update_site_config.
+    return json.dumps(config, indent=1, sort_keys=True)
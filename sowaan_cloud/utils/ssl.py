@@ -3,11 +3,22 @@ import socket
 import shlex
 import subprocess
 import frappe # type: ignore
-from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+from frappe.utils import add_to_date, now_datetime # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings, get_provisioning_queue
 import os
-from sowaan_cloud.utils.provision import run_as_frappe
+from sowaan_cloud.utils.provision import run_as_frappe, shell_exports
+from sowaan_cloud.utils import metrics
+from sowaan_cloud.utils.tracing import record_queue_wait, span
 
-MAX_SSL_ATTEMPTS = 3
+MAX_SSL_ATTEMPTS = 6
+SSL_RETRY_BASE_DELAY = 300         # seconds before the 2nd attempt
+SSL_RETRY_MAX_DELAY = 6 * 3600     # backoff ceiling
+SSL_RETRY_BATCH_SIZE = 50          # due rows enqueued per scheduler tick
+
+LETSENCRYPT_LIVE_DIR = "/etc/letsencrypt/live"
+
+# Hostname lookup used by wait_for_dns; swappable for a stub resolver.
+resolve_host = socket.gethostbyname
 
 
 def wait_for_dns(site_name, expected_ip, timeout=120, interval=5):
@@ -20,7 +31,7 @@ def wait_for_dns(site_name, expected_ip, timeout=120, interval=5):
     start = time.time()
     while time.time() - start < timeout:
         try:
-            resolved_ip = socket.gethostbyname(site_name)
+            resolved_ip = resolve_host(site_name)
             if resolved_ip == expected_ip:
                 return True
         except socket.gaierror:
@@ -32,16 +43,21 @@ def wait_for_dns(site_name, expected_ip, timeout=120, interval=5):
 
 
 def ssl_exists(site_name):
+    live_dir = frappe.conf.get("letsencrypt_live_dir") or LETSENCRYPT_LIVE_DIR
     return os.path.exists(
-        f"/etc/letsencrypt/live/{site_name}/fullchain.pem"
+        os.path.join(live_dir, site_name, "fullchain.pem")
     )
 
 def issue_ssl(site_name, bench_path):
+    start = time.monotonic()
+    exit_code = 0
+
     try:
         result = subprocess.run(
             [
                 "sudo", "bash", "-lc",
-                f"cd {shlex.quote(bench_path)} && bench setup lets-encrypt {shlex.quote(site_name)} --non-interactive",
+                f"cd {shlex.quote(bench_path)} && {shell_exports()}"
+                f"bench setup lets-encrypt {shlex.quote(site_name)} --non-interactive",
             ],
             input="y\n",
             text=True,
@@ -55,17 +71,27 @@ def issue_ssl(site_name, bench_path):
         )
 
     except subprocess.TimeoutExpired:
+        exit_code = "timeout"
         frappe.logger("provisioning").error(
             f"[SSL ERROR] LetsEncrypt timed out after 300s for {site_name}"
         )
         raise Exception(f"SSL issuance timed out for {site_name}. certbot did not complete within 5 minutes.")
 
     except subprocess.CalledProcessError as e:
+        exit_code = e.returncode
         frappe.logger("provisioning").error(
             f"[SSL ERROR] LetsEncrypt failed for {site_name}\nSTDOUT: {e.stdout}\nSTDERR: {e.stderr}"
         )
         raise
 
+    finally:
+        metrics.observe(
+            metrics.COMMAND_DURATION,
+            time.monotonic() - start,
+            command="lets-encrypt",
+            exit_code=exit_code,
+        )
+
     
 # def issue_ssl(site_name):
 #     settings = get_cloud_settings()
@@ -87,38 +113,80 @@ def issue_ssl(site_name, bench_path):
 #         text=True,
 #     )
 
+def ssl_job_id(site_name):
+    """One in-flight SSL job per site, whoever enqueues it."""
+    return f"issue_ssl::{site_name}"
+
+
+def get_ssl_retry_delay(attempts):
+    """Exponential backoff: 5, 10, 20 ... minutes, capped at SSL_RETRY_MAX_DELAY."""
+    delay = SSL_RETRY_BASE_DELAY * (2 ** max((attempts or 1) - 1, 0))
+    return min(delay, SSL_RETRY_MAX_DELAY)
+
+
+def enqueue_ssl_issue(site_name, docname, trace_id=None):
+    """
+    Enqueue issue_ssl_async under the site's deterministic job id.
+    Returns None when a job for the site is already queued or running.
+    """
+    return frappe.enqueue(
+        "sowaan_cloud.utils.ssl.issue_ssl_async",
+        queue=get_provisioning_queue(),
+        site_name=site_name,
+        docname=docname,
+        trace_id=trace_id,
+        timeout=900,
+        job_id=ssl_job_id(site_name),
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
+
+
 def retry_failed_ssl():
     """
-    Retry SSL issuance for failed or pending sites.
+    Retry SSL issuance for failed or pending sites whose backoff has elapsed.
     Runs via scheduler.
+
+    Only rows that are due are read (through the ssl_status +
+    next_ssl_attempt_at index), rows that used up MAX_SSL_ATTEMPTS are
+    skipped by the query, and duplicate enqueues collapse on the job id.
     """
 
+    if not frappe.db.get_single_value("Cloud Settings", "enable_ssl"):
+        return
+
     for d in frappe.get_all(
         "Cloud Subscription",
         filters={
             "ssl_status": ["in", ["Failed", "Pending"]],
+            "next_ssl_attempt_at": ["<=", now_datetime()],
+            "ssl_attempts": ["<", MAX_SSL_ATTEMPTS],
             "provisioned": 1,
         },
-        fields=["name", "site_name", "ssl_attempts"],
+        fields=["name", "site_name", "trace_id"],
+        order_by="next_ssl_attempt_at asc",
+        limit=SSL_RETRY_BATCH_SIZE,
     ):
         if not d.site_name:
             continue
 
-        frappe.enqueue(
-            "sowaan_cloud.utils.ssl.issue_ssl_async",
-            queue="long",
-            site_name=d.site_name,
-            docname=d.name,
-            timeout=900,
-        )
+        enqueue_ssl_issue(d.site_name, d.name, trace_id=d.trace_id)
 
 
-def issue_ssl_async(site_name, docname):
+def issue_ssl_async(site_name, docname, trace_id=None):
     """
     Background SSL worker.
-    Safe, idempotent, retry-aware.
+    Safe, idempotent, retry-aware: on failure it only schedules the next
+    attempt; retry_failed_ssl picks it up once it is due.
     """
 
+    metrics.observe_queue_wait(get_provisioning_queue())
+    record_queue_wait(trace_id)
+    with span("issue_ssl_async", trace_id=trace_id, site=site_name):
+        _issue_ssl_async(site_name, docname)
+
+
+def _issue_ssl_async(site_name, docname):
     settings = get_cloud_settings()
     doc = frappe.get_doc("Cloud Subscription", docname)
 
@@ -128,6 +196,7 @@ def issue_ssl_async(site_name, docname):
     # Already secured?
     if ssl_exists(site_name):
         doc.ssl_status = "Issued"
+        doc.next_ssl_attempt_at = None
         doc.save(ignore_permissions=True)
         return
 
@@ -136,7 +205,8 @@ def issue_ssl_async(site_name, docname):
 
     try:
         # 1️⃣ Wait for DNS
-        dns_ok = wait_for_dns(site_name, settings.server_ip)
+        with metrics.timer(metrics.STEP_DURATION, step="dns_wait"), span("dns_wait"):
+            dns_ok = wait_for_dns(site_name, settings.server_ip)
         if not dns_ok:
             expected = settings.server_ip or "(not configured)"
             raise Exception(
@@ -145,10 +215,13 @@ def issue_ssl_async(site_name, docname):
             )
 
         # 2️⃣ Issue SSL
-        issue_ssl(site_name, settings.bench_path)
+        with metrics.timer(metrics.STEP_DURATION, step="ssl"), span("certbot"):
+            issue_ssl(site_name, settings.bench_path)
 
+        metrics.inc(metrics.SSL_RUNS_TOTAL, outcome="success")
         doc.ssl_status = "Issued"
         doc.ssl_last_error = ""
+        doc.next_ssl_attempt_at = None
         doc.save(ignore_permissions=True)
 
     except Exception as e:
@@ -156,21 +229,16 @@ def issue_ssl_async(site_name, docname):
         frappe.logger("provisioning").exception(
             f"[SSL] Failed for site {site_name}"
         )
-        
 
-        # 📌 Update subscription status
+        metrics.inc(metrics.SSL_RUNS_TOTAL, outcome="failure")
+
+        # 📌 Update subscription status and schedule the next attempt
         doc.ssl_status = "Failed"
         doc.ssl_last_error = str(e)
-        doc.save(ignore_permissions=True)
-
-        # 🔁 Retry later if attempts remain
         if doc.ssl_attempts < MAX_SSL_ATTEMPTS:
-            frappe.enqueue(
-                "sowaan_cloud.utils.ssl.issue_ssl_async",
-                queue="long",
-                site_name=site_name,
-                docname=docname,
-                timeout=900,
-                enqueue_after_commit=True,
-                at_front=False,
+            doc.next_ssl_attempt_at = add_to_date(
+                now_datetime(), seconds=get_ssl_retry_delay(doc.ssl_attempts)
             )
+        else:
+            doc.next_ssl_attempt_at = None
+        doc.save(ignore_permissions=True)
@@ -0,0 +1,134 @@
+import frappe # type: ignore
+import time
+from frappe.utils import cint # type: ignore
+
+# Runs inside a tenant site, from the control site via
+#     bench --site <tenant> execute sowaan_cloud.utils.tenant.<method> --kwargs ...
+# bench execute prints the return value as JSON on the last line of stdout.
+
+WARM_UP_MAX_DOCTYPES = 200
+
+
+def apply_package_delta(modules=None, roles=None, user_email=None, dry_run=False):
+    """
+    Bring the tenant up to its package definition without touching what it
+    already has: enable missing company modules and grant missing roles to
+    the business user. Extra modules and roles are left alone. Returns what
+    was (or, on a dry run, would be) added.
+    """
+    frappe.set_user("Administrator")
+    dry_run = cint(dry_run)
+    modules, roles = modules or [], roles or []
+    result = {"modules": [], "roles": [], "warnings": []}
+
+    company_name = frappe.defaults.get_global_default("company") or frappe.db.get_value("Company", {}, "name")
+    if company_name:
+        company = frappe.get_doc("Company", company_name)
+        enabled = {row.module for row in company.get("enabled_modules") or []}
+        result["modules"] = [m for m in modules if m not in enabled]
+
+        if result["modules"] and not dry_run:
+            for module in result["modules"]:
+                company.append("enabled_modules", {"module": module})
+            company.save(ignore_permissions=True)
+    elif modules:
+        result["warnings"].append("No company found")
+
+    if user_email and frappe.db.exists("User", user_email):
+        user = frappe.get_doc("User", user_email)
+        granted = {row.role for row in user.roles}
+        missing = [r for r in roles if r not in granted]
+        result["roles"] = [r for r in missing if frappe.db.exists("Role", r)]
+        result["warnings"] += [f"Role {r} does not exist" for r in missing if r not in result["roles"]]
+
+        if result["roles"] and not dry_run:
+            user.add_roles(*result["roles"])
+    elif roles:
+        result["warnings"].append(f"User {user_email} not found")
+
+    if not dry_run:
+        frappe.db.commit()
+
+    return result
+
+
+def stagger_hourly_jobs(minute, dry_run=False):
+    """
+    Run the site's hourly scheduled jobs at ``minute`` past the hour instead
+    of on the hour. bench migrate puts them back to Hourly, so the control
+    site re-applies this after every migrate. Returns the number of jobs changed.
+    """
+    minute = cint(minute) % 60
+    cron_format = f"{minute} * * * *"
+
+    to_change = frappe.get_all("Scheduled Job Type", filters={"stopped": 0, "frequency": "Hourly"}, pluck="name")
+
+    if to_change and not cint(dry_run):
+        for name in to_change:
+            frappe.db.set_value(
+                "Scheduled Job Type", name, {"frequency": "Cron", "cron_format": cron_format}, update_modified=False
+            )
+        frappe.db.commit()
+
+    return {"changed": len(to_change), "minute": minute}
+
+
+def warm_up(user_email=None, modules=None, languages=None):
+    """
+    Do what the first desk load of a new site would, so the business user's
+    first login finds warm caches: build bootinfo for the user, load the
+    metadata of the package modules' DocTypes (and their child tables), the
+    translations of ``languages`` and the workspace sidebar. Returns the
+    bootinfo build time before (cold) and after (warm), in seconds.
+    """
+    from frappe.desk.desktop import get_workspace_sidebar_items
+    from frappe.translate import get_all_translations
+
+    user = user_email if user_email and frappe.db.exists("User", user_email) else "Administrator"
+    frappe.set_user(user)
+    result = {"user": user, "doctypes": 0, "languages": [], "warnings": []}
+
+    result["cold_boot_seconds"] = _warm_up_step(result, "Bootinfo", _time_boot)
+
+    doctypes = frappe.get_all(
+        "DocType",
+        filters={"module": ["in", modules or []], "istable": 0, "issingle": 0},
+        pluck="name",
+        order_by="name asc",
+        limit=WARM_UP_MAX_DOCTYPES,
+    )
+    for doctype in doctypes:
+        if _warm_up_step(result, f"Metadata of {doctype}", _load_meta, doctype) is not None:
+            result["doctypes"] += 1
+
+    for lang in languages or []:
+        if _warm_up_step(result, f"Translations ({lang})", get_all_translations, lang) is not None:
+            result["languages"].append(lang)
+
+    _warm_up_step(result, "Workspace sidebar", get_workspace_sidebar_items)
+    result["warm_boot_seconds"] = _warm_up_step(result, "Bootinfo", _time_boot)
+    return result
+
+
+def _time_boot():
+    from frappe.boot import get_bootinfo
+
+    start = time.perf_counter()
+    get_bootinfo()
+    return round(time.perf_counter() - start, 3)
+
+
+def _load_meta(doctype):
+    meta = frappe.get_meta(doctype)
+    for df in meta.get_table_fields():
+        frappe.get_meta(df.options)
+    return doctype
+
+
+def _warm_up_step(result, label, fn, *args):
+    """Run one warm-up step; a failure is reported and the rest goes on. Returns fn's result or None."""
+    try:
+        return fn(*args)
+    except Exception as e:
+        result["warnings"].append(f"{label}: {e}")
+        return None
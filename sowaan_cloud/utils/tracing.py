@@ -0,0 +1,287 @@
+import frappe # type: ignore
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+# Minimal tracing for the provisioning pipeline.
+#
+# A trace id is minted per subscription in create_subscription, stored on the
+# document and carried through the enqueue kwargs of provision_from_subscription
+# and issue_ssl_async. Bench subprocesses receive the W3C ``TRACEPARENT``
+# environment variable, so code of this app run under ``bench execute`` can
+# open child spans with the same helpers. The tenant bootstrap lives in
+# sowaan_client and is traced as its one bench command.
+#
+# Finished spans are appended to <bench>/logs/traces/<trace_id>.jsonl, which
+# both the control site and tenant processes can write, and are optionally
+# posted as OTLP/JSON to a collector configured with
+# ``otel_exporter_otlp_endpoint`` in site config or OTEL_EXPORTER_OTLP_ENDPOINT.
+# prune_trace_files removes trace files older than TRACE_RETENTION_DAYS daily.
+
+TRACEPARENT_ENV = "TRACEPARENT"
+SERVICE_NAME = "sowaan_cloud"
+TRACE_RETENTION_DAYS = 14
+
+_current_span = contextvars.ContextVar("sowaan_current_span", default=None)
+_pending = threading.local()
+
+
+def new_trace_id():
+    return secrets.token_hex(16)
+
+
+def new_span_id():
+    return secrets.token_hex(8)
+
+
+def traceparent(trace_id, span_id):
+    return f"00-{trace_id}-{span_id}-01"
+
+
+def parse_traceparent(value):
+    """Return (trace_id, span_id) from a W3C traceparent header, or (None, None)."""
+    try:
+        _, trace_id, span_id, _ = value.split("-")
+        return trace_id, span_id
+    except (AttributeError, ValueError):
+        return None, None
+
+
+def current_traceparent():
+    span = _current_span.get()
+    return traceparent(span["traceId"], span["spanId"]) if span else None
+
+
+@contextmanager
+def span(name, trace_id=None, **attributes):
+    """
+    Open a span. Without an explicit ``trace_id`` it nests under the current
+    span, or under TRACEPARENT from the environment in a bench subprocess.
+    With no trace at all the block runs untraced.
+    """
+    parent = _current_span.get()
+    parent_id = None
+
+    if trace_id:
+        if parent and parent["traceId"] == trace_id:
+            parent_id = parent["spanId"]
+    elif parent:
+        trace_id, parent_id = parent["traceId"], parent["spanId"]
+    else:
+        trace_id, parent_id = parse_traceparent(os.environ.get(TRACEPARENT_ENV))
+
+    if not trace_id:
+        yield None
+        return
+
+    record = {
+        "traceId": trace_id,
+        "spanId": new_span_id(),
+        "parentSpanId": parent_id,
+        "name": name,
+        "startTimeUnixNano": time.time_ns(),
+        "attributes": attributes,
+        "status": "ok",
+    }
+    token = _current_span.set(record)
+
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "error"
+        record["attributes"]["error"] = str(e)[:500]
+        raise
+    finally:
+        _current_span.reset(token)
+        record["endTimeUnixNano"] = time.time_ns()
+        _finish(record, is_local_root=parent is None)
+
+
+def record_span(name, trace_id, start, end, parent_id=None, **attributes):
+    """Record an already-finished span from unix timestamps (e.g. RQ queue wait)."""
+    if not trace_id:
+        return
+    parent = _current_span.get()
+    _finish(
+        {
+            "traceId": trace_id,
+            "spanId": new_span_id(),
+            "parentSpanId": parent_id or (parent["spanId"] if parent else None),
+            "name": name,
+            "startTimeUnixNano": int(start * 1e9),
+            "endTimeUnixNano": int(end * 1e9),
+            "attributes": attributes,
+            "status": "ok",
+        },
+        is_local_root=parent is None,
+    )
+
+
+def record_queue_wait(trace_id):
+    """Record the current RQ job's time in the queue as a span."""
+    try:
+        from datetime import timezone
+        from rq import get_current_job # type: ignore
+
+        job = get_current_job()
+        if not job or not job.enqueued_at or not job.started_at:
+            return
+        record_span(
+            "rq.queue_wait",
+            trace_id,
+            job.enqueued_at.replace(tzinfo=timezone.utc).timestamp(),
+            job.started_at.replace(tzinfo=timezone.utc).timestamp(),
+            queue=job.origin,
+            job=job.func_name,
+        )
+    except Exception:
+        frappe.logger("provisioning").debug("[TRACE] Could not record queue wait", exc_info=True)
+
+
+def _finish(record, is_local_root):
+    record["service"] = _service_name()
+    buffer = getattr(_pending, "spans", None)
+    if buffer is None:
+        buffer = _pending.spans = []
+    buffer.append(record)
+
+    # Export once per local root so a whole run costs one file write / POST.
+    if is_local_root:
+        _pending.spans = []
+        export(buffer)
+
+
+def export(spans):
+    """Write spans to the trace file and the OTLP collector. Never raises."""
+    if not spans:
+        return
+
+    try:
+        by_trace = {}
+        for s in spans:
+            by_trace.setdefault(s["traceId"], []).append(s)
+
+        for trace_id, items in by_trace.items():
+            path = get_trace_file(trace_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a") as f:
+                for s in items:
+                    f.write(json.dumps(s, default=str) + "\n")
+    except Exception:
+        frappe.logger("provisioning").debug("[TRACE] Could not write trace file", exc_info=True)
+
+    endpoint = _otlp_endpoint()
+    if endpoint:
+        try:
+            import requests
+
+            requests.post(
+                endpoint.rstrip("/") + "/v1/traces",
+                json=to_otlp(spans),
+                timeout=2,
+            )
+        except Exception:
+            frappe.logger("provisioning").debug("[TRACE] Could not export to collector", exc_info=True)
+
+
+def get_trace_file(trace_id):
+    return os.path.join(_trace_dir(), f"{trace_id}.jsonl")
+
+
+def prune_trace_files():
+    """Remove trace files not written to for TRACE_RETENTION_DAYS."""
+    trace_dir = _trace_dir()
+    if not os.path.isdir(trace_dir):
+        return
+
+    cutoff = time.time() - TRACE_RETENTION_DAYS * 86400
+    removed = 0
+    for entry in os.scandir(trace_dir):
+        try:
+            if entry.name.endswith(".jsonl") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+
+    if removed:
+        frappe.logger("provisioning").info(f"[TRACE] Removed {removed} trace files older than {TRACE_RETENTION_DAYS} days")
+
+
+def read_trace(trace_id):
+    """All recorded spans of a trace, oldest first."""
+    if not trace_id or not all(c in "0123456789abcdef" for c in trace_id):
+        return []
+
+    path = get_trace_file(trace_id)
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    return sorted(spans, key=lambda s: s["startTimeUnixNano"])
+
+
+def to_otlp(spans):
+    """Convert span records to an OTLP/JSON ExportTraceServiceRequest."""
+    by_service = {}
+    for s in spans:
+        by_service.setdefault(s.get("service") or SERVICE_NAME, []).append(s)
+
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [_otlp_attr("service.name", service)]},
+                "scopeSpans": [{
+                    "scope": {"name": SERVICE_NAME},
+                    "spans": [
+                        {
+                            "traceId": s["traceId"],
+                            "spanId": s["spanId"],
+                            "parentSpanId": s.get("parentSpanId") or "",
+                            "name": s["name"],
+                            "kind": 1,
+                            "startTimeUnixNano": str(s["startTimeUnixNano"]),
+                            "endTimeUnixNano": str(s["endTimeUnixNano"]),
+                            "attributes": [_otlp_attr(k, v) for k, v in s["attributes"].items()],
+                            "status": {"code": 2 if s["status"] == "error" else 1},
+                        }
+                        for s in items
+                    ],
+                }],
+            }
+            for service, items in by_service.items()
+        ]
+    }
+
+
+def _trace_dir():
+    from frappe.utils import get_bench_path # type: ignore
+
+    return os.path.join(get_bench_path(), "logs", "traces")
+
+
+def _otlp_attr(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp_endpoint():
+    try:
+        return frappe.conf.get("otel_exporter_otlp_endpoint") or os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+    except Exception:
+        return os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+
+
+def _service_name():
+    site = getattr(frappe.local, "site", None)
+    return f"{SERVICE_NAME}:{site}" if site else SERVICE_NAME
@@ -0,0 +1,191 @@
+import frappe # type: ignore
+import os
+from frappe.utils import add_days, escape_html, getdate, now_datetime # type: ignore
+from sowaan_cloud.utils.cloud_settings import get_cloud_settings
+from sowaan_cloud.utils.nginx import sync_site_state_map
+from sowaan_cloud.utils.scheduler_policy import pause_schedulers, scheduler_paused, set_scheduler_flag
+from sowaan_cloud.utils.site_config import SiteConfigTransaction
+
+# Trial expiry.
+#
+# trial_ends_on on Cloud Subscription mirrors quota.valid_till in the tenant's
+# site_config.json, so expiring and expired tenants are found with one indexed
+# query instead of reading every site's config. process_trial_expiries runs
+# daily: it warns tenants whose trial ends within TRIAL_WARNING_DAYS and
+# suspends expired ones in batches, one nginx reload per batch. Hibernated
+# trials are warned too; one that expires while asleep is suspended when it
+# is woken (see utils/hibernation.py).
+
+TRIAL_WARNING_DAYS = 3
+TRIAL_BATCH_SIZE = 200
+
+
+def process_trial_expiries():
+    send_trial_warnings()
+    suspend_expired_trials()
+
+
+def send_trial_warnings():
+    today = getdate()
+
+    while True:
+        rows = frappe.get_all(
+            "Cloud Subscription",
+            filters={
+                "status": ["in", ["Active", "Hibernated"]],
+                "trial_ends_on": ["between", [today, add_days(today, TRIAL_WARNING_DAYS)]],
+                "trial_warning_sent_on": ["is", "not set"],
+            },
+            fields=["name", "user_email", "company_name", "site_name", "trial_ends_on"],
+            limit=TRIAL_BATCH_SIZE,
+        )
+        if not rows:
+            return
+
+        for row in rows:
+            _notify(
+                row,
+                subject=f"Your trial of {row.site_name} ends on {row.trial_ends_on}",
+                message=(
+                    f"<p>Hello {escape_html(row.company_name)},</p>"
+                    f"<p>Your free trial of <b>{row.site_name}</b> ends on {row.trial_ends_on}. "
+                    "Contact us to continue using your site without interruption.</p>"
+                ),
+            )
+
+        _bulk_update([r.name for r in rows], {"trial_warning_sent_on": today})
+        frappe.db.commit()
+        frappe.logger("provisioning").info(f"[TRIAL] Sent {len(rows)} expiry warnings")
+
+        if len(rows) < TRIAL_BATCH_SIZE:
+            return
+
+
+def suspend_expired_trials():
+    today = getdate()
+
+    while True:
+        rows = frappe.get_all(
+            "Cloud Subscription",
+            filters={"status": "Active", "trial_ends_on": ["<", today]},
+            fields=["name", "user_email", "company_name", "site_name", "trial_ends_on"],
+            limit=TRIAL_BATCH_SIZE,
+        )
+        if not rows:
+            return
+
+        _bulk_update([r.name for r in rows], {"status": "Suspended", "suspended_on": now_datetime()})
+        frappe.db.commit()
+
+        # One map rewrite + reload for the whole batch; a failed reload is
+        # retried by the scheduled reconcile_site_state_map.
+        try:
+            sync_site_state_map()
+        except Exception:
+            frappe.log_error(title="Trial suspension: nginx reload failed")
+        pause_schedulers([r.site_name for r in rows if r.site_name])
+
+        for row in rows:
+            _notify(
+                row,
+                subject=f"Your trial of {row.site_name} has ended",
+                message=(
+                    f"<p>Hello {escape_html(row.company_name)},</p>"
+                    f"<p>Your free trial of <b>{row.site_name}</b> ended on {row.trial_ends_on} "
+                    "and the site has been suspended. Your data is kept; contact us to reactivate it.</p>"
+                ),
+            )
+        frappe.db.commit()
+        frappe.logger("provisioning").info(f"[TRIAL] Suspended {len(rows)} expired trials")
+
+        if len(rows) < TRIAL_BATCH_SIZE:
+            return
+
+
+@frappe.whitelist()
+def extend_trial(name, days):
+    """Push the trial end ``days`` past the later of today and the current end; reactivates a suspended site."""
+    frappe.only_for("System Manager")
+    sub = frappe.get_doc("Cloud Subscription", name)
+    days = int(days)
+
+    if days <= 0:
+        frappe.throw("Days must be positive.")
+    if sub.converted_on:
+        frappe.throw("This subscription is no longer on a trial.")
+
+    base = max(getdate(), getdate(sub.trial_ends_on)) if sub.trial_ends_on else getdate()
+    sub.trial_ends_on = add_days(base, days)
+    sub.trial_warning_sent_on = None
+    _apply_trial_change(sub, sub.trial_ends_on)
+    return sub.trial_ends_on
+
+
+@frappe.whitelist()
+def convert_trial(name):
+    """End the trial for a paying tenant: no expiry date, reactivated if suspended."""
+    frappe.only_for("System Manager")
+    sub = frappe.get_doc("Cloud Subscription", name)
+
+    sub.trial_ends_on = None
+    sub.converted_on = getdate()
+    _apply_trial_change(sub, None)
+
+
+def _apply_trial_change(sub, valid_till):
+    """
+    Update site_config.json and the subscription together: the config is
+    written first and rolled back if the database update does not commit.
+    """
+    was_suspended = sub.status == "Suspended"
+    if was_suspended:
+        sub.status = "Active"
+        sub.suspended_on = None
+
+    config = SiteConfigTransaction(get_site_path(sub.site_name))
+    if was_suspended:
+        set_scheduler_flag(config, scheduler_paused(sub.status, sub.selected_package))
+    if valid_till:
+        config.update("quota", {"valid_till": str(valid_till)})
+    else:
+        config.unset("quota", "valid_till")
+    config.commit()
+
+    try:
+        sub.save(ignore_permissions=True)
+        frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        config.rollback()
+        raise
+
+    frappe.logger("provisioning").info(f"[TRIAL] {sub.name}: quota.valid_till set to {valid_till}")
+
+    if was_suspended:
+        sync_site_state_map()
+
+
+def get_site_path(site_name):
+    if not site_name:
+        frappe.throw("Subscription has no site yet.")
+    return os.path.join(get_cloud_settings().bench_path, "sites", site_name)
+
+
+def _bulk_update(names, values):
+    table = frappe.qb.DocType("Cloud Subscription")
+    query = frappe.qb.update(table).set(table.modified, now_datetime())
+    for field, value in values.items():
+        query = query.set(table[field], value)
+    query.where(table.name.isin(names)).run()
+
+
+def _notify(row, subject, message):
+    if not row.user_email:
+        return
+    frappe.sendmail(
+        recipients=[row.user_email],
+        subject=subject,
+        message=message,
+        reference_doctype="Cloud Subscription",
+        reference_name=row.name,
+    )
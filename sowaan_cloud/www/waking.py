@@ -0,0 +1,12 @@
+import frappe
+
+no_cache = 1
+
+
+def get_context(context):
+    # nginx sends hibernated hosts here as /waking?site=<host>&next=<request uri>
+    context.site = frappe.form_dict.get("site") or ""
+    next_path = frappe.form_dict.get("next") or "/"
+    # Only paths on the tenant itself, never another host.
+    context.next_path = next_path if next_path.startswith("/") and not next_path.startswith("//") else "/"
+    context.no_breadcrumbs = 1